@@ -0,0 +1,173 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Peak memory of GaussianAdapter against the previous per-pixel camera matrix implementation.
+
+Usage:
+    python benchmarks/gs_adapter_memory.py --views 32 --height 504 --width 504 --device cuda
+
+The baseline repeats the camera-to-world and intrinsic matrices for every pixel to unproject
+the depth and rotate the Gaussians. On CUDA the peak allocated memory of the forward pass is
+reported; on CPU every run happens in a fresh process and the growth of its peak resident
+set is reported.
+"""
+
+import argparse
+import multiprocessing
+import resource
+import time
+import torch
+from einops import rearrange, repeat
+
+from depth_anything_3.model.gs_adapter import GaussianAdapter
+from depth_anything_3.model.utils.transform import mat_to_quat, quat_to_mat
+from depth_anything_3.specs import Gaussians
+from depth_anything_3.utils.geometry import affine_inverse, get_world_rays, sample_image_grid
+from depth_anything_3.utils.sh_helpers import rotate_sh
+
+
+class PerPixelMatrixGaussianAdapter(GaussianAdapter):
+    """Previous GaussianAdapter forward, with camera matrices repeated for every pixel."""
+
+    def forward(self, extrinsics, intrinsics, depths, opacities, raw_gaussians, image_shape):
+        device, dtype = extrinsics.device, raw_gaussians.dtype
+        H, W = image_shape
+        b, v = raw_gaussians.shape[:2]
+        cam2worlds = affine_inverse(extrinsics)
+        intr_normed = intrinsics.clone().detach()
+        intr_normed[..., 0, :] /= W
+        intr_normed[..., 1, :] /= H
+
+        gs_depths = depths + raw_gaussians[..., -1]
+        raw_gaussians = raw_gaussians[..., :-1]
+        xy_ray, _ = sample_image_grid((H, W), device)
+        xy_ray = xy_ray[None, None, ...].expand(b, v, -1, -1, -1)
+        pixel_size = 1 / torch.tensor((W, H), dtype=xy_ray.dtype, device=device)
+        xy_ray = xy_ray + raw_gaussians[..., :2] * pixel_size
+        raw_gaussians = raw_gaussians[..., 2:]
+        origins, directions = get_world_rays(
+            xy_ray,
+            repeat(cam2worlds, "b v i j -> b v h w i j", h=H, w=W),
+            repeat(intr_normed, "b v i j -> b v h w i j", h=H, w=W),
+        )
+        means = rearrange(origins + directions * gs_depths[..., None], "b v h w d -> b (v h w) d")
+
+        scales, rotations, sh = raw_gaussians.split((3, 4, 3 * self.d_sh), dim=-1)
+        scales = (
+            self.gaussian_scale_min
+            + (self.gaussian_scale_max - self.gaussian_scale_min) * scales.sigmoid()
+        )
+        pixel_size = 1 / torch.tensor((W, H), dtype=dtype, device=device)
+        multiplier = self.get_scale_multiplier(intr_normed, pixel_size)
+        scales = scales * gs_depths[..., None] * multiplier[..., None, None, None]
+
+        rotations = rotations / (rotations.norm(dim=-1, keepdim=True) + 1e-8)
+        cam_quat = rearrange(rotations, "b v h w c -> b (v h w) c")[..., [3, 0, 1, 2]]
+        c2w_mat = repeat(cam2worlds, "b v i j -> b (v h w) i j", h=H, w=W)
+        rotmat_world = c2w_mat[..., :3, :3] @ quat_to_mat(cam_quat)
+        world_quat = mat_to_quat(rotmat_world)
+
+        sh = rearrange(sh, "... (xyz d_sh) -> ... xyz d_sh", xyz=3) * self.sh_mask
+        if self.sh_degree > 0:
+            sh = rotate_sh(sh, cam2worlds[:, :, None, None, None, :3, :3])
+        return Gaussians(
+            means=means,
+            harmonics=rearrange(sh, "b v h w xyz d_sh -> b (v h w) xyz d_sh"),
+            opacities=rearrange(opacities, "b v h w -> b (v h w)"),
+            scales=rearrange(scales, "b v h w d -> b (v h w) d"),
+            rotations=world_quat,
+        )
+
+
+def make_inputs(adapter: GaussianAdapter, views: int, height: int, width: int, device: str):
+    """Random cameras and head outputs of one scene."""
+    generator = torch.Generator().manual_seed(0)
+    rotation, _ = torch.linalg.qr(torch.randn(views, 3, 3, generator=generator))
+    rotation = rotation * torch.linalg.det(rotation)[:, None, None]
+    extrinsics = torch.eye(4).repeat(views, 1, 1)
+    extrinsics[:, :3, :3] = rotation
+    extrinsics[:, :3, 3] = torch.randn(views, 3, generator=generator)
+    focal = 0.8 * max(height, width)
+    intrinsics = torch.tensor([[focal, 0, width / 2], [0, focal, height / 2], [0, 0, 1]])
+    shape = (1, views, height, width)
+    inputs = dict(
+        extrinsics=extrinsics[None],
+        intrinsics=intrinsics.repeat(1, views, 1, 1),
+        depths=torch.rand(shape, generator=generator) + 1,
+        opacities=torch.rand(shape, generator=generator),
+        raw_gaussians=torch.randn(*shape, adapter.d_in, generator=generator),
+        image_shape=(height, width),
+    )
+    return {k: v.to(device) if torch.is_tensor(v) else v for k, v in inputs.items()}
+
+
+def resident_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+
+
+def measure(implementation: str, args) -> tuple[float, float]:
+    """Peak memory growth in MB and latency in seconds of one adapter forward pass."""
+    adapters = {"broadcast": GaussianAdapter, "per-pixel": PerPixelMatrixGaussianAdapter}
+    adapter = adapters[implementation](sh_degree=args.sh_degree, pred_offset_depth=True)
+    adapter = adapter.to(args.device)
+    inputs = make_inputs(adapter, args.views, args.height, args.width, args.device)
+    with torch.no_grad():
+        if args.device.startswith("cuda"):
+            torch.cuda.synchronize()
+            torch.cuda.reset_peak_memory_stats()
+            start_mb = torch.cuda.memory_allocated() / 2**20
+            start_time = time.perf_counter()
+            gaussians = adapter(**inputs)
+            torch.cuda.synchronize()
+            latency = time.perf_counter() - start_time
+            peak_mb = torch.cuda.max_memory_allocated() / 2**20 - start_mb
+        else:
+            start_mb = resident_mb()
+            start_time = time.perf_counter()
+            gaussians = adapter(**inputs)
+            latency = time.perf_counter() - start_time
+            peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - start_mb
+    del gaussians
+    return peak_mb, latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory of the Gaussian adapter")
+    parser.add_argument("--views", type=int, default=32, help="Number of views")
+    parser.add_argument("--height", type=int, default=504, help="Image height")
+    parser.add_argument("--width", type=int, default=504, help="Image width")
+    parser.add_argument("--sh-degree", type=int, default=2, help="Spherical harmonics degree")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    num_gaussians = args.views * args.height * args.width
+    print(f"Views: {args.views}, resolution: {args.height}x{args.width}, device: {args.device}")
+    print(f"Gaussians: {num_gaussians}")
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for implementation in ("per-pixel", "broadcast"):
+        # A fresh process per run keeps the CPU peak resident set of one run apart
+        with context.Pool(1) as pool:
+            results[implementation] = pool.apply(measure, (implementation, args))
+        peak_mb, latency = results[implementation]
+        print(
+            f"{implementation}: peak {peak_mb:.1f} MB "
+            f"({peak_mb * 2**20 / num_gaussians:.1f} B/Gaussian), latency {latency:.3f} s"
+        )
+    print(f"Peak memory reduction: {results['per-pixel'][0] / results['broadcast'][0]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
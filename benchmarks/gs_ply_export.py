@@ -0,0 +1,92 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Export time of Gaussian PLY files against the previous per-Gaussian tuple writer.
+
+Usage:
+    python benchmarks/gs_ply_export.py --num-gaussians 4000000 --device cuda
+
+The baseline builds the structured array with one Python tuple per Gaussian and writes it
+with plyfile. Both writers produce byte-identical files, which is checked as well.
+"""
+
+import argparse
+import filecmp
+import os
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+import torch
+from plyfile import PlyData, PlyElement
+
+from depth_anything_3.utils.gsply_helpers import construct_list_of_attributes, export_ply
+
+
+def export_ply_per_gaussian(means, scales, rotations, harmonics, opacities, path: Path):
+    """Previous DC-only writer, filling the structured array from per-Gaussian tuples."""
+    dtype_full = [(attribute, "f4") for attribute in construct_list_of_attributes(0)]
+    elements = np.empty(means.shape[0], dtype=dtype_full)
+    attributes = [
+        means.detach().cpu().numpy(),
+        torch.zeros_like(means).detach().cpu().numpy(),
+        harmonics[..., 0].detach().cpu().contiguous().numpy(),
+        opacities[..., None].detach().cpu().numpy(),
+        scales.log().detach().cpu().numpy(),
+        rotations.detach().cpu().numpy(),
+    ]
+    elements[:] = list(map(tuple, np.concatenate(attributes, axis=1)))
+    PlyData([PlyElement.describe(elements, "vertex")]).write(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export time of Gaussian PLY files")
+    parser.add_argument("--num-gaussians", type=int, default=4_000_000, help="Scene size")
+    parser.add_argument("--sh-degree", type=int, default=2, help="Spherical harmonics degree")
+    parser.add_argument("--chunk-size", type=int, default=1 << 20, help="0 writes at once")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    generator = torch.Generator().manual_seed(0)
+    n = args.num_gaussians
+    gaussians = dict(
+        means=torch.randn(n, 3, generator=generator),
+        scales=torch.rand(n, 3, generator=generator) + 0.01,
+        rotations=torch.randn(n, 4, generator=generator),
+        harmonics=torch.randn(n, 3, (args.sh_degree + 1) ** 2, generator=generator),
+        opacities=torch.randn(n, generator=generator),
+    )
+    gaussians = {k: v.to(args.device) for k, v in gaussians.items()}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        baseline_path = Path(tmp_dir) / "per_gaussian.ply"
+        start_time = time.perf_counter()
+        export_ply_per_gaussian(**gaussians, path=baseline_path)
+        baseline_time = time.perf_counter() - start_time
+
+        path = Path(tmp_dir) / "chunked.ply"
+        start_time = time.perf_counter()
+        export_ply(**gaussians, path=path, chunk_size=args.chunk_size or None)
+        elapsed = time.perf_counter() - start_time
+        identical = filecmp.cmp(baseline_path, path, shallow=False)
+        size_mb = os.path.getsize(path) / 2**20
+
+    print(f"Gaussians: {n}, file size: {size_mb:.1f} MB, device: {args.device}")
+    print(f"per-Gaussian tuples: {baseline_time:.3f} s ({size_mb / baseline_time:.1f} MB/s)")
+    print(f"chunked rows: {elapsed:.3f} s ({size_mb / elapsed:.1f} MB/s)")
+    print(f"Speedup: {baseline_time / elapsed:.1f}x, identical files: {identical}")
+
+
+if __name__ == "__main__":
+    main()
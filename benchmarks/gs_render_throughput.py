@@ -0,0 +1,101 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Rendering throughput of the 3DGS rasterizers.
+
+Usage:
+    python benchmarks/gs_render_throughput.py --num-gaussians 1000000 --resolution 504 \\
+        --backend torch --device cpu --frames 8
+
+The scene mimics predicted Gaussians: one Gaussian per pixel of a few views of a wavy
+surface, with pixel-sized scales and SH coefficients of degree 2.
+"""
+
+import argparse
+import math
+import time
+import torch
+
+from depth_anything_3.model.utils.gs_renderer import render_3dgs
+from depth_anything_3.specs import Gaussians
+
+
+def make_scene(num_gaussians: int, sh_degree: int, device: str) -> Gaussians:
+    """Gaussians on a surface 2 to 6 units in front of the origin, facing +z."""
+    generator = torch.Generator().manual_seed(0)
+    num_sh = (sh_degree + 1) ** 2
+    xy = torch.rand(num_gaussians, 2, generator=generator) * 2 - 1
+    depth = 4 + 1.5 * torch.sin(3 * xy[:, 0]) * torch.cos(2 * xy[:, 1])
+    means = torch.cat([xy * depth[:, None] * 0.6, depth[:, None]], dim=-1)
+    pixel_footprint = 2.4 * depth / math.sqrt(num_gaussians)
+    scales = pixel_footprint[:, None] * (0.5 + torch.rand(num_gaussians, 3, generator=generator))
+    gaussians = Gaussians(
+        means=means[None],
+        scales=scales[None],
+        rotations=torch.nn.functional.normalize(
+            torch.randn(1, num_gaussians, 4, generator=generator), dim=-1
+        ),
+        harmonics=0.3 * torch.randn(1, num_gaussians, 3, num_sh, generator=generator),
+        opacities=0.5 + 0.5 * torch.rand(1, num_gaussians, generator=generator),
+    )
+    return Gaussians(**{k: v.to(device) for k, v in vars(gaussians).items()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frames per second of the 3DGS rasterizers")
+    parser.add_argument("--num-gaussians", type=int, default=1_000_000, help="Scene size")
+    parser.add_argument("--resolution", type=int, default=504, help="Square frame size")
+    parser.add_argument("--sh-degree", type=int, default=2, help="Spherical harmonics degree")
+    parser.add_argument("--frames", type=int, default=8, help="Timed frames")
+    parser.add_argument("--backend", default="torch", choices=["auto", "gsplat", "torch"])
+    parser.add_argument("--device", default="cpu", help="Device of the Gaussians")
+    parser.add_argument("--color-mode", default="RGB+ED", choices=["RGB+D", "RGB+ED"])
+    args = parser.parse_args()
+
+    gaussians = make_scene(args.num_gaussians, args.sh_degree, args.device)
+    # Normalized intrinsics and a camera sliding sideways along the scene
+    intrinsics = torch.tensor([[0.8, 0, 0.5], [0, 0.8, 0.5], [0, 0, 1]], device=args.device)
+    extrinsics = torch.eye(4, device=args.device).repeat(args.frames + 1, 1, 1)
+    extrinsics[:, 0, 3] = torch.linspace(-0.3, 0.3, args.frames + 1)
+
+    def render(frame: int):
+        return render_3dgs(
+            extrinsics=extrinsics[frame : frame + 1],
+            intrinsics=intrinsics[None],
+            image_shape=(args.resolution, args.resolution),
+            gaussian=gaussians,
+            color_mode=args.color_mode,
+            backend=args.backend,
+        )
+
+    with torch.no_grad():
+        render(0)  # warm-up
+        if args.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        start_time = time.perf_counter()
+        for frame in range(1, args.frames + 1):
+            color, depth = render(frame)
+        if args.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        elapsed = time.perf_counter() - start_time
+
+    print(f"Gaussians: {args.num_gaussians}, resolution: {args.resolution}x{args.resolution}")
+    print(f"Backend: {args.backend}, device: {args.device}, threads: {torch.get_num_threads()}")
+    print(f"Frame shape: {tuple(color.shape)}, mean depth: {depth.mean():.3f}")
+    fps = args.frames / elapsed
+    print(f"Throughput: {fps:.3f} frames/s ({elapsed / args.frames:.3f} s/frame)")
+
+
+if __name__ == "__main__":
+    main()
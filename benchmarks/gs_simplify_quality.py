@@ -0,0 +1,96 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Rendering quality of simplified Gaussians against keeping the top contributors only.
+
+Usage:
+    python benchmarks/gs_simplify_quality.py --num-gaussians 200000 --budgets 100000 50000
+
+Two overlapping views are mimicked by duplicating the scene of gs_render_throughput.py with
+a small jitter. Frames of the full scene are the reference; the PSNR of the frames rendered
+from simplify_gaussians and from the same number of Gaussians with the largest
+contribution_score is reported for each budget.
+"""
+
+import argparse
+import math
+import time
+import torch
+from gs_render_throughput import make_scene
+
+from depth_anything_3.model.utils.gs_renderer import render_3dgs
+from depth_anything_3.specs import Gaussians
+from depth_anything_3.utils.gs_simplify_helpers import (
+    GAUSSIAN_FIELDS,
+    contribution_score,
+    simplify_gaussians,
+)
+
+
+def psnr(image: torch.Tensor, reference: torch.Tensor) -> float:
+    return -10 * math.log10((image - reference).square().mean().item())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rendering quality of simplified Gaussians")
+    parser.add_argument("--num-gaussians", type=int, default=200_000, help="Gaussians per view")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[200_000, 100_000, 50_000])
+    parser.add_argument("--resolution", type=int, default=256, help="Square frame size")
+    parser.add_argument("--backend", default="auto", choices=["auto", "gsplat", "torch"])
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    scene = make_scene(args.num_gaussians, 1, args.device)
+    generator = torch.Generator().manual_seed(1)
+    jitter = 0.002 * torch.randn(scene.means.shape, generator=generator).to(args.device)
+    gaussians = Gaussians(
+        means=torch.cat([scene.means, scene.means + jitter], dim=1),
+        **{
+            name: torch.cat([getattr(scene, name)] * 2, dim=1)
+            for name in GAUSSIAN_FIELDS
+            if name != "means"
+        },
+    )
+    intrinsics = torch.tensor([[0.8, 0, 0.5], [0, 0.8, 0.5], [0, 0, 1]], device=args.device)
+
+    def render(gaussians: Gaussians) -> torch.Tensor:
+        return render_3dgs(
+            extrinsics=torch.eye(4, device=args.device)[None],
+            intrinsics=intrinsics[None],
+            image_shape=(args.resolution, args.resolution),
+            gaussian=gaussians,
+            color_mode="RGB+ED",
+            backend=args.backend,
+        )[0]
+
+    with torch.no_grad():
+        reference = render(gaussians)
+        print(f"Gaussians: {gaussians.means.shape[1]}, device: {args.device}")
+        for budget in args.budgets:
+            start_time = time.perf_counter()
+            simplified = simplify_gaussians(gaussians, max_gaussians=budget)
+            elapsed = time.perf_counter() - start_time
+            top = contribution_score(gaussians.scales[0], gaussians.opacities[0]).topk(
+                simplified.means.shape[1]
+            )
+            kept = Gaussians(**{k: getattr(gaussians, k)[:, top.indices] for k in GAUSSIAN_FIELDS})
+            print(
+                f"budget {budget}: {simplified.means.shape[1]} Gaussians in {elapsed:.2f} s, "
+                f"PSNR simplified {psnr(render(simplified), reference):.2f} dB, "
+                f"top contributors {psnr(render(kept), reference):.2f} dB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Parity and latency of the onnxruntime backend against the eager PyTorch model.
+
+Usage:
+    python benchmarks/onnx_parity.py da3-large.onnx assets/examples/SOH \\
+        --model-dir depth-anything/DA3-LARGE --process-res 504 --runs 3
+
+The PyTorch reference runs in fp32 unless ``--bf16`` is given. The ONNX file is exported
+from the PyTorch model first if it does not exist.
+"""
+
+import argparse
+import glob
+import os
+import time
+import numpy as np
+import torch
+
+from depth_anything_3.api import DepthAnything3
+from depth_anything_3.onnx_api import OnnxDepthAnything3
+from depth_anything_3.utils.quantization import compare_predictions
+
+
+def time_inference(fn, runs: int):
+    """Prediction of the last run and the median latency in seconds, after one warm-up run."""
+    prediction = fn()
+    latencies = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        prediction = fn()
+        latencies.append(time.perf_counter() - start_time)
+    return prediction, float(np.median(latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the ONNX backend with PyTorch")
+    parser.add_argument("onnx_path", help="ONNX file, exported if missing")
+    parser.add_argument("image_dir", help="Directory of input images")
+    parser.add_argument("--model-dir", default="depth-anything/DA3-LARGE", help="Model directory")
+    parser.add_argument("--device", default="cpu", help="Device of the PyTorch model")
+    parser.add_argument("--max-views", type=int, default=8, help="Number of images used")
+    parser.add_argument("--process-res", type=int, default=504, help="Processing resolution")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per backend")
+    parser.add_argument("--num-threads", type=int, default=None, help="onnxruntime threads")
+    parser.add_argument(
+        "--bf16",
+        default="off",
+        choices=["auto", "on", "off"],
+        help="bf16 autocast of the PyTorch model on CPU; the ONNX graph runs in fp32",
+    )
+    args = parser.parse_args()
+
+    images = sorted(
+        path
+        for ext in ("jpg", "jpeg", "png", "JPG", "PNG")
+        for path in glob.glob(os.path.join(args.image_dir, f"*.{ext}"))
+    )[: args.max_views]
+    if not images:
+        raise SystemExit(f"No images found in {args.image_dir}")
+
+    model = DepthAnything3.from_pretrained(args.model_dir).to(args.device)
+    # Compare against an fp32 reference by default, so that the differences are not bf16 rounding
+    model.configure_cpu(bf16={"auto": None, "on": True, "off": False}[args.bf16])
+    if not os.path.exists(args.onnx_path):
+        model.export_onnx(args.onnx_path)
+    onnx_model = OnnxDepthAnything3(args.onnx_path, num_threads=args.num_threads)
+
+    with torch.inference_mode():
+        reference, torch_latency = time_inference(
+            lambda: model.inference(images, process_res=args.process_res), args.runs
+        )
+    prediction, onnx_latency = time_inference(
+        lambda: onnx_model.inference(images, process_res=args.process_res), args.runs
+    )
+
+    print(f"Views: {len(images)}, processed shape: {reference.depth.shape}")
+    print(f"PyTorch ({args.device}) latency: {torch_latency:.3f} s")
+    print(f"onnxruntime latency: {onnx_latency:.3f} s")
+    for key, value in compare_predictions(reference, prediction).items():
+        print(f"{key}: {value:.6f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+CPU throughput and resident weight size of the quantization modes against the float model.
+
+Usage:
+    python benchmarks/quantization_throughput.py --model da3-base --views 4 --resolution 378 \\
+        --threads 1 --pretrained depth-anything/DA3-BASE
+
+Every mode converts a fresh copy of the model and times the forward pass on the same random
+views, so preprocessing is excluded. Without ``--pretrained`` the weights are randomly
+initialized, which does not change the timings. The widest linear layer of the model is
+also timed alone with the token count of the views, since linear layers are only part of
+the forward pass (attention and the convolutions of the heads stay in floating point).
+"""
+
+import argparse
+import functools
+import time
+import torch
+import torch.nn as nn
+
+from depth_anything_3.api import DepthAnything3
+from depth_anything_3.utils.quantization import (
+    QUANTIZATION_MODES,
+    QuantizedLinear,
+    dynamic_int8_engine,
+    module_nbytes,
+)
+
+
+def load(args) -> DepthAnything3:
+    if args.pretrained is not None:
+        model = DepthAnything3.from_pretrained(args.pretrained).to("cpu")
+    else:
+        torch.manual_seed(0)
+        model = DepthAnything3(args.model).to("cpu")
+    bf16 = {"auto": None, "on": True, "off": False}[args.bf16]
+    model.configure_cpu(num_threads=args.threads, bf16=bf16)
+    return model
+
+
+def time_call(fn, repeats: int) -> float:
+    fn()  # warm-up
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start_time) / repeats
+
+
+def time_widest_linear(model: DepthAnything3, args) -> None:
+    """Latency of the widest linear layer in float and in every quantization mode."""
+    linear = max(
+        (m for m in model.model.modules() if isinstance(m, nn.Linear)),
+        key=lambda m: m.in_features * m.out_features,
+    )
+    tokens = args.views * (args.resolution // 14) ** 2
+    x = torch.randn(tokens, linear.in_features)
+    print(f"Widest linear layer {linear.in_features}->{linear.out_features}, {tokens} tokens:")
+    with torch.no_grad():
+        reference = time_call(functools.partial(linear, x), 5)
+        print(f"  float: {reference * 1000:.1f} ms")
+        for mode in QUANTIZATION_MODES:
+            layer = QuantizedLinear.from_linear(linear)
+            latency = time_call(functools.partial(layer, x), 5)
+            print(f"  {mode}: {latency * 1000:.1f} ms, {reference / latency:.2f}x of float")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU throughput of the quantization modes")
+    parser.add_argument("--model", default="da3-base", help="Model preset")
+    parser.add_argument("--pretrained", default=None, help="Weights for from_pretrained")
+    parser.add_argument("--views", type=int, default=4, help="Number of views")
+    parser.add_argument("--resolution", type=int, default=378, help="Square view size")
+    parser.add_argument("--threads", type=int, default=1, help="CPU threads")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed forward passes")
+    parser.add_argument("--modes", nargs="+", default=["float", *QUANTIZATION_MODES])
+    parser.add_argument(
+        "--bf16", default="off", choices=["auto", "on", "off"], help="bf16 autocast of float ops"
+    )
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    generator = torch.Generator().manual_seed(0)
+    size = (1, args.views, 3, args.resolution, args.resolution)
+    image = torch.randn(size, generator=generator)
+    print(f"Model: {args.model}, views: {args.views}, resolution: {args.resolution}")
+    print(f"Threads: {args.threads}, bf16: {args.bf16}, dynamic_int8: {dynamic_int8_engine()}")
+
+    latencies = {}
+    for mode in args.modes:
+        model = load(args)
+        if mode == "float":
+            time_widest_linear(model, args)
+        else:
+            model.quantize(mode=mode, save_dir=None)
+        # the warm-up call also prepacks the dynamic_int8 weights
+        latencies[mode] = time_call(functools.partial(model.forward, image), args.repeats)
+        speedup = latencies.get("float", latencies[mode]) / latencies[mode]
+        weights_mb = module_nbytes(model.model) / 1024**2
+        print(
+            f"{mode}: {latencies[mode]:.2f} s/forward, {speedup:.2f}x of float, "
+            f"{weights_mb:.0f} MB of resident weights"
+        )
+        del model
+
+
+if __name__ == "__main__":
+    main()
@@ -20,23 +20,49 @@ inference, and export capabilities. It supports both single and nested model arc
 
 from __future__ import annotations
 
+import os
 import time
+from dataclasses import fields
 from typing import Optional, Sequence
 import numpy as np
+import safetensors.torch
 import torch
 import torch.nn as nn
+from addict import Dict as AddictDict
 from huggingface_hub import PyTorchModelHubMixin
 from PIL import Image
 
 from depth_anything_3.cfg import create_object, load_config
+from depth_anything_3.model.compiled import CompiledForward
+from depth_anything_3.model.da3 import DepthAnything3Net, NestedDepthAnything3Net
+from depth_anything_3.model.dinov2.layers.token_merge import TokenMergeRatio
+from depth_anything_3.model.onnx_export import DEFAULT_OPSET, export_onnx
+from depth_anything_3.model.streaming import StreamingState
 from depth_anything_3.registry import MODEL_REGISTRY
-from depth_anything_3.specs import Prediction
+from depth_anything_3.session import StreamingSession
+from depth_anything_3.specs import Gaussians, Prediction
+from depth_anything_3.utils.device import (
+    CPU_STAGES,
+    convs_to_channels_last,
+    cpu_threads,
+    get_autocast_dtype,
+    set_interop_threads,
+)
 from depth_anything_3.utils.export import export
 from depth_anything_3.utils.geometry import affine_inverse
 from depth_anything_3.utils.io.input_processor import InputProcessor
 from depth_anything_3.utils.io.output_processor import OutputProcessor
 from depth_anything_3.utils.logger import logger
-from depth_anything_3.utils.pose_align import align_poses_umeyama
+from depth_anything_3.utils.prediction_helpers import (
+    add_processed_images,
+    align_to_input_extrinsics_intrinsics,
+)
+from depth_anything_3.utils.quantization import (
+    compare_predictions,
+    module_nbytes,
+    quantize_linears,
+    quantized_weights_path,
+)
 
 torch.backends.cudnn.benchmark = False
 # logger.info("CUDNN Benchmark Disabled")
@@ -72,17 +98,23 @@ class DepthAnything3(nn.Module, PyTorchModelHubMixin):
 
     _commit_hash: str | None = None  # Set by mixin when loading from Hub
 
-    def __init__(self, model_name: str = "da3-large", **kwargs):
+    def __init__(self, model_name: str = "da3-large", quantization: str | None = None, **kwargs):
         """
         Initialize DepthAnything3 with specified preset.
 
         Args:
         model_name: The name of the model preset to use.
                     Examples: 'da3-giant', 'da3-large', 'da3metric-large', 'da3nested-giant-large'.
+        quantization: Quantization mode applied when loading with ``from_pretrained``,
+                    see ``quantize``. Quantized weights saved next to ``model.safetensors``
+                    are loaded directly when present.
         **kwargs: Additional keyword arguments (currently unused).
         """
         super().__init__()
         self.model_name = model_name
+        self.quantization = None  # Set by quantize()
+        self._pending_quantization = quantization
+        self.weights_dir = None  # Directory of model.safetensors, set by from_pretrained
 
         # Build the underlying network
         self.config = load_config(MODEL_REGISTRY[self.model_name])
@@ -96,6 +128,27 @@ class DepthAnything3(nn.Module, PyTorchModelHubMixin):
         # Device management (set by user)
         self.device = None
 
+        # Shape-bucketed compiled execution (set by enable_compile)
+        self.compiled = None
+
+        # CPU execution profile (set by configure_cpu)
+        self.cpu_bf16 = None
+        self.cpu_threads = dict.fromkeys(CPU_STAGES)
+
+    @classmethod
+    def _load_as_safetensor(cls, model, model_file: str, map_location: str, strict: bool):
+        model.weights_dir = os.path.dirname(model_file)
+        mode = model._pending_quantization
+        if mode is not None and os.path.exists(quantized_weights_path(model.weights_dir, mode)):
+            # The float weights are not needed, load the quantized ones directly
+            model.to(map_location)
+            model.quantize(mode)
+            return model.eval()
+        model = super()._load_as_safetensor(model, model_file, map_location, strict)
+        if mode is not None:
+            model.quantize(mode)
+        return model
+
     @torch.inference_mode()
     def forward(
         self,
@@ -106,6 +159,17 @@ class DepthAnything3(nn.Module, PyTorchModelHubMixin):
         infer_gs: bool = False,
         use_ray_pose: bool = False,
         ref_view_strategy: str = "saddle_balanced",
+        ref_view_idx: int | None = None,
+        global_attn_mode: str = "full",
+        global_attn_kwargs: dict | None = None,
+        stream_state: StreamingState | None = None,
+        token_merge_ratio: TokenMergeRatio | None = None,
+        memory_budget: float | None = None,
+        low_memory: bool = False,
+        offload_aux_feats: bool = False,
+        view_sizes: torch.Tensor | None = None,
+        outputs: Sequence[str] | None = None,
+        output_indices: Sequence[int] | None = None,
     ) -> dict[str, torch.Tensor]:
         """
         Forward pass through the model.
@@ -118,16 +182,52 @@ class DepthAnything3(nn.Module, PyTorchModelHubMixin):
             infer_gs: Enable Gaussian Splatting branch.
             use_ray_pose: Use ray-based pose estimation instead of camera decoder.
             ref_view_strategy: Strategy for selecting reference view from multiple views.
+            ref_view_idx: Precomputed reference view index, skips the selection.
+            global_attn_mode: Sparse attention mode of the global blocks.
+            global_attn_kwargs: Options of the sparse attention mode.
+            stream_state: Streaming state holding the global keys/values of the views
+                processed before. Only the views in ``image`` are run; see ``open_session``.
+            token_merge_ratio: Token merging ratio of the local blocks.
+            memory_budget: Activation memory budget of the backbone in GB.
+            low_memory: Defer concatenation of backbone features until the heads consume them.
+            offload_aux_feats: Offload exported features to CPU in fp16 as soon as produced.
+            view_sizes: Valid ``(H, W)`` of each view with shape ``(B, N, 2)`` when views of
+                different sizes are padded to a common size.
+            outputs: Outputs to compute, see ``inference``.
+            output_indices: Indices of the views to decode, see ``inference``.
 
         Returns:
             Dictionary containing model predictions
         """
-        # Determine optimal autocast dtype
-        autocast_dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+        export_feat_layers = list(export_feat_layers) if export_feat_layers is not None else []
+        # Determine optimal autocast dtype, None runs in fp32
+        autocast_dtype = get_autocast_dtype(image.device.type, self.cpu_bf16)
+        model = self.compiled if self.compiled is not None else self.model
         with torch.no_grad():
-            with torch.autocast(device_type=image.device.type, dtype=autocast_dtype):
-                return self.model(
-                    image, extrinsics, intrinsics, export_feat_layers, infer_gs, use_ray_pose, ref_view_strategy
+            with torch.autocast(
+                device_type=image.device.type,
+                dtype=autocast_dtype,
+                enabled=autocast_dtype is not None,
+            ):
+                return model(
+                    image,
+                    extrinsics,
+                    intrinsics,
+                    export_feat_layers,
+                    infer_gs,
+                    use_ray_pose,
+                    ref_view_strategy,
+                    ref_view_idx=ref_view_idx,
+                    global_attn_mode=global_attn_mode,
+                    global_attn_kwargs=global_attn_kwargs,
+                    stream_state=stream_state,
+                    token_merge_ratio=token_merge_ratio,
+                    memory_budget=memory_budget,
+                    low_memory=low_memory,
+                    offload_aux_feats=offload_aux_feats,
+                    view_sizes=view_sizes,
+                    outputs=outputs,
+                    output_indices=output_indices,
                 )
 
     def inference(
@@ -139,11 +239,21 @@ class DepthAnything3(nn.Module, PyTorchModelHubMixin):
         infer_gs: bool = False,
         use_ray_pose: bool = False,
         ref_view_strategy: str = "saddle_balanced",
+        ref_view_idx: int | None = None,
+        global_attn_mode: str = "full",
+        global_attn_kwargs: dict | None = None,
+        token_merge_ratio: TokenMergeRatio | None = None,
+        memory_budget: float | None = None,
+        low_memory: bool = False,
+        offload_aux_feats: bool = False,
         render_exts: np.ndarray | None = None,
         render_ixts: np.ndarray | None = None,
         render_hw: tuple[int, int] | None = None,
         process_res: int = 504,
         process_res_method: str = "upper_bound_resize",
+        pad_mixed_sizes: bool = False,
+        outputs: Sequence[str] | None = None,
+        output_indices: Sequence[int] | None = None,
         export_dir: str | None = None,
         export_format: str = "mini_npz",
         export_feat_layers: Sequence[int] | None = None,
@@ -164,16 +274,58 @@ class DepthAnything3(nn.Module, PyTorchModelHubMixin):
             extrinsics: Camera extrinsics (N, 4, 4)
             intrinsics: Camera intrinsics (N, 3, 3)
             align_to_input_ext_scale: whether to align the input pose scale to the prediction
-            infer_gs: Enable the 3D Gaussian branch (needed for `gs_ply`/`gs_video` exports)
+            infer_gs: Enable the 3D Gaussian branch (needed for the `gs_*` exports)
             use_ray_pose: Use ray-based pose estimation instead of camera decoder (default: False)
             ref_view_strategy: Strategy for selecting reference view from multiple views.
                 Options: "first", "middle", "saddle_balanced", "saddle_sim_range".
                 Default: "saddle_balanced". For single view input (S ≤ 2), no reordering is performed.
+            ref_view_idx: Reference view index to use instead of running the selection, e.g.
+                `prediction.ref_view_idx` of an earlier run on the same views. Default: None.
+            global_attn_mode: Attention pattern of the global (cross-view) blocks.
+                Options: "full" (dense), "window" (each view attends to views within ±k),
+                "keyframe" (each view attends to itself and a keyframe subset).
+                The reference view is always attended to. Sparse modes make the cost of
+                the global blocks grow linearly with the number of views. Default: "full".
+            global_attn_kwargs: Options of the sparse mode: {"window": k} for "window" mode,
+                {"keyframes": interval or list of view indices} for "keyframe" mode.
+            token_merge_ratio: Merge redundant patch tokens (ToMe) in the per-view local blocks.
+                Either a single ratio for all local blocks or a list of
+                (start_block, end_block, ratio) ranges with end exclusive. The ratio is the
+                fraction of patch tokens merged away (at most 0.75); tokens are unmerged
+                after every block, so the heads see the full patch grid. Trades a little
+                accuracy for backbone FLOPs at high process_res. Default: None (disabled).
+            memory_budget: Activation memory budget of the backbone in GB. Local blocks run
+                over chunks of views and global attention is computed exactly in query chunks
+                (with online softmax over key chunks if needed), so peak activation memory
+                no longer grows quadratically with the number of views. Useful for large
+                scenes on CPU. Default: None (unbounded).
+            low_memory: Keep references to backbone block outputs instead of concatenated,
+                reordered copies; features are built per view chunk when the heads consume
+                them. Roughly halves backbone output memory for large models. Default: False.
+            offload_aux_feats: Move the features of `export_feat_layers` to CPU in fp16 as
+                soon as they are produced. Default: False.
             render_exts: Optional render extrinsics for Gaussian video export
             render_ixts: Optional render intrinsics for Gaussian video export
             render_hw: Optional render resolution for Gaussian video export
             process_res: Processing resolution
             process_res_method: Resize method for processing
+            pad_mixed_sizes: Pad images that end up with different sizes (e.g. mixed
+                orientations) to a common size instead of center-cropping them to the
+                smallest one. Padded tokens are masked out of attention and the heads run on
+                the valid region of each view; outputs stay on the padded canvas with zero
+                depth and confidence outside ``prediction.view_sizes``. Not supported with
+                infer_gs, token merging, memory budgets, low_memory or sparse global
+                attention. Default: False.
+            outputs: Outputs to compute, a subset of {"depth", "conf", "sky", "pose", "rays",
+                "gs"}. Heads, branches and the camera decoder that no selected output depends
+                on are skipped, e.g. {"pose"} skips the dense heads of models with a camera
+                decoder. "rays" keeps the raw ray maps of the DualDPT head. "gs" is selected
+                by ``infer_gs``. Default: None (depth, conf, sky and pose).
+            output_indices: Indices of the views to return outputs for. All views take part
+                in the backbone, so the other views still improve multi-view consistency,
+                but only the selected views go through the heads, output conversion,
+                alignment and export; the returned arrays hold the selected views in the
+                given order. Default: None (all views).
             export_dir: Directory to export results
             export_format: Export format (mini_npz, npz, glb, ply, gs, gs_video)
             export_feat_layers: Layer indices to export intermediate features from
@@ -193,12 +345,20 @@ class DepthAnything3(nn.Module, PyTorchModelHubMixin):
             assert isinstance(image[0], str), "`image` must be image paths for COLMAP export."
 
         # Preprocess images
-        imgs_cpu, extrinsics, intrinsics = self._preprocess_inputs(
-            image, extrinsics, intrinsics, process_res, process_res_method
+        imgs_cpu, extrinsics, intrinsics, view_sizes = self._preprocess_inputs(
+            image, extrinsics, intrinsics, process_res, process_res_method, pad_mixed_sizes
         )
+        if self.compiled is not None and view_sizes is None:
+            imgs_cpu, intrinsics = self.compiled.snap_inputs(imgs_cpu, intrinsics)
+        model_outputs = outputs
+        if outputs is not None and extrinsics is not None:
+            # Input poses are aligned to the predicted ones
+            model_outputs = {*outputs, "pose"}
 
         # Prepare tensors for model
         imgs, ex_t, in_t = self._prepare_model_inputs(imgs_cpu, extrinsics, intrinsics)
+        if view_sizes is not None:
+            view_sizes = view_sizes.to(imgs.device)[None]
 
         # Normalize extrinsics
         ex_t_norm = self._normalize_extrinsics(ex_t.clone() if ex_t is not None else None)
@@ -207,70 +367,484 @@ class DepthAnything3(nn.Module, PyTorchModelHubMixin):
         export_feat_layers = list(export_feat_layers) if export_feat_layers is not None else []
 
         raw_output = self._run_model_forward(
-            imgs, ex_t_norm, in_t, export_feat_layers, infer_gs, use_ray_pose, ref_view_strategy
+            imgs,
+            ex_t_norm,
+            in_t,
+            export_feat_layers,
+            infer_gs,
+            use_ray_pose,
+            ref_view_strategy,
+            ref_view_idx,
+            global_attn_mode,
+            global_attn_kwargs,
+            token_merge_ratio=token_merge_ratio,
+            memory_budget=memory_budget,
+            low_memory=low_memory,
+            offload_aux_feats=offload_aux_feats,
+            view_sizes=view_sizes,
+            outputs=model_outputs,
+            output_indices=output_indices,
         )
 
         # Convert raw output to prediction
         prediction = self._convert_to_prediction(raw_output)
+        if output_indices is not None:
+            # Context-only views have no outputs
+            output_indices = list(output_indices)
+            imgs_cpu = imgs_cpu[output_indices]
+            image = [image[i] for i in output_indices]
+            if extrinsics is not None:
+                extrinsics = extrinsics[output_indices]
+            if intrinsics is not None:
+                intrinsics = intrinsics[output_indices]
 
         # Align prediction to extrinsincs
-        prediction = self._align_to_input_extrinsics_intrinsics(
+        prediction = align_to_input_extrinsics_intrinsics(
             extrinsics, intrinsics, prediction, align_to_input_ext_scale
         )
+        if outputs is not None and "pose" not in outputs:
+            prediction.extrinsics = prediction.intrinsics = None
 
         # Add processed images for visualization
-        prediction = self._add_processed_images(prediction, imgs_cpu)
+        prediction = add_processed_images(prediction, imgs_cpu)
 
         # Export if requested
         if export_dir is not None:
+            export_format, scene_export_kwargs = self._prepare_export_kwargs(
+                image,
+                export_format,
+                export_kwargs,
+                infer_gs=infer_gs,
+                render_exts=render_exts,
+                render_ixts=render_ixts,
+                render_hw=render_hw,
+                process_res_method=process_res_method,
+                conf_thresh_percentile=conf_thresh_percentile,
+                num_max_points=num_max_points,
+                show_cameras=show_cameras,
+                feat_vis_fps=feat_vis_fps,
+            )
+            self._export_results(prediction, export_format, export_dir, **scene_export_kwargs)
 
-            if "gs" in export_format:
-                if infer_gs and "gs_video" not in export_format:
-                    export_format = f"{export_format}-gs_video"
-                if "gs_video" in export_format:
-                    if "gs_video" not in export_kwargs:
-                        export_kwargs["gs_video"] = {}
-                    export_kwargs["gs_video"].update(
-                        {
-                            "extrinsics": render_exts,
-                            "intrinsics": render_ixts,
-                            "out_image_hw": render_hw,
-                        }
-                    )
-            # Add GLB export parameters
-            if "glb" in export_format:
-                if "glb" not in export_kwargs:
-                    export_kwargs["glb"] = {}
-                export_kwargs["glb"].update(
-                    {
-                        "conf_thresh_percentile": conf_thresh_percentile,
-                        "num_max_points": num_max_points,
-                        "show_cameras": show_cameras,
-                    }
-                )
-            # Add Feat_vis export parameters
-            if "feat_vis" in export_format:
-                if "feat_vis" not in export_kwargs:
-                    export_kwargs["feat_vis"] = {}
-                export_kwargs["feat_vis"].update(
-                    {
-                        "fps": feat_vis_fps,
-                    }
+        return prediction
+
+    def inference_batch(
+        self,
+        scenes: list[list[np.ndarray | Image.Image | str]],
+        extrinsics: Sequence[np.ndarray | None] | None = None,
+        intrinsics: Sequence[np.ndarray | None] | None = None,
+        align_to_input_ext_scale: bool = True,
+        infer_gs: bool = False,
+        use_ray_pose: bool = False,
+        ref_view_strategy: str = "saddle_balanced",
+        process_res: int = 504,
+        process_res_method: str = "upper_bound_resize",
+        max_batch_size: int | None = None,
+        export_dirs: Sequence[str] | None = None,
+        export_format: str = "mini_npz",
+        export_feat_layers: Sequence[int] | None = None,
+        conf_thresh_percentile: float = 40.0,
+        num_max_points: int = 1_000_000,
+        show_cameras: bool = True,
+        feat_vis_fps: int = 15,
+        export_kwargs: Optional[dict] = None,
+    ) -> list[Prediction]:
+        """
+        Run inference on many independent scenes with batched forward passes.
+
+        Scenes with the same number of views and processed resolution (and the same
+        availability of input cameras) are stacked along the batch dimension and run in one
+        forward pass. Each scene is still predicted on its own: views only attend to views of
+        the same scene, and alignment to input cameras, metric scaling and export are done
+        per scene.
+
+        Args:
+            scenes: List of scenes, each a list of input images (numpy arrays, PIL Images,
+                or file paths)
+            extrinsics: Optional camera extrinsics (N, 4, 4) per scene, None entries allowed
+            intrinsics: Optional camera intrinsics (N, 3, 3) per scene, None entries allowed
+            align_to_input_ext_scale: whether to align the input pose scale to the prediction
+            infer_gs: Enable the 3D Gaussian branch (needed for the `gs_*` exports)
+            use_ray_pose: Use ray-based pose estimation instead of camera decoder
+            ref_view_strategy: Strategy for selecting the reference view of each scene
+            process_res: Processing resolution
+            process_res_method: Resize method for processing
+            max_batch_size: Maximum number of scenes per forward pass (None: unbounded)
+            export_dirs: Export directory per scene, results are not exported if None
+            export_format: Export format (mini_npz, npz, glb, ply, gs, gs_video)
+            export_feat_layers: Layer indices to export intermediate features from
+            conf_thresh_percentile: [GLB] Lower percentile for adaptive confidence threshold
+            num_max_points: [GLB] Maximum number of points in the point cloud
+            show_cameras: [GLB] Show camera wireframes in the exported scene
+            feat_vis_fps: [FEAT_VIS] Frame rate for output video
+            export_kwargs: additional arguments to export functions.
+
+        Returns:
+            One Prediction per scene, in the order of ``scenes``
+        """
+        num_scenes = len(scenes)
+        extrinsics = list(extrinsics) if extrinsics is not None else [None] * num_scenes
+        intrinsics = list(intrinsics) if intrinsics is not None else [None] * num_scenes
+        if len(extrinsics) != num_scenes or len(intrinsics) != num_scenes:
+            raise ValueError("extrinsics and intrinsics must have one entry per scene.")
+        if export_dirs is not None and len(export_dirs) != num_scenes:
+            raise ValueError("export_dirs must have one entry per scene.")
+        if "gs" in export_format:
+            assert infer_gs, "must set `infer_gs=True` to perform gs-related export."
+        if max_batch_size is not None and max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be positive, got {max_batch_size}")
+        export_feat_layers = list(export_feat_layers) if export_feat_layers is not None else []
+
+        # Preprocess every scene on its own, views of different scenes are never cropped
+        # to a common size
+        inputs = []
+        for images, scene_ext, scene_ixt in zip(scenes, extrinsics, intrinsics):
+            imgs_cpu, scene_ext, scene_ixt, _ = self._preprocess_inputs(
+                images, scene_ext, scene_ixt, process_res, process_res_method
+            )
+            if self.compiled is not None:
+                imgs_cpu, scene_ixt = self.compiled.snap_inputs(imgs_cpu, scene_ixt)
+            inputs.append((imgs_cpu, scene_ext, scene_ixt))
+
+        # Group scenes that can share a forward pass
+        groups: dict[tuple, list[int]] = {}
+        for i, (imgs_cpu, scene_ext, scene_ixt) in enumerate(inputs):
+            key = (*imgs_cpu.shape, scene_ext is not None, scene_ixt is not None)
+            groups.setdefault(key, []).append(i)
+        batches = [
+            idx[b0 : b0 + (max_batch_size or len(idx))]
+            for idx in groups.values()
+            for b0 in range(0, len(idx), max_batch_size or len(idx))
+        ]
+        logger.info(f"Running {num_scenes} scenes in {len(batches)} batched forward passes")
+
+        predictions: list[Prediction | None] = [None] * num_scenes
+        for batch in batches:
+            imgs, ex_t, in_t = self._prepare_batch_inputs([inputs[i] for i in batch])
+            raw_output = self._run_model_forward(
+                imgs,
+                ex_t,
+                in_t,
+                export_feat_layers,
+                infer_gs,
+                use_ray_pose,
+                ref_view_strategy,
+            )
+            for i, scene_output in zip(batch, self._split_batch_output(raw_output, len(batch))):
+                imgs_cpu, scene_ext, scene_ixt = inputs[i]
+                prediction = self._convert_to_prediction(scene_output)
+                prediction = align_to_input_extrinsics_intrinsics(
+                    scene_ext, scene_ixt, prediction, align_to_input_ext_scale
                 )
-            # Add COLMAP export parameters
-            if "colmap" in export_format:
-                if "colmap" not in export_kwargs:
-                    export_kwargs["colmap"] = {}
-                export_kwargs["colmap"].update(
-                    {
-                        "image_paths": image,
-                        "conf_thresh_percentile": conf_thresh_percentile,
-                        "process_res_method": process_res_method,
-                    }
+                prediction = add_processed_images(prediction, imgs_cpu)
+                if export_dirs is not None:
+                    scene_format, scene_export_kwargs = self._prepare_export_kwargs(
+                        scenes[i],
+                        export_format,
+                        export_kwargs,
+                        infer_gs=infer_gs,
+                        process_res_method=process_res_method,
+                        conf_thresh_percentile=conf_thresh_percentile,
+                        num_max_points=num_max_points,
+                        show_cameras=show_cameras,
+                        feat_vis_fps=feat_vis_fps,
+                    )
+                    self._export_results(
+                        prediction, scene_format, export_dirs[i], **scene_export_kwargs
+                    )
+                predictions[i] = prediction
+        return predictions
+
+    def open_session(
+        self,
+        infer_gs: bool = False,
+        use_ray_pose: bool = False,
+        process_res: int = 504,
+        process_res_method: str = "upper_bound_resize",
+        max_cached_views: int | None = None,
+    ) -> StreamingSession:
+        """
+        Open a streaming session for incremental multi-view inference.
+
+        Frames are appended with ``session.add_frames(images)``. The global-attention
+        keys/values of processed frames are cached, so each call only runs the backbone
+        and the heads on the new frames while they still attend to all earlier frames.
+        The first frame of the session is the reference view.
+
+        Args:
+            infer_gs: Enable the 3D Gaussian branch
+            use_ray_pose: Use ray-based pose estimation instead of camera decoder
+            process_res: Processing resolution
+            process_res_method: Resize method for processing
+            max_cached_views: Maximum number of cached views. When exceeded, the oldest
+                views except the reference view are dropped, which bounds the memory and
+                the per-frame latency of long streams. None keeps all views.
+
+        Returns:
+            StreamingSession bound to this model
+        """
+        return StreamingSession(
+            self,
+            infer_gs=infer_gs,
+            use_ray_pose=use_ray_pose,
+            process_res=process_res,
+            process_res_method=process_res_method,
+            max_cached_views=max_cached_views,
+        )
+
+    def enable_compile(
+        self,
+        cache_dir: str | None = None,
+        view_buckets: Sequence[int] | None = None,
+        resolution_buckets: Sequence[tuple[int, int]] | None = None,
+        process_res: int = 504,
+        backend: str = "inductor",
+        mode: str | None = None,
+    ) -> CompiledForward:
+        """
+        Run the backbone and heads compiled with ``torch.compile``, one graph per bucket.
+
+        ``inference`` resizes processed images to the closest (H, W) resolution bucket, and
+        view counts are grouped into ranges ending at ``view_buckets``. Inputs outside the
+        buckets, and options with per-view host logic (streaming, token merging, memory
+        budget, low memory, sparse global attention), run eagerly.
+
+        Args:
+            cache_dir: Directory of the compile plan and compiled artifacts, reused across
+                process restarts. None keeps compiled code in memory only.
+            view_buckets: Upper bounds of the view-count ranges, e.g. (1, 2, 4, 8, 16).
+                Defaults to the plan in ``cache_dir`` or (1, 2, 4, 8, 16, 32, 64). Ranges
+                are split at 2 views, where reference view selection starts.
+            resolution_buckets: (H, W) buckets, multiples of 14. Defaults to the plan in
+                ``cache_dir`` or the sizes of common aspect ratios at ``process_res``.
+            process_res: Processing resolution of the default resolution buckets
+            backend: torch.compile backend
+            mode: torch.compile mode, e.g. "max-autotune"
+
+        Returns:
+            CompiledForward holding the buckets
+        """
+        if self.compiled is None:
+            self.compiled = CompiledForward(
+                self.model, cache_dir, view_buckets, resolution_buckets, process_res, backend, mode
+            )
+        return self.compiled
+
+    def warmup(self, infer_gs: bool = False, use_ray_pose: bool = False) -> None:
+        """
+        Compile all buckets of ``enable_compile`` ahead of the first request and save the
+        plan and artifacts to its cache directory.
+
+        Args:
+            infer_gs: Also compile the 3D Gaussian head
+            use_ray_pose: Compile for ray-based pose estimation
+        """
+        if self.compiled is None:
+            raise RuntimeError("Call enable_compile() before warmup()")
+        start_time = time.time()
+
+        def run_fn(x: torch.Tensor) -> dict[str, torch.Tensor]:
+            return self.forward(
+                x, export_feat_layers=[], infer_gs=infer_gs, use_ray_pose=use_ray_pose
+            )
+
+        self.compiled.warmup(run_fn, self._get_model_device())
+        logger.info(f"Warmup Done. Time: {time.time() - start_time} seconds")
+
+    def configure_cpu(
+        self,
+        num_threads: int | None = None,
+        preprocess_threads: int | None = None,
+        export_threads: int | None = None,
+        interop_threads: int | None = None,
+        bf16: bool | None = None,
+        channels_last: bool = True,
+    ) -> None:
+        """
+        Tune CPU execution.
+
+        By default the forward pass uses bf16 autocast on CPUs with native bf16 support
+        (AMX or AVX512-BF16) and fp32 elsewhere; fp16 autocast is never used on CPU.
+
+        Args:
+            num_threads: Intra-op threads of the forward pass (None: PyTorch default)
+            preprocess_threads: Intra-op threads of image preprocessing
+            export_threads: Intra-op threads of result export
+            interop_threads: Inter-op threads, only applied before the first parallel
+                operation of the process
+            bf16: Force bf16 (True) or fp32 (False) autocast on CPU, None detects support
+            channels_last: Store the convolution weights of the heads in channels_last
+                format, which avoids layout reorders in oneDNN convolutions
+        """
+        self.cpu_threads = {
+            "preprocess": preprocess_threads,
+            "forward": num_threads,
+            "export": export_threads,
+        }
+        self.cpu_bf16 = bf16
+        if interop_threads is not None:
+            set_interop_threads(interop_threads)
+        if channels_last:
+            heads = [m for name, m in self.model.named_modules() if name.endswith("head")]
+            num_converted = sum(convs_to_channels_last(head) for head in heads)
+            logger.info(f"Converted {num_converted} head convolutions to channels_last")
+
+    def configure_metric_branch(
+        self, resolution: int | None = None, concurrent: bool = False
+    ) -> None:
+        """
+        Configure the metric branch of nested models.
+
+        The metric branch only provides the global metric scale and the sky mask, so it can
+        run at a lower resolution and overlap with the main branch.
+
+        Args:
+            resolution: Longest side in pixels of the metric branch input; its depth and sky
+                outputs are upsampled for scale alignment and sky handling. None runs it at
+                the processing resolution.
+            concurrent: Run the metric branch concurrently with the main branch, on a
+                separate CUDA stream or a separate thread on CPU
+        """
+        if not isinstance(self.model, NestedDepthAnything3Net):
+            raise ValueError(f"Model {self.model_name} has no metric branch")
+        self.model.metric_resolution = resolution
+        self.model.concurrent_metric = concurrent
+
+    def configure_heads(
+        self,
+        chunk_size: int | str | None = "auto",
+        memory_budget: float | None = None,
+        offload_to_cpu: bool = False,
+    ) -> None:
+        """
+        Configure how the DPT / DualDPT / GSDPT heads split the views into chunks.
+
+        The heads decode full-resolution maps for each view, so their activations grow with
+        the number of views and the resolution; processing the views in chunks bounds them.
+
+        Args:
+            chunk_size: Views per head chunk. "auto" sizes the chunks from the estimated
+                per-view head activations at the current resolution and ``memory_budget``.
+                None processes all views in one chunk. Defaults to 8 views.
+            memory_budget: Activation memory budget of the heads in GB for "auto"; None uses
+                half of the free memory of the model device
+            offload_to_cpu: Move the outputs of each finished chunk to CPU memory, so only
+                one chunk of head outputs is resident on the GPU
+        """
+        if chunk_size is not None and chunk_size != "auto":
+            if isinstance(chunk_size, str) or chunk_size < 1:
+                raise ValueError(
+                    f"chunk_size must be a positive int, 'auto' or None, got {chunk_size}"
                 )
-            self._export_results(prediction, export_format, export_dir, **export_kwargs)
+        if memory_budget is not None and memory_budget <= 0:
+            raise ValueError(f"memory_budget must be positive, got {memory_budget}")
+        for module in self.model.modules():
+            if isinstance(module, DepthAnything3Net):
+                module.head_chunk_size = chunk_size
+                module.head_memory_budget = memory_budget
+                module.head_offload = offload_to_cpu
 
-        return prediction
+    def export_onnx(
+        self,
+        path: str,
+        max_views: int = 64,
+        max_resolution: int = 1036,
+        ref_view_strategy: str = "saddle_balanced",
+        opset_version: int = DEFAULT_OPSET,
+    ) -> list[str]:
+        """
+        Export the network to ONNX for ``OnnxDepthAnything3``.
+
+        The graph takes normalized images (1, N, 3, H, W) with dynamic N and H, W multiples
+        of 14, and returns depth, confidence and (if the model has a camera decoder) camera
+        poses. Camera conditioning, ray-based poses and the 3DGS branch are not exported.
+
+        Args:
+            path: Output .onnx file
+            max_views: Upper bound of the view axis
+            max_resolution: Upper bound of the height and width in pixels
+            ref_view_strategy: Reference view selection strategy baked into the graph
+            opset_version: ONNX opset
+
+        Returns:
+            Names of the graph outputs
+        """
+        if self.quantization is not None:
+            raise RuntimeError("Export the floating-point model, quantize the ONNX graph instead")
+        start_time = time.time()
+        output_names = export_onnx(
+            self.model,
+            path,
+            max_views=max_views,
+            max_resolution=max_resolution,
+            ref_view_strategy=ref_view_strategy,
+            opset_version=opset_version,
+            metadata={"model_name": self.model_name},
+        )
+        logger.info(f"ONNX Export Done. Time: {time.time() - start_time} seconds")
+        return output_names
+
+    def quantize(
+        self,
+        mode: str = "dynamic_int8",
+        save_dir: str | None = None,
+        eval_images: list[np.ndarray | Image.Image | str] | None = None,
+        process_res: int = 504,
+    ) -> dict[str, float]:
+        """
+        Convert the linear layers of the backbone and the heads to quantized kernels.
+
+        If ``model.<mode>.safetensors`` exists in ``save_dir``, the quantized weights are
+        loaded from it. Otherwise the current weights are quantized and written there,
+        so that later loads skip quantization.
+
+        Args:
+            mode: "dynamic_int8" (per-channel int8 weights and int8 activations quantized
+                at run time, int8 matmuls on CPU)
+            save_dir: Directory of the quantized weights. Defaults to the directory the
+                model was loaded from with ``from_pretrained``; None disables persistence.
+            eval_images: Fixed sample set for the accuracy report. The float model and the
+                quantized model are both run on it and compared.
+            process_res: Processing resolution of the accuracy report
+
+        Returns:
+            Report with the resident weight size before/after in MB, the number of
+            converted layers and, if ``eval_images`` is given, the depth AbsRel / delta1
+            and pose errors of the quantized model relative to the float model
+        """
+        if self.quantization is not None:
+            raise RuntimeError(f"Model is already quantized with mode {self.quantization}")
+        save_dir = save_dir or self.weights_dir
+        path = quantized_weights_path(save_dir, mode) if save_dir is not None else None
+        load = path is not None and os.path.exists(path)
+
+        reference = None
+        if eval_images is not None:
+            reference = self.inference(eval_images, process_res=process_res)
+        weights_mb = module_nbytes(self.model) / 1024**2
+
+        num_converted = quantize_linears(self.model, mode, quantize_weights=not load)
+        if load:
+            safetensors.torch.load_model(self, path, device=str(self._get_model_device()))
+            logger.info(f"Loaded quantized weights from {path}")
+        elif path is not None:
+            try:
+                safetensors.torch.save_model(self, path, metadata={"quantization": mode})
+                logger.info(f"Saved quantized weights to {path}")
+            except OSError as e:
+                logger.warn(f"Could not save quantized weights to {path}: {e}")
+        self.quantization = mode
+
+        report = {
+            "weights_mb_before": weights_mb,
+            "weights_mb_after": module_nbytes(self.model) / 1024**2,
+            "num_quantized_layers": num_converted,
+        }
+        if reference is not None:
+            prediction = self.inference(eval_images, process_res=process_res)
+            report.update(compare_predictions(reference, prediction))
+        logger.info(f"Quantization ({mode}) report: {report}")
+        return report
 
     def _preprocess_inputs(
         self,
@@ -279,16 +853,21 @@ class DepthAnything3(nn.Module, PyTorchModelHubMixin):
         intrinsics: np.ndarray | None = None,
         process_res: int = 504,
         process_res_method: str = "upper_bound_resize",
-    ) -> tuple[torch.Tensor, torch.Tensor | None, torch.Tensor | None]:
+        pad_mixed_sizes: bool = False,
+    ) -> tuple[torch.Tensor, torch.Tensor | None, torch.Tensor | None, torch.Tensor | None]:
         """Preprocess input images using input processor."""
         start_time = time.time()
-        imgs_cpu, extrinsics, intrinsics = self.input_processor(
-            image,
-            extrinsics.copy() if extrinsics is not None else None,
-            intrinsics.copy() if intrinsics is not None else None,
-            process_res,
-            process_res_method,
-        )
+        with cpu_threads(self.cpu_threads["preprocess"]):
+            processed = self.input_processor(
+                image,
+                extrinsics.copy() if extrinsics is not None else None,
+                intrinsics.copy() if intrinsics is not None else None,
+                process_res,
+                process_res_method,
+                pad_mixed_sizes=pad_mixed_sizes,
+            )
+        imgs_cpu, extrinsics, intrinsics = processed[:3]
+        view_sizes = processed[3] if pad_mixed_sizes else None
         end_time = time.time()
         logger.info(
             "Processed Images Done taking",
@@ -296,7 +875,7 @@ class DepthAnything3(nn.Module, PyTorchModelHubMixin):
             "seconds. Shape: ",
             imgs_cpu.shape,
         )
-        return imgs_cpu, extrinsics, intrinsics
+        return imgs_cpu, extrinsics, intrinsics, view_sizes
 
     def _prepare_model_inputs(
         self,
@@ -324,6 +903,42 @@ class DepthAnything3(nn.Module, PyTorchModelHubMixin):
 
         return imgs, ex_t, in_t
 
+    def _prepare_batch_inputs(
+        self, inputs: list[tuple[torch.Tensor, torch.Tensor | None, torch.Tensor | None]]
+    ) -> tuple[torch.Tensor, torch.Tensor | None, torch.Tensor | None]:
+        """Stack preprocessed scenes of equal shape into model inputs with B scenes."""
+        scenes = [self._prepare_model_inputs(*scene_inputs) for scene_inputs in inputs]
+        imgs = torch.cat([imgs for imgs, _, _ in scenes])
+        ex_t, in_t = None, None
+        if scenes[0][1] is not None:
+            # Extrinsics are normalized per scene
+            ex_t = torch.cat([self._normalize_extrinsics(ex.clone()) for _, ex, _ in scenes])
+        if scenes[0][2] is not None:
+            in_t = torch.cat([ixt for _, _, ixt in scenes])
+        return imgs, ex_t, in_t
+
+    @staticmethod
+    def _split_batch_output(
+        raw_output: dict[str, torch.Tensor], batch_size: int
+    ) -> list[dict[str, torch.Tensor]]:
+        """Per-scene model outputs of a batched forward pass, each with a batch size of 1."""
+
+        def take(value, b: int):
+            if isinstance(value, torch.Tensor):
+                return value[b : b + 1] if value.dim() > 0 else value
+            if isinstance(value, Gaussians):
+                return Gaussians(
+                    **{f.name: getattr(value, f.name)[b : b + 1] for f in fields(value)}
+                )
+            if isinstance(value, dict):
+                return AddictDict({key: take(item, b) for key, item in value.items()})
+            if isinstance(value, list):
+                # Per-scene values such as the metric scale factors
+                return value[b]
+            return value
+
+        return [take(raw_output, b) for b in range(batch_size)]
+
     def _normalize_extrinsics(self, ex_t: torch.Tensor | None) -> torch.Tensor | None:
         """Normalize extrinsics"""
         if ex_t is None:
@@ -338,32 +953,6 @@ class DepthAnything3(nn.Module, PyTorchModelHubMixin):
         ex_t_norm[..., :3, 3] = ex_t_norm[..., :3, 3] / median_dist
         return ex_t_norm
 
-    def _align_to_input_extrinsics_intrinsics(
-        self,
-        extrinsics: torch.Tensor | None,
-        intrinsics: torch.Tensor | None,
-        prediction: Prediction,
-        align_to_input_ext_scale: bool = True,
-        ransac_view_thresh: int = 10,
-    ) -> Prediction:
-        """Align depth map to input extrinsics"""
-        if extrinsics is None:
-            return prediction
-        prediction.intrinsics = intrinsics.numpy()
-        _, _, scale, aligned_extrinsics = align_poses_umeyama(
-            prediction.extrinsics,
-            extrinsics.numpy(),
-            ransac=len(extrinsics) >= ransac_view_thresh,
-            return_aligned=True,
-            random_state=42,
-        )
-        if align_to_input_ext_scale:
-            prediction.extrinsics = extrinsics[..., :3, :].numpy()
-            prediction.depth /= scale
-        else:
-            prediction.extrinsics = aligned_extrinsics
-        return prediction
-
     def _run_model_forward(
         self,
         imgs: torch.Tensor,
@@ -373,6 +962,17 @@ class DepthAnything3(nn.Module, PyTorchModelHubMixin):
         infer_gs: bool = False,
         use_ray_pose: bool = False,
         ref_view_strategy: str = "saddle_balanced",
+        ref_view_idx: int | None = None,
+        global_attn_mode: str = "full",
+        global_attn_kwargs: dict | None = None,
+        stream_state: StreamingState | None = None,
+        token_merge_ratio: TokenMergeRatio | None = None,
+        memory_budget: float | None = None,
+        low_memory: bool = False,
+        offload_aux_feats: bool = False,
+        view_sizes: torch.Tensor | None = None,
+        outputs: Sequence[str] | None = None,
+        output_indices: Sequence[int] | None = None,
     ) -> dict[str, torch.Tensor]:
         """Run model forward pass."""
         device = imgs.device
@@ -380,8 +980,28 @@ class DepthAnything3(nn.Module, PyTorchModelHubMixin):
         if need_sync:
             torch.cuda.synchronize(device)
         start_time = time.time()
-        feat_layers = list(export_feat_layers) if export_feat_layers is not None else None
-        output = self.forward(imgs, ex_t, in_t, feat_layers, infer_gs, use_ray_pose, ref_view_strategy)
+        feat_layers = list(export_feat_layers) if export_feat_layers is not None else []
+        with cpu_threads(self.cpu_threads["forward"] if device.type == "cpu" else None):
+            output = self.forward(
+                imgs,
+                ex_t,
+                in_t,
+                feat_layers,
+                infer_gs,
+                use_ray_pose,
+                ref_view_strategy,
+                ref_view_idx,
+                global_attn_mode,
+                global_attn_kwargs,
+                stream_state,
+                token_merge_ratio,
+                memory_budget,
+                low_memory,
+                offload_aux_feats,
+                view_sizes,
+                outputs,
+                output_indices,
+            )
         if need_sync:
             torch.cuda.synchronize(device)
         end_time = time.time()
@@ -396,27 +1016,65 @@ class DepthAnything3(nn.Module, PyTorchModelHubMixin):
         logger.info(f"Conversion to Prediction Done. Time: {end_time - start_time} seconds")
         return output
 
-    def _add_processed_images(self, prediction: Prediction, imgs_cpu: torch.Tensor) -> Prediction:
-        """Add processed images to prediction for visualization."""
-        # Convert from (N, 3, H, W) to (N, H, W, 3) and denormalize
-        processed_imgs = imgs_cpu.permute(0, 2, 3, 1).cpu().numpy()  # (N, H, W, 3)
-
-        # Denormalize from ImageNet normalization
-        mean = np.array([0.485, 0.456, 0.406])
-        std = np.array([0.229, 0.224, 0.225])
-        processed_imgs = processed_imgs * std + mean
-        processed_imgs = np.clip(processed_imgs, 0, 1)
-        processed_imgs = (processed_imgs * 255).astype(np.uint8)
-
-        prediction.processed_images = processed_imgs
-        return prediction
+    @staticmethod
+    def _prepare_export_kwargs(
+        image: list[np.ndarray | Image.Image | str],
+        export_format: str,
+        export_kwargs: dict | None = None,
+        infer_gs: bool = False,
+        render_exts: np.ndarray | None = None,
+        render_ixts: np.ndarray | None = None,
+        render_hw: tuple[int, int] | None = None,
+        process_res_method: str = "upper_bound_resize",
+        conf_thresh_percentile: float = 40.0,
+        num_max_points: int = 1_000_000,
+        show_cameras: bool = True,
+        feat_vis_fps: int = 15,
+    ) -> tuple[str, dict]:
+        """Export format and per-format export arguments of one scene."""
+        # Copy so that the arguments of one call do not leak into the next
+        export_kwargs = {key: dict(value) for key, value in (export_kwargs or {}).items()}
+        if "gs" in export_format:
+            if infer_gs and "gs_video" not in export_format:
+                export_format = f"{export_format}-gs_video"
+            if "gs_video" in export_format:
+                export_kwargs.setdefault("gs_video", {}).update(
+                    {
+                        "extrinsics": render_exts,
+                        "intrinsics": render_ixts,
+                        "out_image_hw": render_hw,
+                    }
+                )
+        # Add GLB export parameters
+        if "glb" in export_format:
+            export_kwargs.setdefault("glb", {}).update(
+                {
+                    "conf_thresh_percentile": conf_thresh_percentile,
+                    "num_max_points": num_max_points,
+                    "show_cameras": show_cameras,
+                }
+            )
+        # Add Feat_vis export parameters
+        if "feat_vis" in export_format:
+            export_kwargs.setdefault("feat_vis", {}).update({"fps": feat_vis_fps})
+        # Add COLMAP export parameters
+        if "colmap" in export_format:
+            export_kwargs.setdefault("colmap", {}).update(
+                {
+                    "image_paths": image,
+                    "conf_thresh_percentile": conf_thresh_percentile,
+                    "process_res_method": process_res_method,
+                }
+            )
+        return export_format, export_kwargs
 
     def _export_results(
         self, prediction: Prediction, export_format: str, export_dir: str, **kwargs
     ) -> None:
         """Export results to specified format and directory."""
         start_time = time.time()
-        export(prediction, export_format, export_dir, **kwargs)
+        with cpu_threads(self.cpu_threads["export"]):
+            export(prediction, export_format, export_dir, **kwargs)
         end_time = time.time()
         logger.info(f"Export Results Done. Time: {end_time - start_time} seconds")
 
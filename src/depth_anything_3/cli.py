@@ -39,6 +39,7 @@ from depth_anything_3.utils.constants import (
     DEFAULT_GRADIO_DIR,
     DEFAULT_MODEL,
 )
+from depth_anything_3.utils.device import resolve_device
 
 os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
 
@@ -116,7 +117,12 @@ def auto(
     model_dir: str = typer.Option(DEFAULT_MODEL, help="Model directory path"),
     export_dir: str = typer.Option(DEFAULT_EXPORT_DIR, help="Export directory"),
     export_format: str = typer.Option("glb", help="Export format"),
-    device: str = typer.Option("cuda", help="Device to use"),
+    device: str = typer.Option(
+        "auto", help="Device to use: auto (CUDA if available), cuda or cpu"
+    ),
+    num_threads: int = typer.Option(
+        0, help="CPU threads of the forward pass (0: PyTorch default)"
+    ),
     use_backend: bool = typer.Option(False, help="Use backend service for inference"),
     backend_url: str = typer.Option(
         "http://localhost:8008", help="Backend URL (default: http://localhost:8008)"
@@ -209,6 +215,7 @@ def auto(
             export_dir=export_dir,
             model_dir=model_dir,
             device=device,
+            num_threads=num_threads or None,
             backend_url=final_backend_url,
             export_format=export_format,
             process_res=process_res,
@@ -236,6 +243,7 @@ def auto(
             export_dir=export_dir,
             model_dir=model_dir,
             device=device,
+            num_threads=num_threads or None,
             backend_url=final_backend_url,
             export_format=export_format,
             process_res=process_res,
@@ -263,6 +271,7 @@ def auto(
             export_dir=export_dir,
             model_dir=model_dir,
             device=device,
+            num_threads=num_threads or None,
             backend_url=final_backend_url,
             export_format=export_format,
             process_res=process_res,
@@ -292,6 +301,7 @@ def auto(
             export_dir=export_dir,
             model_dir=model_dir,
             device=device,
+            num_threads=num_threads or None,
             backend_url=final_backend_url,
             export_format=export_format,
             process_res=process_res,
@@ -318,7 +328,12 @@ def image(
     model_dir: str = typer.Option(DEFAULT_MODEL, help="Model directory path"),
     export_dir: str = typer.Option(DEFAULT_EXPORT_DIR, help="Export directory"),
     export_format: str = typer.Option("glb", help="Export format"),
-    device: str = typer.Option("cuda", help="Device to use"),
+    device: str = typer.Option(
+        "auto", help="Device to use: auto (CUDA if available), cuda or cpu"
+    ),
+    num_threads: int = typer.Option(
+        0, help="CPU threads of the forward pass (0: PyTorch default)"
+    ),
     use_backend: bool = typer.Option(False, help="Use backend service for inference"),
     backend_url: str = typer.Option(
         "http://localhost:8008", help="Backend URL (default: http://localhost:8008)"
@@ -374,6 +389,7 @@ def image(
         export_dir=export_dir,
         model_dir=model_dir,
         device=device,
+        num_threads=num_threads or None,
         backend_url=final_backend_url,
         export_format=export_format,
         process_res=process_res,
@@ -397,7 +413,12 @@ def images(
     model_dir: str = typer.Option(DEFAULT_MODEL, help="Model directory path"),
     export_dir: str = typer.Option(DEFAULT_EXPORT_DIR, help="Export directory"),
     export_format: str = typer.Option("glb", help="Export format"),
-    device: str = typer.Option("cuda", help="Device to use"),
+    device: str = typer.Option(
+        "auto", help="Device to use: auto (CUDA if available), cuda or cpu"
+    ),
+    num_threads: int = typer.Option(
+        0, help="CPU threads of the forward pass (0: PyTorch default)"
+    ),
     use_backend: bool = typer.Option(False, help="Use backend service for inference"),
     backend_url: str = typer.Option(
         "http://localhost:8008", help="Backend URL (default: http://localhost:8008)"
@@ -453,6 +474,7 @@ def images(
         export_dir=export_dir,
         model_dir=model_dir,
         device=device,
+        num_threads=num_threads or None,
         backend_url=final_backend_url,
         export_format=export_format,
         process_res=process_res,
@@ -481,7 +503,12 @@ def colmap(
     model_dir: str = typer.Option(DEFAULT_MODEL, help="Model directory path"),
     export_dir: str = typer.Option(DEFAULT_EXPORT_DIR, help="Export directory"),
     export_format: str = typer.Option("glb", help="Export format"),
-    device: str = typer.Option("cuda", help="Device to use"),
+    device: str = typer.Option(
+        "auto", help="Device to use: auto (CUDA if available), cuda or cpu"
+    ),
+    num_threads: int = typer.Option(
+        0, help="CPU threads of the forward pass (0: PyTorch default)"
+    ),
     use_backend: bool = typer.Option(False, help="Use backend service for inference"),
     backend_url: str = typer.Option(
         "http://localhost:8008", help="Backend URL (default: http://localhost:8008)"
@@ -537,6 +564,7 @@ def colmap(
         export_dir=export_dir,
         model_dir=model_dir,
         device=device,
+        num_threads=num_threads or None,
         backend_url=final_backend_url,
         export_format=export_format,
         process_res=process_res,
@@ -561,7 +589,12 @@ def video(
     model_dir: str = typer.Option(DEFAULT_MODEL, help="Model directory path"),
     export_dir: str = typer.Option(DEFAULT_EXPORT_DIR, help="Export directory"),
     export_format: str = typer.Option("glb", help="Export format"),
-    device: str = typer.Option("cuda", help="Device to use"),
+    device: str = typer.Option(
+        "auto", help="Device to use: auto (CUDA if available), cuda or cpu"
+    ),
+    num_threads: int = typer.Option(
+        0, help="CPU threads of the forward pass (0: PyTorch default)"
+    ),
     use_backend: bool = typer.Option(False, help="Use backend service for inference"),
     backend_url: str = typer.Option(
         "http://localhost:8008", help="Backend URL (default: http://localhost:8008)"
@@ -617,6 +650,7 @@ def video(
         export_dir=export_dir,
         model_dir=model_dir,
         device=device,
+        num_threads=num_threads or None,
         backend_url=final_backend_url,
         export_format=export_format,
         process_res=process_res,
@@ -636,13 +670,86 @@ def video(
 # ============================================================================
 
 
+@app.command()
+def warmup(
+    cache_dir: str = typer.Argument(..., help="Directory of the compile plan and artifacts"),
+    model_dir: str = typer.Option(DEFAULT_MODEL, help="Model directory path"),
+    device: str = typer.Option(
+        "auto", help="Device to use: auto (CUDA if available), cuda or cpu"
+    ),
+    view_buckets: str = typer.Option(
+        "1,2,4,8,16,32,64", help="Comma-separated upper bounds of the view-count buckets"
+    ),
+    resolutions: str = typer.Option(
+        "",
+        help="Comma-separated HxW resolution buckets (e.g., '378x504,504x378'). Default: common aspect ratios at process_res",
+    ),
+    process_res: int = typer.Option(504, help="Processing resolution of the default buckets"),
+    infer_gs: bool = typer.Option(False, help="Also compile the 3D Gaussian head"),
+    use_ray_pose: bool = typer.Option(
+        False, help="Use ray-based pose estimation instead of camera decoder"
+    ),
+):
+    """Pre-build compiled shape buckets so the first request does not pay compile latency."""
+    from depth_anything_3.api import DepthAnything3
+    from depth_anything_3.model.compiled import parse_resolution_buckets
+
+    typer.echo(f"Loading model from {model_dir}...")
+    model = DepthAnything3.from_pretrained(model_dir).to(resolve_device(device))
+    compiled = model.enable_compile(
+        cache_dir,
+        view_buckets=[int(v) for v in view_buckets.split(",")],
+        resolution_buckets=parse_resolution_buckets(resolutions) if resolutions else None,
+        process_res=process_res,
+    )
+    typer.echo(f"View buckets: {compiled.view_buckets}")
+    typer.echo(f"Resolution buckets: {compiled.resolution_buckets}")
+    model.warmup(infer_gs=infer_gs, use_ray_pose=use_ray_pose)
+    typer.echo(f"✅ Compiled {len(compiled.compiled_buckets)} buckets into {cache_dir}")
+
+
+@app.command("export-onnx")
+def export_onnx(
+    output_path: str = typer.Argument(..., help="Output .onnx file"),
+    model_dir: str = typer.Option(
+        "depth-anything/DA3-LARGE", help="Model directory path (nested models are not supported)"
+    ),
+    max_views: int = typer.Option(64, help="Upper bound of the view-count axis"),
+    max_resolution: int = typer.Option(1036, help="Upper bound of the height and width"),
+    ref_view_strategy: str = typer.Option(
+        "saddle_balanced",
+        help="Reference view selection strategy: first, middle, saddle_balanced, saddle_sim_range",
+    ),
+):
+    """Export the depth and pose network to ONNX for onnxruntime CPU inference."""
+    from depth_anything_3.api import DepthAnything3
+
+    typer.echo(f"Loading model from {model_dir}...")
+    model = DepthAnything3.from_pretrained(model_dir).to("cpu")
+    output_names = model.export_onnx(
+        output_path,
+        max_views=max_views,
+        max_resolution=max_resolution,
+        ref_view_strategy=ref_view_strategy,
+    )
+    typer.echo(f"✅ Exported {output_path} with outputs {output_names}")
+
+
 @app.command()
 def backend(
     model_dir: str = typer.Option(DEFAULT_MODEL, help="Model directory path"),
-    device: str = typer.Option("cuda", help="Device to use"),
+    device: str = typer.Option(
+        "auto", help="Device to use: auto (CUDA if available), cuda or cpu"
+    ),
+    num_threads: int = typer.Option(
+        0, help="CPU threads of the forward pass (0: PyTorch default)"
+    ),
     host: str = typer.Option("127.0.0.1", help="Host to bind to"),
     port: int = typer.Option(8008, help="Port to bind to"),
     gallery_dir: str = typer.Option(DEFAULT_GALLERY_DIR, help="Gallery directory path (optional)"),
+    compile_cache_dir: str = typer.Option(
+        "", help="Run compiled with the buckets warmed up in this directory (see `warmup`)"
+    ),
 ):
     """Start model backend service with integrated gallery."""
     typer.echo("=" * 60)
@@ -650,6 +757,8 @@ def backend(
     typer.echo("=" * 60)
     typer.echo(f"Model directory: {model_dir}")
     typer.echo(f"Device: {device}")
+    if compile_cache_dir:
+        typer.echo(f"Compile cache directory: {compile_cache_dir}")
 
     # Check if gallery directory exists
     if gallery_dir and os.path.exists(gallery_dir):
@@ -669,7 +778,15 @@ def backend(
     typer.echo("=" * 60)
 
     try:
-        start_server(model_dir, device, host, port, gallery_dir)
+        start_server(
+            model_dir,
+            device,
+            host,
+            port,
+            gallery_dir,
+            compile_cache_dir or None,
+            num_threads or None,
+        )
     except KeyboardInterrupt:
         typer.echo("\n👋 Backend server stopped.")
     except Exception as e:
@@ -0,0 +1,357 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Shape-bucketed compiled execution of the network.
+
+Input resolutions are snapped to a small set of (H, W) buckets and view counts to a small
+set of ranges, so that ``torch.compile`` builds one graph per (view range, H, W) bucket
+for the backbone and the heads instead of one per request shape. Within a view range the
+view count is a dynamic dimension.
+
+Compiled artifacts are cached on disk: a portable archive of all compiled artifacts plus
+the bucket plan are written to ``cache_dir`` after new buckets are compiled, so a restarted
+process only re-traces. The inductor cache lives in ``<cache_dir>/inductor`` unless
+``TORCHINDUCTOR_CACHE_DIR`` is set or inductor already picked its cache directory, which
+it does on the first compilation of the process and reads from the environment only.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+from contextlib import nullcontext
+from typing import Callable, Sequence
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from depth_anything_3.model.dinov2.dinov2 import DinoV2
+from depth_anything_3.model.dpt import DPT
+from depth_anything_3.model.dualdpt import DualDPT
+from depth_anything_3.utils.constants import THRESH_FOR_REF_SELECTION
+from depth_anything_3.utils.logger import logger
+
+DEFAULT_VIEW_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+DEFAULT_ASPECT_RATIOS = (1.0, 4 / 3, 3 / 4, 16 / 9, 9 / 16)  # width / height
+PLAN_NAME = "compile_plan.json"
+ARTIFACTS_NAME = "compile_artifacts.bin"
+PATCH_SIZE = 14
+
+Bucket = tuple[int, int, int, int]  # (min views, max views, H, W)
+
+
+def default_resolution_buckets(
+    process_res: int = 504, aspect_ratios: Sequence[float] = DEFAULT_ASPECT_RATIOS
+) -> list[tuple[int, int]]:
+    """
+    (H, W) buckets produced by ``upper_bound_resize`` at ``process_res`` for common aspect
+    ratios, so that typical inputs fall exactly on a bucket.
+    """
+    buckets = []
+    for ratio in aspect_ratios:
+        short = round(round(process_res / max(ratio, 1 / ratio)) / PATCH_SIZE) * PATCH_SIZE
+        buckets.append((short, process_res) if ratio >= 1 else (process_res, short))
+    return list(dict.fromkeys(buckets))
+
+
+def parse_resolution_buckets(spec: str) -> list[tuple[int, int]]:
+    """Parse ``"504x378,378x504"`` (HxW) into resolution buckets."""
+    buckets = []
+    for item in spec.split(","):
+        h, w = item.lower().strip().split("x")
+        buckets.append((int(h), int(w)))
+    return buckets
+
+
+def split_view_buckets(view_buckets: Sequence[int]) -> list[int]:
+    """
+    Sorted view buckets whose ranges do not straddle THRESH_FOR_REF_SELECTION.
+
+    The backbone selects a reference view from THRESH_FOR_REF_SELECTION views on, so a
+    range covering both sides would specialize on the view count and run eagerly.
+    """
+    buckets = sorted(set(int(v) for v in view_buckets))
+    bound = THRESH_FOR_REF_SELECTION - 1
+    if buckets and buckets[-1] > bound and bound not in buckets:
+        logger.info(f"Splitting the view buckets at {bound} views (reference view selection)")
+        buckets = sorted(buckets + [bound])
+    return buckets
+
+
+class CompiledForward:
+    """
+    Callable with the signature of ``DepthAnything3Net.forward`` that runs the compiled
+    backbone and heads for inputs on a bucket and the eager network otherwise.
+
+    The backbone and head modules of ``net`` are compiled in place, their parameters and
+    state dict are unchanged.
+
+    Args:
+        net: DepthAnything3Net or NestedDepthAnything3Net
+        cache_dir: Directory of the compile plan and artifacts; None disables persistence
+        view_buckets: Upper bounds of the view-count ranges. Defaults to the plan in
+            ``cache_dir`` or DEFAULT_VIEW_BUCKETS. A range never mixes view counts with and
+            without reference view selection: THRESH_FOR_REF_SELECTION - 1 is added as a
+            bound when needed.
+        resolution_buckets: (H, W) buckets. Defaults to the plan in ``cache_dir`` or
+            default_resolution_buckets(process_res).
+        process_res: Processing resolution of the default resolution buckets
+        backend: torch.compile backend
+        mode: torch.compile mode
+    """
+
+    def __init__(
+        self,
+        net: nn.Module,
+        cache_dir: str | None = None,
+        view_buckets: Sequence[int] | None = None,
+        resolution_buckets: Sequence[tuple[int, int]] | None = None,
+        process_res: int = 504,
+        backend: str = "inductor",
+        mode: str | None = None,
+    ):
+        self.net = net
+        self.cache_dir = cache_dir
+        plan = self._load_plan()
+        if view_buckets is None:
+            view_buckets = plan.get("view_buckets", DEFAULT_VIEW_BUCKETS)
+        if resolution_buckets is None:
+            resolution_buckets = plan.get("resolution_buckets")
+        if resolution_buckets is None:
+            resolution_buckets = default_resolution_buckets(process_res)
+        self.view_buckets = split_view_buckets(view_buckets)
+        self.resolution_buckets = [tuple(int(v) for v in hw) for hw in resolution_buckets]
+        self.compiled_buckets = {tuple(b) for b in plan.get("compiled", [])}
+        self.eager_buckets: set[Bucket] = set()
+        self._view_range: tuple[int, int] | None = None
+        self._autosave = True
+
+        # Every bucket is a separate graph of the same code object
+        limit = 2 * len(self.view_buckets) * len(self.resolution_buckets)
+        config = torch._dynamo.config
+        name = "recompile_limit" if hasattr(config, "recompile_limit") else "cache_size_limit"
+        setattr(config, name, max(getattr(config, name), limit))
+        self._compile_stages(backend, mode)
+
+    # -------------------------------------------------------------------------
+    # Buckets
+    # -------------------------------------------------------------------------
+    def view_range(self, num_views: int) -> tuple[int, int] | None:
+        """View-count range (inclusive) containing ``num_views``, None if too many views."""
+        low = 1
+        for high in self.view_buckets:
+            if num_views <= high:
+                return low, high
+            low = high + 1
+        return None
+
+    def snap_resolution(self, H: int, W: int) -> tuple[int, int]:
+        """Bucket with the closest aspect ratio, ties broken by the closest area."""
+        return min(
+            self.resolution_buckets,
+            key=lambda hw: (
+                round(abs(math.log((hw[1] / hw[0]) / (W / H))), 6),
+                abs(hw[0] * hw[1] - H * W),
+            ),
+        )
+
+    def snap_inputs(
+        self, imgs: torch.Tensor, intrinsics: torch.Tensor | None = None
+    ) -> tuple[torch.Tensor, torch.Tensor | None]:
+        """
+        Resize processed images (N, 3, H, W) to their resolution bucket.
+
+        Args:
+            imgs: Normalized images
+            intrinsics: Intrinsics (N, 3, 3) of ``imgs``, rescaled to the new size
+
+        Returns:
+            Resized images and intrinsics
+        """
+        H, W = imgs.shape[-2:]
+        Hb, Wb = self.snap_resolution(H, W)
+        if (Hb, Wb) == (H, W):
+            return imgs, intrinsics
+        imgs = F.interpolate(imgs, size=(Hb, Wb), mode="bilinear", antialias=True)
+        if intrinsics is not None:
+            intrinsics = intrinsics.clone()
+            intrinsics[..., 0, :] *= Wb / W
+            intrinsics[..., 1, :] *= Hb / H
+        return imgs, intrinsics
+
+    def bucket(self, x: torch.Tensor) -> Bucket | None:
+        """Bucket of the input (B, S, 3, H, W), None if it is not on a bucket."""
+        views = self.view_range(x.shape[1])
+        if views is None or tuple(x.shape[-2:]) not in self.resolution_buckets:
+            return None
+        return (*views, *x.shape[-2:])
+
+    # -------------------------------------------------------------------------
+    # Execution
+    # -------------------------------------------------------------------------
+    def __call__(self, x: torch.Tensor, *args, **kwargs):
+        bucket = self.bucket(x)
+        if bucket is None or bucket in self.eager_buckets or not self._supports(kwargs):
+            with self._eager():
+                return self.net(x, *args, **kwargs)
+        if bucket in self.compiled_buckets:
+            return self._run(bucket, x, *args, **kwargs)
+
+        logger.info(f"Compiling bucket views={bucket[0]}-{bucket[1]} HxW={bucket[2]}x{bucket[3]}")
+        try:
+            output = self._run(bucket, x, *args, **kwargs)
+        except Exception as e:
+            # E.g. the view range covers a shape-specializing branch; keep it eager
+            logger.warn(f"Compiling bucket {bucket} failed, running it eagerly: {e}")
+            self.eager_buckets.add(bucket)
+            with self._eager():
+                return self.net(x, *args, **kwargs)
+        self.compiled_buckets.add(bucket)
+        if self._autosave:
+            self.save()
+        return output
+
+    def warmup(
+        self,
+        run_fn: Callable[[torch.Tensor], object],
+        device: torch.device | str,
+        buckets: Sequence[Bucket] | None = None,
+    ) -> None:
+        """
+        Compile the given buckets (default: all) and save the plan and artifacts.
+
+        Args:
+            run_fn: Runs inference on an input (1, S, 3, H, W) the way requests are run,
+                e.g. ``DepthAnything3.forward`` with the options used in production
+            device: Device of the network
+            buckets: Buckets to compile
+        """
+        if buckets is None:
+            ranges = [self.view_range(v) for v in self.view_buckets]
+            buckets = [(*r, *hw) for r in ranges for hw in self.resolution_buckets]
+        self._autosave = False
+        try:
+            for _, max_views, H, W in buckets:
+                run_fn(torch.zeros(1, max_views, 3, H, W, device=device))
+        finally:
+            self._autosave = True
+        self.save()
+
+    def save(self) -> None:
+        """Write the bucket plan and the compiled artifacts to ``cache_dir``."""
+        if self.cache_dir is None:
+            return
+        plan = {
+            "torch_version": torch.__version__,
+            "view_buckets": self.view_buckets,
+            "resolution_buckets": [list(hw) for hw in self.resolution_buckets],
+            "compiled": sorted(list(b) for b in self.compiled_buckets),
+        }
+        with open(os.path.join(self.cache_dir, PLAN_NAME), "w") as f:
+            json.dump(plan, f, indent=2)
+        if hasattr(torch.compiler, "save_cache_artifacts"):
+            artifacts = torch.compiler.save_cache_artifacts()
+            if artifacts is not None:
+                with open(os.path.join(self.cache_dir, ARTIFACTS_NAME), "wb") as f:
+                    f.write(artifacts[0])
+        logger.info(f"Saved compile plan to {self.cache_dir}")
+
+    def _run(self, bucket: Bucket, x: torch.Tensor, *args, **kwargs):
+        self._view_range = bucket[:2]
+        try:
+            return self.net(x, *args, **kwargs)
+        finally:
+            self._view_range = None
+
+    @staticmethod
+    def _supports(kwargs: dict) -> bool:
+        """Options with host-side per-view logic run eagerly."""
+        return (
+            kwargs.get("stream_state") is None
+            and not kwargs.get("token_merge_ratio")
+            and kwargs.get("memory_budget") is None
+            and not kwargs.get("low_memory", False)
+            and kwargs.get("global_attn_mode", "full") == "full"
+            and kwargs.get("view_sizes") is None
+        )
+
+    @staticmethod
+    def _eager():
+        if hasattr(torch.compiler, "set_stance"):
+            return torch.compiler.set_stance("force_eager")
+        return nullcontext()
+
+    # -------------------------------------------------------------------------
+    # Compilation and persistence
+    # -------------------------------------------------------------------------
+    def _compile_stages(self, backend: str, mode: str | None) -> None:
+        for module in self.net.modules():
+            if isinstance(module, DinoV2):
+                self._compile_method(module, "forward", self._mark_views, backend, mode)
+            elif isinstance(module, (DPT, DualDPT)):
+                # DPT heads: one graph per view chunk size, views are the batch dimension
+                self._compile_method(module, "_forward_impl", self._mark_batch, backend, mode)
+
+    @staticmethod
+    def _compile_method(
+        module: nn.Module, name: str, mark_fn: Callable, backend: str, mode: str | None
+    ) -> None:
+        compiled = torch.compile(getattr(module, name), backend=backend, mode=mode)
+
+        def method(*args, **kwargs):
+            mark_fn(*args, **kwargs)
+            return compiled(*args, **kwargs)
+
+        setattr(module, name, method)
+
+    def _mark_views(self, x: torch.Tensor, cam_token: torch.Tensor | None = None, **kwargs):
+        if self._view_range is None or self._view_range[0] == self._view_range[1]:
+            return
+        low, high = self._view_range
+        torch._dynamo.mark_dynamic(x, 1, min=low, max=high)
+        if cam_token is not None:
+            torch._dynamo.mark_dynamic(cam_token, 1, min=low, max=high)
+
+    @staticmethod
+    def _mark_batch(feats: Sequence[torch.Tensor], *args, **kwargs):
+        for feat in feats:
+            torch._dynamo.maybe_mark_dynamic(feat, 0)
+        if "images" in kwargs:
+            torch._dynamo.maybe_mark_dynamic(kwargs["images"], 0)
+
+    def _load_plan(self) -> dict:
+        if self.cache_dir is None:
+            return {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Keep the inductor cache next to the plan unless configured explicitly. Inductor
+        # has no config option for it and fixes the environment variable once it compiled
+        inductor_dir = os.path.abspath(os.path.join(self.cache_dir, "inductor"))
+        current = os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", inductor_dir)
+        if os.path.abspath(current) != inductor_dir:
+            logger.info(f"Inductor cache stays in {current} (TORCHINDUCTOR_CACHE_DIR)")
+        artifacts_path = os.path.join(self.cache_dir, ARTIFACTS_NAME)
+        if os.path.exists(artifacts_path) and hasattr(torch.compiler, "load_cache_artifacts"):
+            with open(artifacts_path, "rb") as f:
+                torch.compiler.load_cache_artifacts(f.read())
+        plan_path = os.path.join(self.cache_dir, PLAN_NAME)
+        if not os.path.exists(plan_path):
+            return {}
+        with open(plan_path) as f:
+            plan = json.load(f)
+        if plan.get("torch_version") != torch.__version__:
+            logger.warn(f"Compile plan in {self.cache_dir} was built with another torch version")
+            plan.pop("compiled", None)
+        return plan
@@ -14,12 +14,27 @@
 
 from __future__ import annotations
 
+from typing import Iterable, Sequence
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 from addict import Dict
 from omegaconf import DictConfig, OmegaConf
 
 from depth_anything_3.cfg import create_object
+from depth_anything_3.model.dinov2.layers.token_merge import TokenMergeRatio
+from depth_anything_3.model.streaming import StreamingState
+from depth_anything_3.model.utils.concurrent import run_concurrently
+from depth_anything_3.model.utils.head_utils import (
+    DEFAULT_HEAD_CHUNK_SIZE,
+    plan_head_chunk_size,
+    select_view_feats,
+)
+from depth_anything_3.model.utils.padding import (
+    crop_view_tokens,
+    group_views_by_size,
+    valid_region_mask,
+)
 from depth_anything_3.model.utils.transform import pose_encoding_to_extri_intri
 from depth_anything_3.utils.alignment import (
     apply_metric_scaling,
@@ -30,6 +45,7 @@ from depth_anything_3.utils.alignment import (
     set_sky_regions_to_max_depth,
 )
 from depth_anything_3.utils.geometry import affine_inverse, as_homogeneous, map_pdf_to_opacity
+from depth_anything_3.utils.prediction_helpers import process_mono_sky_estimation
 from depth_anything_3.utils.ray_utils import get_extrinsic_from_camray
 
 
@@ -37,6 +53,59 @@ def _wrap_cfg(cfg_obj):
     return OmegaConf.create(cfg_obj)
 
 
+# Outputs that can be requested from the networks and the keys they produce
+OUTPUT_KEYS = {
+    "depth": ("depth",),
+    "conf": ("depth_conf",),
+    "sky": ("sky",),
+    "pose": ("extrinsics", "intrinsics"),
+    "rays": ("ray", "ray_conf"),
+    "gs": ("gaussians",),
+}
+DEFAULT_OUTPUTS = frozenset({"depth", "conf", "sky", "pose"})
+
+
+def resolve_outputs(outputs: Iterable[str] | None, infer_gs: bool = False) -> frozenset[str]:
+    """
+    Validate a selection of outputs.
+
+    Args:
+        outputs: Names from ``OUTPUT_KEYS``; None selects ``DEFAULT_OUTPUTS``
+        infer_gs: Also select the 3DGS output
+
+    Returns:
+        Selected output names
+    """
+    outputs = DEFAULT_OUTPUTS if outputs is None else frozenset(outputs)
+    unknown = outputs - OUTPUT_KEYS.keys()
+    if unknown:
+        raise ValueError(
+            f"Unknown outputs {sorted(unknown)}, expected a subset of {sorted(OUTPUT_KEYS)}"
+        )
+    return outputs | {"gs"} if infer_gs else outputs
+
+
+def view_index(
+    output_indices: Sequence[int] | torch.Tensor, num_views: int, device: torch.device
+) -> torch.Tensor:
+    """Validated indices of the views to decode, as a LongTensor on ``device``."""
+    view_idx = torch.as_tensor(output_indices, dtype=torch.long, device=device).flatten()
+    if view_idx.numel() == 0:
+        raise ValueError("output_indices must select at least one view")
+    if view_idx.min() < 0 or view_idx.max() >= num_views:
+        raise ValueError(f"output_indices {output_indices} out of range for {num_views} views")
+    return view_idx
+
+
+def select_outputs(output: Dict, outputs: frozenset[str]) -> Dict:
+    """Drop the keys of outputs that were computed internally but not selected."""
+    for name, keys in OUTPUT_KEYS.items():
+        if name not in outputs:
+            for key in keys:
+                output.pop(key, None)
+    return output
+
+
 class DepthAnything3Net(nn.Module):
     """
     Depth Anything 3 network for depth estimation and camera pose estimation.
@@ -96,6 +165,12 @@ class DepthAnything3Net(nn.Module):
                     gs_head["output_dim"] == gs_out_dim
                 ), f"gs_head output_dim should set to {gs_out_dim}, got {gs_head['output_dim']}"
                 self.gs_head = create_object(_wrap_cfg(gs_head))
+        # Views per head chunk: an int, "auto" (sized from head_memory_budget in GB, or the
+        # free device memory when None) or None for a single chunk
+        self.head_chunk_size: int | str | None = DEFAULT_HEAD_CHUNK_SIZE
+        self.head_memory_budget: float | None = None
+        # Move finished head chunks to CPU memory
+        self.head_offload = False
 
     def forward(
         self,
@@ -106,6 +181,17 @@ class DepthAnything3Net(nn.Module):
         infer_gs: bool = False,
         use_ray_pose: bool = False,
         ref_view_strategy: str = "saddle_balanced",
+        ref_view_idx: int | None = None,
+        global_attn_mode: str = "full",
+        global_attn_kwargs: dict | None = None,
+        stream_state: StreamingState | None = None,
+        token_merge_ratio: TokenMergeRatio | None = None,
+        memory_budget: float | None = None,
+        low_memory: bool = False,
+        offload_aux_feats: bool = False,
+        view_sizes: torch.Tensor | None = None,
+        outputs: Iterable[str] | None = None,
+        output_indices: Sequence[int] | torch.Tensor | None = None,
     ) -> Dict[str, torch.Tensor]:
         """
         Forward pass through the network.
@@ -118,68 +204,145 @@ class DepthAnything3Net(nn.Module):
             infer_gs: Enable Gaussian Splatting branch
             use_ray_pose: Use ray-based pose estimation
             ref_view_strategy: Strategy for selecting reference view
+            ref_view_idx: Precomputed reference view index, skips the selection
+            global_attn_mode: Sparse attention mode of global blocks ("full", "window", "keyframe")
+            global_attn_kwargs: Options of the sparse mode, e.g. {"window": 4} or {"keyframes": 8}
+            stream_state: Cached global keys/values of previously processed views
+            token_merge_ratio: Token merging ratio of the local blocks, a float or a list of
+                (start_block, end_block, ratio) ranges
+            memory_budget: Activation memory budget of the backbone in GB (None: unbounded)
+            low_memory: Defer concatenation/normalization of backbone features to the heads
+            offload_aux_feats: Move exported features to CPU in fp16 as soon as produced
+            view_sizes: Valid (height, width) of each view (B, N, 2) when views of different
+                sizes are padded at the bottom and right to a common (H, W); padded tokens
+                are masked out of attention and padded pixels are zero in the outputs
+            outputs: Outputs to compute, a subset of ``OUTPUT_KEYS`` (None: depth, conf, sky
+                and pose); heads, branches and the camera decoder that no selected output
+                depends on are skipped. "gs" is selected by ``infer_gs``.
+            output_indices: Indices of the views to decode (None: all). All views take part
+                in the backbone; the other views only provide context and get no outputs.
 
         Returns:
             Dictionary containing predictions and auxiliary features
         """
+        outputs = resolve_outputs(outputs, infer_gs)
+        infer_gs = "gs" in outputs
+        required = set(outputs)
+        if infer_gs:
+            # The 3DGS adapter places the Gaussians with the predicted depth and poses
+            required |= {"depth", "pose"}
+        estimate_pose = "pose" in required
+        keep_rays = "rays" in required
+        head_outputs = self._head_outputs(required, use_ray_pose)
+
+        H, W = x.shape[-2], x.shape[-1]
+        # Image size used to convert between field of view and focal length, per view
+        # when padded
+        image_hw = (H, W) if view_sizes is None else view_sizes.unbind(-1)
+        if view_sizes is not None:
+            self._check_padded_options(
+                infer_gs=infer_gs,
+                stream_state=stream_state is not None,
+                token_merge_ratio=bool(token_merge_ratio),
+                memory_budget=memory_budget is not None,
+                low_memory=low_memory,
+                global_attn_mode=global_attn_mode != "full",
+            )
+
         # Extract features using backbone
         if extrinsics is not None:
             with torch.autocast(device_type=x.device.type, enabled=False):
-                cam_token = self.cam_enc(extrinsics, intrinsics, x.shape[-2:])
+                cam_token = self.cam_enc(extrinsics, intrinsics, image_hw)
         else:
             cam_token = None
 
-        feats, aux_feats = self.backbone(
-            x, cam_token=cam_token, export_feat_layers=export_feat_layers, ref_view_strategy=ref_view_strategy
+        if ref_view_idx is not None:
+            if not 0 <= ref_view_idx < x.shape[1]:
+                raise ValueError(
+                    f"ref_view_idx {ref_view_idx} out of range for {x.shape[1]} views"
+                )
+            # A tensor keeps compiled graphs independent of the index value
+            ref_view_idx = torch.full((x.shape[0],), ref_view_idx, device=x.device)
+
+        feats, aux_feats, ref_view_idx = self.backbone(
+            x,
+            cam_token=cam_token,
+            export_feat_layers=export_feat_layers,
+            ref_view_strategy=ref_view_strategy,
+            ref_view_idx=ref_view_idx,
+            global_attn_mode=global_attn_mode,
+            global_attn_kwargs=global_attn_kwargs,
+            stream_state=stream_state,
+            token_merge_ratio=token_merge_ratio,
+            memory_budget=memory_budget,
+            low_memory=low_memory,
+            offload_aux_feats=offload_aux_feats,
+            view_sizes=view_sizes,
         )
         # feats = [[item for item in feat] for feat in feats]
-        H, W = x.shape[-2], x.shape[-1]
+        if output_indices is not None:
+            # Context-only views have done their part in attention, decode the selected ones
+            view_idx = view_index(output_indices, x.shape[1], x.device)
+            feats = [
+                (select_view_feats(feat[0], view_idx), feat[1][:, view_idx]) for feat in feats
+            ]
+            aux_feats = [feat[:, view_idx.to(feat.device)] for feat in aux_feats]
+            x = x[:, view_idx]
+            if extrinsics is not None:
+                extrinsics, intrinsics = extrinsics[:, view_idx], intrinsics[:, view_idx]
+            if view_sizes is not None:
+                view_sizes = view_sizes[:, view_idx]
+                image_hw = view_sizes.unbind(-1)
 
         # Process features through depth head
         with torch.autocast(device_type=x.device.type, enabled=False):
-            output = self._process_depth_head(feats, H, W)
-            if use_ray_pose:
-                output = self._process_ray_pose_estimation(output, H, W)
+            if not head_outputs:
+                # E.g. poses only: the camera decoder works on the camera tokens alone
+                output = Dict()
+            elif view_sizes is not None:
+                output = self._process_padded_depth_head(
+                    feats,
+                    view_sizes,
+                    H,
+                    W,
+                    use_ray_pose and estimate_pose,
+                    head_outputs,
+                    keep_rays,
+                )
             else:
-                output = self._process_camera_estimation(feats, H, W, output)
+                output = self._process_depth_head(feats, H, W, head_outputs)
+                if use_ray_pose and estimate_pose:
+                    output = self._process_ray_pose_estimation(output, H, W, keep_rays)
+            if not use_ray_pose and estimate_pose:
+                output = self._process_camera_estimation(feats, *image_hw, output, keep_rays)
             if infer_gs:
                 output = self._process_gs_head(feats, H, W, output, x, extrinsics, intrinsics)
         
-        output = self._process_mono_sky_estimation(output)    
+        valid_mask = (
+            valid_region_mask(view_sizes, H, W).to(output.depth.device)
+            if view_sizes is not None and "depth" in output
+            else None
+        )
+        output = process_mono_sky_estimation(output, valid_mask)
+        if view_sizes is not None:
+            output.view_sizes = view_sizes
 
         # Extract auxiliary features if requested
         output.aux = self._extract_auxiliary_features(aux_feats, export_feat_layers, H, W)
+        if ref_view_idx is not None:
+            output.ref_view_idx = ref_view_idx
 
-        return output
+        return select_outputs(output, outputs)
 
-    def _process_mono_sky_estimation(
-        self, output: Dict[str, torch.Tensor]
-    ) -> Dict[str, torch.Tensor]:
-        """Process mono sky estimation."""
-        if "sky" not in output:
-            return output
-        non_sky_mask = compute_sky_mask(output.sky, threshold=0.3)
-        if non_sky_mask.sum() <= 10:
-            return output
-        if (~non_sky_mask).sum() <= 10:
-            return output
-        
-        non_sky_depth = output.depth[non_sky_mask]
-        if non_sky_depth.numel() > 100000:
-            idx = torch.randint(0, non_sky_depth.numel(), (100000,), device=non_sky_depth.device)
-            sampled_depth = non_sky_depth[idx]
-        else:
-            sampled_depth = non_sky_depth
-        non_sky_max = torch.quantile(sampled_depth, 0.99)
-
-        # Set sky regions to maximum depth and high confidence
-        output.depth, _ = set_sky_regions_to_max_depth(
-            output.depth, None, non_sky_mask, max_depth=non_sky_max
-        )
-        return output
+    @staticmethod
+    def _check_padded_options(**options: bool) -> None:
+        """Raise for options that do not support padded views."""
+        unsupported = [name for name, enabled in options.items() if enabled]
+        if unsupported:
+            raise ValueError(f"Padded views (view_sizes) do not support: {', '.join(unsupported)}")
 
     def _process_ray_pose_estimation(
-        self, output: Dict[str, torch.Tensor], height: int, width: int
+        self, output: Dict[str, torch.Tensor], height: int, width: int, keep_rays: bool = False
     ) -> Dict[str, torch.Tensor]:
         """Process ray pose estimation if ray pose decoder is available."""
         if "ray" in output and "ray_conf" in output:
@@ -196,28 +359,115 @@ class DepthAnything3Net(nn.Module):
             pred_intrinsic[:, :, 1, 1] = pred_focal_lengths[:, :, 1] / 2 * height
             pred_intrinsic[:, :, 0, 2] = pred_principal_points[:, :, 0] * width * 0.5
             pred_intrinsic[:, :, 1, 2] = pred_principal_points[:, :, 1] * height * 0.5
-            del output.ray
-            del output.ray_conf
+            if not keep_rays:
+                del output.ray
+                del output.ray_conf
             output.extrinsics = pred_extrinsic
             output.intrinsics = pred_intrinsic
         return output
 
+    def _head_chunk_size(
+        self, head: nn.Module, feats: list[torch.Tensor], H: int, W: int
+    ) -> int | None:
+        """Views per chunk of ``head`` under the current chunking policy."""
+        if self.head_chunk_size != "auto":
+            return self.head_chunk_size
+        B, S = feats[0][0].shape[:2]
+        device = next(head.parameters()).device
+        return plan_head_chunk_size(head, B * S, H, W, self.head_memory_budget, device)
+
+    def _head_outputs(self, required: set[str], use_ray_pose: bool = False) -> set[str]:
+        """Keys the depth head has to compute for the ``required`` outputs."""
+        head = self.head
+        has_sky = getattr(head, "use_sky_head", False)
+        head_aux = getattr(head, "head_aux", None)
+        keys = set()
+        if "depth" in required or "conf" in required:
+            keys |= {head.head_main, f"{head.head_main}_conf"}
+        if has_sky and ("sky" in required or "depth" in required):
+            # Sky regions of the depth are filled using the sky map
+            keys.add(head.sky_name)
+        if head_aux is not None and (
+            "rays" in required or ("pose" in required and use_ray_pose)
+        ):
+            keys |= {head_aux, f"{head_aux}_conf"}
+        return keys
+
     def _process_depth_head(
-        self, feats: list[torch.Tensor], H: int, W: int
+        self, feats: list[torch.Tensor], H: int, W: int, outputs: set[str] | None = None
     ) -> Dict[str, torch.Tensor]:
         """Process features through the depth prediction head."""
-        return self.head(feats, H, W, patch_start_idx=0)
+        return self.head(
+            feats,
+            H,
+            W,
+            patch_start_idx=0,
+            chunk_size=self._head_chunk_size(self.head, feats, H, W),
+            offload_to_cpu=self.head_offload,
+            outputs=outputs,
+        )
+
+    def _process_padded_depth_head(
+        self,
+        feats: list[torch.Tensor],
+        view_sizes: torch.Tensor,
+        H: int,
+        W: int,
+        use_ray_pose: bool = False,
+        outputs: set[str] | None = None,
+        keep_rays: bool = False,
+    ) -> Dict[str, torch.Tensor]:
+        """
+        Run the depth head (and ray pose estimation) on the valid patch grid of padded views,
+        one group of equally sized views at a time, and place the outputs on the canvas.
+        """
+        B, S = view_sizes.shape[:2]
+        canvas_hw = (H // self.PATCH_SIZE, W // self.PATCH_SIZE)
+        output = Dict()
+        for (h, w), idx in group_views_by_size(view_sizes):
+            grid_hw = (h // self.PATCH_SIZE, w // self.PATCH_SIZE)
+            group_feats = [
+                (crop_view_tokens(feat[0], idx, grid_hw, canvas_hw), feat[1].flatten(0, 1)[idx])
+                for feat in feats
+            ]
+            group_output = self._process_depth_head(group_feats, h, w, outputs)
+            if use_ray_pose:
+                group_output = self._process_ray_pose_estimation(group_output, h, w, keep_rays)
+            for key, value in group_output.items():
+                value = value[0]
+                # Head outputs may have been offloaded to CPU
+                idx = idx.to(value.device)
+                if key in ("extrinsics", "intrinsics"):
+                    if key not in output:
+                        output[key] = value.new_zeros(B * S, *value.shape[1:])
+                    output[key][idx] = value
+                    continue
+                # Maps may be predicted at another resolution than the input, e.g. rays
+                if key not in output:
+                    output[key] = value.new_zeros(
+                        B * S,
+                        H * value.shape[1] // h,
+                        W * value.shape[2] // w,
+                        *value.shape[3:],
+                    )
+                output[key][idx, : value.shape[1], : value.shape[2]] = value
+        return Dict({key: value.unflatten(0, (B, S)) for key, value in output.items()})
 
     def _process_camera_estimation(
-        self, feats: list[torch.Tensor], H: int, W: int, output: Dict[str, torch.Tensor]
+        self,
+        feats: list[torch.Tensor],
+        H: int | torch.Tensor,
+        W: int | torch.Tensor,
+        output: Dict[str, torch.Tensor],
+        keep_rays: bool = False,
     ) -> Dict[str, torch.Tensor]:
         """Process camera pose estimation if camera decoder is available."""
         if self.cam_dec is not None:
             pose_enc = self.cam_dec(feats[-1][1])
             # Remove ray information as it's not needed for pose estimation
-            if "ray" in output:
+            if "ray" in output and not keep_rays:
                 del output.ray
-            if "ray_conf" in output:
+            if "ray_conf" in output and not keep_rays:
                 del output.ray_conf
 
             # Convert pose encoding to extrinsics and intrinsics
@@ -250,6 +500,9 @@ class DepthAnything3Net(nn.Module):
         assert (
             ctx_extr is not None and ctx_intr is not None
         ), "must process camera info first if GT is not available"
+        # The depth head outputs may have been offloaded to CPU
+        device = in_images.device
+        ctx_extr, ctx_intr = ctx_extr.to(device), ctx_intr.to(device)
 
         gt_extr = extrinsics
         # homo the extr if needed
@@ -263,6 +516,7 @@ class DepthAnything3Net(nn.Module):
             H=H,
             W=W,
             patch_start_idx=0,
+            chunk_size=self._head_chunk_size(self.gs_head, feats, H, W),
             images=in_images,
         )
         raw_gaussians = gs_outs.raw_gs
@@ -273,7 +527,7 @@ class DepthAnything3Net(nn.Module):
         gs_world = self.gs_adapter(
             extrinsics=ctx_extr,
             intrinsics=ctx_intr,
-            depths=output.depth,
+            depths=output.depth.to(device),
             opacities=map_pdf_to_opacity(densities),
             raw_gaussians=raw_gaussians,
             image_shape=(H, W),
@@ -319,19 +573,34 @@ class NestedDepthAnything3Net(nn.Module):
     Args:
         preset: Configuration for the main depth estimation branch
         second_preset: Configuration for the metric depth branch
+        metric_resolution: Longest side in pixels of the metric branch input
+        concurrent_metric: Run the metric branch concurrently with the main branch
     """
 
-    def __init__(self, anyview: DictConfig, metric: DictConfig):
+    def __init__(
+        self,
+        anyview: DictConfig,
+        metric: DictConfig,
+        metric_resolution: int | None = None,
+        concurrent_metric: bool = False,
+    ):
         """
         Initialize NestedDepthAnything3Net with two branches.
 
         Args:
             preset: Configuration for main depth estimation branch
             second_preset: Configuration for metric depth branch
+            metric_resolution: Longest side in pixels of the metric branch input, rounded
+                down to a multiple of the patch size. The metric depth and sky outputs are
+                upsampled to the input resolution. None runs it at the input resolution.
+            concurrent_metric: Run the metric branch concurrently with the main branch, on
+                a separate CUDA stream or a separate thread on CPU
         """
         super().__init__()
         self.da3 = create_object(anyview)
         self.da3_metric = create_object(metric)
+        self.metric_resolution = metric_resolution
+        self.concurrent_metric = concurrent_metric
 
     def forward(
         self,
@@ -342,6 +611,17 @@ class NestedDepthAnything3Net(nn.Module):
         infer_gs: bool = False,
         use_ray_pose: bool = False,
         ref_view_strategy: str = "saddle_balanced",
+        ref_view_idx: int | None = None,
+        global_attn_mode: str = "full",
+        global_attn_kwargs: dict | None = None,
+        stream_state: StreamingState | None = None,
+        token_merge_ratio: TokenMergeRatio | None = None,
+        memory_budget: float | None = None,
+        low_memory: bool = False,
+        offload_aux_feats: bool = False,
+        view_sizes: torch.Tensor | None = None,
+        outputs: Iterable[str] | None = None,
+        output_indices: Sequence[int] | torch.Tensor | None = None,
     ) -> Dict[str, torch.Tensor]:
         """
         Forward pass through both branches with metric scaling alignment.
@@ -354,40 +634,192 @@ class NestedDepthAnything3Net(nn.Module):
             infer_gs: Enable Gaussian Splatting branch
             use_ray_pose: Use ray-based pose estimation
             ref_view_strategy: Strategy for selecting reference view
+            ref_view_idx: Precomputed reference view index, skips the selection
+            global_attn_mode: Sparse attention mode of global blocks ("full", "window", "keyframe")
+            global_attn_kwargs: Options of the sparse mode, e.g. {"window": 4} or {"keyframes": 8}
+            stream_state: Cached global keys/values of previously processed views
+            token_merge_ratio: Token merging ratio of the local blocks, a float or a list of
+                (start_block, end_block, ratio) ranges
+            memory_budget: Activation memory budget of the backbone in GB (None: unbounded)
+            low_memory: Defer concatenation/normalization of backbone features to the heads
+            offload_aux_feats: Move exported features to CPU in fp16 as soon as produced
+            view_sizes: Valid (height, width) of each view (B, N, 2) of padded views; the
+                metric branch then runs at the input resolution
+            outputs: Outputs to compute, a subset of ``OUTPUT_KEYS`` (None: depth, conf, sky
+                and pose). The metric alignment always needs the depth, confidence and poses
+                of the main branch and the depth and sky of the metric branch.
+            output_indices: Indices of the views to decode (None: all); the other views only
+                provide context to the main branch
 
         Returns:
             Dictionary containing aligned depth predictions and camera parameters
         """
+        outputs = resolve_outputs(outputs, infer_gs)
+        main_outputs = outputs | {"depth", "conf", "pose"}
+        metric_outputs = {"depth", "sky"}
+        metric_x, metric_indices, out_view_sizes = x, output_indices, view_sizes
+        if output_indices is not None:
+            view_idx = view_index(output_indices, x.shape[1], x.device)
+            if view_sizes is not None:
+                out_view_sizes = view_sizes[:, view_idx]
+            if self.da3_metric.backbone.alt_start == -1:
+                # Views of a monocular metric branch are independent, run the selected ones
+                metric_x, metric_indices = x[:, view_idx], None
+
         # Get predictions from both branches
-        output = self.da3(
-            x, extrinsics, intrinsics, export_feat_layers=export_feat_layers, infer_gs=infer_gs, use_ray_pose=use_ray_pose, ref_view_strategy=ref_view_strategy
-        )
-        metric_output = self.da3_metric(x)
+        def run_main():
+            return self.da3(
+                x,
+                extrinsics,
+                intrinsics,
+                export_feat_layers=export_feat_layers,
+                infer_gs=infer_gs,
+                use_ray_pose=use_ray_pose,
+                ref_view_strategy=ref_view_strategy,
+                ref_view_idx=ref_view_idx,
+                global_attn_mode=global_attn_mode,
+                global_attn_kwargs=global_attn_kwargs,
+                stream_state=stream_state,
+                token_merge_ratio=token_merge_ratio,
+                memory_budget=memory_budget,
+                low_memory=low_memory,
+                offload_aux_feats=offload_aux_feats,
+                view_sizes=view_sizes,
+                outputs=main_outputs,
+                output_indices=output_indices,
+            )
+
+        def run_metric():
+            if view_sizes is not None:
+                # Padded views keep their valid sizes at the input resolution
+                return self.da3_metric(
+                    metric_x,
+                    view_sizes=view_sizes if metric_indices is not None else out_view_sizes,
+                    outputs=metric_outputs,
+                    output_indices=metric_indices,
+                )
+            return self.da3_metric(
+                self._resize_metric_input(metric_x),
+                token_merge_ratio=token_merge_ratio,
+                memory_budget=memory_budget,
+                low_memory=low_memory,
+                outputs=metric_outputs,
+                output_indices=metric_indices,
+            )
+
+        if self.concurrent_metric:
+            output, metric_output = run_concurrently(run_main, run_metric, x.device)
+        else:
+            output = run_main()
+            metric_output = run_metric()
 
         # Apply metric scaling and alignment
         output = self._apply_metric_scaling(output, metric_output)
-        output = self._apply_depth_alignment(output, metric_output)
-        output = self._handle_sky_regions(output, metric_output)
+        metric_output = self._upsample_metric_output(metric_output, x.shape[-2], x.shape[-1])
+        valid_mask = (
+            valid_region_mask(out_view_sizes, *x.shape[-2:]).to(output.depth.device)
+            if out_view_sizes is not None
+            else None
+        )
+        if x.shape[0] > 1:
+            output = self._align_scenes(output, metric_output, valid_mask)
+        else:
+            output = self._apply_depth_alignment(output, metric_output, stream_state, valid_mask)
+            output = self._handle_sky_regions(output, metric_output, valid_mask=valid_mask)
+
+        return select_outputs(output, outputs)
 
+    def _align_scenes(
+        self,
+        output: Dict[str, torch.Tensor],
+        metric_output: Dict[str, torch.Tensor],
+        valid_mask: torch.Tensor | None = None,
+    ) -> Dict[str, torch.Tensor]:
+        """Metric alignment and sky handling of each scene of a batch on its own."""
+        scale_factors = []
+        for b in range(output.depth.shape[0]):
+            scene = Dict({k: output[k][b : b + 1] for k in ("depth", "depth_conf", "extrinsics")})
+            metric_scene = Dict({k: metric_output[k][b : b + 1] for k in ("depth", "sky")})
+            scene_mask = valid_mask[b : b + 1] if valid_mask is not None else None
+            scene = self._apply_depth_alignment(scene, metric_scene, valid_mask=scene_mask)
+            scene = self._handle_sky_regions(scene, metric_scene, valid_mask=scene_mask)
+            for k in ("depth", "depth_conf", "extrinsics"):
+                output[k][b] = scene[k][0]
+            scale_factors.append(scene.scale_factor)
+        output.is_metric = 1
+        # One metric scale per scene
+        output.scale_factor = scale_factors
         return output
 
+    def _resize_metric_input(self, x: torch.Tensor) -> torch.Tensor:
+        """Downscale the images for the metric branch to ``metric_resolution``."""
+        H, W = x.shape[-2:]
+        if self.metric_resolution is None or max(H, W) <= self.metric_resolution:
+            return x
+        patch_size = self.da3_metric.PATCH_SIZE
+        scale = self.metric_resolution / max(H, W)
+        h = max(patch_size, int(H * scale) // patch_size * patch_size)
+        w = max(patch_size, int(W * scale) // patch_size * patch_size)
+        x_metric = F.interpolate(
+            x.flatten(0, 1), size=(h, w), mode="bilinear", align_corners=False, antialias=True
+        )
+        return x_metric.unflatten(0, x.shape[:2])
+
     def _apply_metric_scaling(
         self, output: Dict[str, torch.Tensor], metric_output: Dict[str, torch.Tensor]
     ) -> Dict[str, torch.Tensor]:
         """Apply metric scaling to the metric depth output."""
+        intrinsics = output.intrinsics.to(metric_output.depth.device)
+        H, W = output.depth.shape[-2:]
+        h, w = metric_output.depth.shape[-2:]
+        if (h, w) != (H, W):
+            # Focal lengths in pixels of the downscaled metric input
+            intrinsics = intrinsics.clone()
+            intrinsics[..., 0, :] *= w / W
+            intrinsics[..., 1, :] *= h / H
         # Scale metric depth based on camera intrinsics
         metric_output.depth = apply_metric_scaling(
             metric_output.depth,
-            output.intrinsics,
+            intrinsics,
         )
         return output
 
+    @staticmethod
+    def _upsample_metric_output(
+        metric_output: Dict[str, torch.Tensor], H: int, W: int
+    ) -> Dict[str, torch.Tensor]:
+        """Upsample the metric depth and sky of a downscaled metric branch to (H, W)."""
+        if metric_output.depth.shape[-2:] == (H, W):
+            return metric_output
+        for key in ("depth", "sky"):
+            if key in metric_output:
+                metric_output[key] = F.interpolate(
+                    metric_output[key], size=(H, W), mode="bilinear", align_corners=False
+                )
+        return metric_output
+
     def _apply_depth_alignment(
-        self, output: Dict[str, torch.Tensor], metric_output: Dict[str, torch.Tensor]
+        self,
+        output: Dict[str, torch.Tensor],
+        metric_output: Dict[str, torch.Tensor],
+        stream_state: StreamingState | None = None,
+        valid_mask: torch.Tensor | None = None,
     ) -> Dict[str, torch.Tensor]:
         """Apply depth alignment using least squares scaling."""
+        # Frames of a stream share the scale estimated on the first frames
+        if stream_state is not None and stream_state.scale_factor is not None:
+            scale_factor = stream_state.scale_factor
+            output.depth *= scale_factor
+            output.extrinsics[:, :, :3, 3] *= scale_factor
+            output.is_metric = 1
+            output.scale_factor = scale_factor
+            return output
+
         # Compute non-sky mask
         non_sky_mask = compute_sky_mask(metric_output.sky, threshold=0.3)
+        if valid_mask is not None:
+            # Padded pixels are left out of the alignment
+            non_sky_mask = non_sky_mask & valid_mask
 
         # Ensure we have enough non-sky pixels
         assert non_sky_mask.sum() > 10, "Insufficient non-sky pixels for alignment"
@@ -412,6 +844,8 @@ class NestedDepthAnything3Net(nn.Module):
         output.extrinsics[:, :, :3, 3] *= scale_factor
         output.is_metric = 1
         output.scale_factor = scale_factor.item()
+        if stream_state is not None:
+            stream_state.scale_factor = output.scale_factor
 
         return output
 
@@ -420,13 +854,16 @@ class NestedDepthAnything3Net(nn.Module):
         output: Dict[str, torch.Tensor],
         metric_output: Dict[str, torch.Tensor],
         sky_depth_def: float = 200.0,
+        valid_mask: torch.Tensor | None = None,
     ) -> Dict[str, torch.Tensor]:
         """Handle sky regions by setting them to maximum depth."""
         non_sky_mask = compute_sky_mask(metric_output.sky, threshold=0.3)
 
         # Compute maximum depth for non-sky regions
         # Use sampling to safely compute quantile on large tensors
-        non_sky_depth = output.depth[non_sky_mask]
+        non_sky_depth = output.depth[
+            non_sky_mask if valid_mask is None else non_sky_mask & valid_mask
+        ]
         if non_sky_depth.numel() > 100000:
             idx = torch.randint(0, non_sky_depth.numel(), (100000,), device=non_sky_depth.device)
             sampled_depth = non_sky_depth[idx]
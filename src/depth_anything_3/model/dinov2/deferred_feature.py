@@ -0,0 +1,80 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Deferred backbone layer outputs for the low-memory mode.
+
+Instead of concatenating the local and global tokens of every output layer, normalizing
+them and gathering them back into the original view order right away, a DeferredFeature
+keeps references to the block outputs and the view permutation. The concatenated,
+normalized features are only built for the views a head asks for, so at most one chunk
+of views is materialized at a time.
+"""
+
+from __future__ import annotations
+
+import torch
+import torch.nn as nn
+from torch import Tensor
+
+
+class DeferredFeature:
+    """
+    Layer output of shape (B, S, N, C) that is materialized on slicing.
+
+    Slicing follows the flattened ``(B * S)`` view axis used by the heads, e.g.
+    ``feat[s0:s1]`` returns a tensor of shape (s1 - s0, N, C).
+
+    Args:
+        local_x: Output of the last local block (B, S, num_prefix + N, C), or None
+            if the local tokens are not concatenated
+        x: Output of the layer (B, S, num_prefix + N, C)
+        norm: Norm applied to the global part
+        num_prefix: Number of leading special tokens to drop
+    """
+
+    def __init__(
+        self,
+        local_x: Tensor | None,
+        x: Tensor,
+        norm: nn.Module,
+        num_prefix: int,
+    ):
+        self.local_x = local_x
+        self.x = x
+        self.norm = norm
+        self.num_prefix = num_prefix
+
+    @property
+    def shape(self) -> torch.Size:
+        B, S, N, C = self.x.shape
+        if self.local_x is not None:
+            C = C + self.local_x.shape[-1]
+        return torch.Size([B, S, N - self.num_prefix, C])
+
+    def select_views(self, view_idx: Tensor) -> DeferredFeature:
+        """Deferred feature of the views ``view_idx`` along S."""
+        local_x = self.local_x[:, view_idx] if self.local_x is not None else None
+        return DeferredFeature(local_x, self.x[:, view_idx], self.norm, self.num_prefix)
+
+    def __getitem__(self, rows: slice) -> Tensor:
+        if not isinstance(rows, slice):
+            raise TypeError("DeferredFeature only supports slicing over flattened views")
+        B, S = self.x.shape[:2]
+        row_ids = torch.arange(B * S, device=self.x.device)[rows]
+        b, s = row_ids // S, row_ids % S
+        x = self.norm(self.x[b, s, self.num_prefix :])
+        if self.local_x is None:
+            return x
+        return torch.cat([self.local_x[b, s, self.num_prefix :], x], dim=-1)
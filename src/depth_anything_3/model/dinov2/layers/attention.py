@@ -44,7 +44,7 @@ class Attention(nn.Module):
         self.proj_drop = nn.Dropout(proj_drop)
         self.rope = rope
 
-    def forward(self, x: Tensor, pos=None, attn_mask=None) -> Tensor:
+    def forward(self, x: Tensor, pos=None, attn_mask=None, attn_fn=None) -> Tensor:
         B, N, C = x.shape
         qkv = (
             self.qkv(x)
@@ -56,17 +56,22 @@ class Attention(nn.Module):
         if self.rope is not None and pos is not None:
             q = self.rope(q, pos)
             k = self.rope(k, pos)
-        if self.fused_attn:
+        if attn_fn is not None:
+            # Custom attention over (B, heads, N, head_dim) q/k/v, e.g. sparse view attention
+            x = attn_fn(q, k, v)
+        elif self.fused_attn:
+            if attn_mask is not None:
+                # Broadcast over heads instead of copying the mask per head; a key-padding
+                # mask (B, N) is also broadcast over queries
+                attn_mask = (
+                    attn_mask[:, None, None] if attn_mask.dim() == 2 else attn_mask[:, None]
+                )
             x = F.scaled_dot_product_attention(
                 q,
                 k,
                 v,
                 dropout_p=self.attn_drop.p if self.training else 0.0,
-                attn_mask=(
-                    (attn_mask)[:, None].repeat(1, self.num_heads, 1, 1)
-                    if attn_mask is not None
-                    else None
-                ),
+                attn_mask=attn_mask,
             )
         else:
             q = q * self.scale
@@ -74,14 +74,35 @@ class Block(nn.Module):
 
         self.sample_drop_ratio = drop_path
 
-    def forward(self, x: Tensor, pos=None, attn_mask=None) -> Tensor:
-        def attn_residual_func(x: Tensor, pos=None, attn_mask=None) -> Tensor:
-            return self.ls1(self.attn(self.norm1(x), pos=pos, attn_mask=attn_mask))
+    def forward(
+        self,
+        x: Tensor,
+        pos=None,
+        attn_mask=None,
+        attn_fn=None,
+        token_merge=None,
+        ffn_chunk_size=None,
+    ) -> Tensor:
+        def attn_residual_func(x: Tensor, pos=None, attn_mask=None, attn_fn=None) -> Tensor:
+            return self.ls1(
+                self.attn(self.norm1(x), pos=pos, attn_mask=attn_mask, attn_fn=attn_fn)
+            )
 
         def ffn_residual_func(x: Tensor) -> Tensor:
             return self.ls2(self.mlp(self.norm2(x)))
 
-        if self.training and self.sample_drop_ratio > 0.1:
+        if token_merge is not None:
+            # Attention and MLP run on merged tokens, the residual stream keeps all tokens
+            x = x + token_merge.unmerge(
+                attn_residual_func(
+                    token_merge.merge(x),
+                    pos=token_merge.merge_pos(pos),
+                    attn_mask=attn_mask,
+                    attn_fn=attn_fn,
+                )
+            )
+            x = x + token_merge.unmerge(ffn_residual_func(token_merge.merge(x)))
+        elif self.training and self.sample_drop_ratio > 0.1:
             # the overhead is compensated only for a drop path rate larger than 0.1
             x = drop_add_residual_stochastic_depth(
                 x,
@@ -95,10 +116,17 @@ class Block(nn.Module):
                 sample_drop_ratio=self.sample_drop_ratio,
             )
         elif self.training and self.sample_drop_ratio > 0.0:
-            x = x + self.drop_path1(attn_residual_func(x, pos=pos, attn_mask=attn_mask))
+            x = x + self.drop_path1(
+                attn_residual_func(x, pos=pos, attn_mask=attn_mask, attn_fn=attn_fn)
+            )
             x = x + self.drop_path1(ffn_residual_func(x))  # FIXME: drop_path2
+        elif ffn_chunk_size is not None and x.shape[1] > ffn_chunk_size:
+            x = x + attn_residual_func(x, pos=pos, attn_mask=attn_mask, attn_fn=attn_fn)
+            # Bound the MLP hidden states by running it over chunks of tokens (in-place)
+            for x_chunk in x.split(ffn_chunk_size, dim=1):
+                x_chunk += ffn_residual_func(x_chunk)
         else:
-            x = x + attn_residual_func(x, pos=pos, attn_mask=attn_mask)
+            x = x + attn_residual_func(x, pos=pos, attn_mask=attn_mask, attn_fn=attn_fn)
             x = x + ffn_residual_func(x)
         return x
 
@@ -0,0 +1,141 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Memory-bounded execution of the backbone.
+
+Given an activation memory budget, the backbone runs local blocks over chunks of views,
+runs the MLP of global blocks over chunks of tokens, and computes global attention exactly
+in query chunks. When the keys of all views do not fit in the budget either, keys/values
+are processed in chunks as well and combined with an online softmax, so the full
+(S * N) x (S * N) attention matrix is never materialized.
+"""
+
+import math
+from dataclasses import dataclass
+from typing import Callable, Optional
+import torch
+import torch.nn.functional as F
+from torch import Tensor
+
+BYTES_PER_ELEMENT = 4  # Intermediate scores and accumulators are kept in fp32
+MIN_QUERY_CHUNK = 64
+
+
+@dataclass
+class MemoryPlan:
+    view_chunk_size: int  # Views per local-block chunk
+    token_chunk_size: int  # Tokens per MLP chunk in global blocks
+    query_chunk_size: int  # Queries per global-attention chunk
+    kv_chunk_size: Optional[int]  # Keys per online-softmax chunk, None if all keys fit
+
+
+def plan_memory_budget(
+    memory_budget: float,
+    num_views: int,
+    num_tokens: int,
+    embed_dim: int,
+    num_heads: int,
+    mlp_ratio: float = 4.0,
+) -> MemoryPlan:
+    """
+    Derive chunk sizes for the backbone from an activation memory budget.
+
+    Args:
+        memory_budget: Budget for the intermediate activations of one block, in GB
+        num_views: Number of views S
+        num_tokens: Number of tokens per view N
+        embed_dim: Token dimension C
+        num_heads: Number of attention heads
+        mlp_ratio: Hidden dimension ratio of the MLP
+
+    Returns:
+        MemoryPlan with the chunk sizes
+    """
+    budget = memory_budget * 1024**3 / BYTES_PER_ELEMENT  # in elements
+    hidden_dim = int(embed_dim * mlp_ratio)
+
+    # Local block, per view: attention scores, qkv/output projections and MLP hidden states
+    per_view = num_tokens * (num_heads * num_tokens + 4 * embed_dim + 2 * hidden_dim)
+    view_chunk_size = int(min(num_views, max(1, budget // per_view)))
+
+    # Global MLP, per token: hidden state plus activation output
+    token_chunk_size = int(max(1, budget // (2 * hidden_dim)))
+
+    # Global attention: scores of a (query chunk x key chunk) tile, with temporaries
+    seq_len = num_views * num_tokens
+    tile = budget / (3 * num_heads)
+    query_chunk_size = int(tile // seq_len)
+    kv_chunk_size = None
+    if query_chunk_size < MIN_QUERY_CHUNK:
+        # Keys of all views do not fit next to a reasonable query chunk: chunk them as well
+        query_chunk_size = kv_chunk_size = int(max(MIN_QUERY_CHUNK, math.sqrt(tile)))
+    query_chunk_size = min(query_chunk_size, seq_len)
+    return MemoryPlan(view_chunk_size, token_chunk_size, query_chunk_size, kv_chunk_size)
+
+
+def chunked_attention(
+    q: Tensor,
+    k: Tensor,
+    v: Tensor,
+    query_chunk_size: int,
+    kv_chunk_size: Optional[int] = None,
+) -> Tensor:
+    """
+    Exact scaled dot-product attention computed in query (and key) chunks.
+
+    Args:
+        q, k, v: Tensors of shape (B, heads, L, head_dim)
+        query_chunk_size: Number of queries processed at once
+        kv_chunk_size: Number of keys processed at once with online softmax. None
+            attends to all keys of a query chunk at once.
+
+    Returns:
+        Attention output of shape (B, heads, L, head_dim)
+    """
+    L, Lk = q.shape[2], k.shape[2]
+    out = torch.empty_like(q)
+    if kv_chunk_size is None or kv_chunk_size >= Lk:
+        for q0 in range(0, L, query_chunk_size):
+            q1 = min(q0 + query_chunk_size, L)
+            out[:, :, q0:q1] = F.scaled_dot_product_attention(q[:, :, q0:q1], k, v)
+        return out
+
+    scale = q.shape[-1] ** -0.5
+    for q0 in range(0, L, query_chunk_size):
+        q1 = min(q0 + query_chunk_size, L)
+        q_chunk = q[:, :, q0:q1].float() * scale
+        row_max = q_chunk.new_full((*q_chunk.shape[:3], 1), float("-inf"))
+        row_sum = q_chunk.new_zeros((*q_chunk.shape[:3], 1))
+        acc = q_chunk.new_zeros(*q_chunk.shape[:3], v.shape[-1])
+        for k0 in range(0, Lk, kv_chunk_size):
+            k1 = min(k0 + kv_chunk_size, Lk)
+            scores = q_chunk @ k[:, :, k0:k1].float().transpose(-1, -2)
+            new_max = torch.maximum(row_max, scores.amax(dim=-1, keepdim=True))
+            correction = torch.exp(row_max - new_max)
+            probs = torch.exp(scores - new_max)
+            row_sum = row_sum * correction + probs.sum(dim=-1, keepdim=True)
+            acc = acc * correction + probs @ v[:, :, k0:k1].float()
+            row_max = new_max
+        out[:, :, q0:q1] = (acc / row_sum).to(out.dtype)
+    return out
+
+
+def make_chunked_attn_fn(plan: MemoryPlan) -> Callable[[Tensor, Tensor, Tensor], Tensor]:
+    """Attention function for global blocks following a MemoryPlan."""
+
+    def attn_fn(q: Tensor, k: Tensor, v: Tensor) -> Tensor:
+        return chunked_attention(q, k, v, plan.query_chunk_size, plan.kv_chunk_size)
+
+    return attn_fn
@@ -14,27 +14,22 @@
 #         https://github.com/naver-ai/rope-vit
 
 
-from typing import Dict, Tuple
+from typing import Tuple
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+from depth_anything_3.model.utils.pos_cache import POSITIONAL_CACHE
+
 
 class PositionGetter:
     """Generates and caches 2D spatial positions for patches in a grid.
 
     This class efficiently manages the generation of spatial coordinates for patches
-    in a 2D grid, caching results to avoid redundant computations.
-
-    Attributes:
-        position_cache: Dictionary storing precomputed position tensors for different
-            grid dimensions.
+    in a 2D grid, caching results in the shared positional cache to avoid redundant
+    computations.
     """
 
-    def __init__(self):
-        """Initializes the position generator with an empty cache."""
-        self.position_cache: Dict[Tuple[int, int], torch.Tensor] = {}
-
     def __call__(
         self, batch_size: int, height: int, width: int, device: torch.device
     ) -> torch.Tensor:
@@ -50,13 +45,15 @@ class PositionGetter:
             Tensor of shape (batch_size, height*width, 2) containing y,x coordinates
             for each position in the grid, repeated for each batch item.
         """
-        if (height, width) not in self.position_cache:
+
+        def compute_positions() -> torch.Tensor:
             y_coords = torch.arange(height, device=device)
             x_coords = torch.arange(width, device=device)
-            positions = torch.cartesian_prod(y_coords, x_coords)
-            self.position_cache[height, width] = positions
+            return torch.cartesian_prod(y_coords, x_coords)
 
-        cached_positions = self.position_cache[height, width]
+        cached_positions = POSITIONAL_CACHE.get(
+            "patch_positions", height, width, device, torch.int64, compute_positions
+        )
         return cached_positions.view(1, height * width, 2).expand(batch_size, -1, -1).clone()
 
 
@@ -74,7 +71,8 @@ class RotaryPositionEmbedding2D(nn.Module):
     Attributes:
         base_frequency: Base frequency for computing position embeddings.
         scaling_factor: Factor to scale the computed frequencies.
-        frequency_cache: Cache for storing precomputed frequency components.
+
+    Frequency components are kept in the shared positional cache.
     """
 
     def __init__(self, frequency: float = 100.0, scaling_factor: float = 1.0):
@@ -82,7 +80,6 @@ class RotaryPositionEmbedding2D(nn.Module):
         super().__init__()
         self.base_frequency = frequency
         self.scaling_factor = scaling_factor
-        self.frequency_cache: Dict[Tuple, Tuple[torch.Tensor, torch.Tensor]] = {}
 
     def _compute_frequency_components(
         self, dim: int, seq_len: int, device: torch.device, dtype: torch.dtype
@@ -98,8 +95,8 @@ class RotaryPositionEmbedding2D(nn.Module):
         Returns:
             Tuple of (cosine, sine) tensors for frequency components.
         """
-        cache_key = (dim, seq_len, device, dtype)
-        if cache_key not in self.frequency_cache:
+
+        def compute_components() -> Tuple[torch.Tensor, torch.Tensor]:
             # Compute frequency bands
             exponents = torch.arange(0, dim, 2, device=device).float() / dim
             inv_freq = 1.0 / (self.base_frequency**exponents)
@@ -108,14 +105,24 @@ class RotaryPositionEmbedding2D(nn.Module):
             positions = torch.arange(seq_len, device=device, dtype=inv_freq.dtype)
             angles = torch.einsum("i,j->ij", positions, inv_freq)
 
-            # Compute and cache frequency components
+            # Compute frequency components
             angles = angles.to(dtype)
             angles = torch.cat((angles, angles), dim=-1)
             cos_components = angles.cos().to(dtype)
             sin_components = angles.sin().to(dtype)
-            self.frequency_cache[cache_key] = (cos_components, sin_components)
-
-        return self.frequency_cache[cache_key]
+            return cos_components, sin_components
+
+        # The tables cover positions [0, seq_len) along both axes
+        return POSITIONAL_CACHE.get(
+            "rope_frequencies",
+            seq_len,
+            seq_len,
+            device,
+            dtype,
+            compute_components,
+            dim,
+            self.base_frequency,
+        )
 
     @staticmethod
     def _rotate_features(x: torch.Tensor) -> torch.Tensor:
@@ -179,8 +186,12 @@ class RotaryPositionEmbedding2D(nn.Module):
         # Compute feature dimension for each spatial direction
         feature_dim = tokens.size(-1) // 2
 
-        # Get frequency components
-        max_position = int(positions.max()) + 1
+        # Get frequency components. Reading the largest position syncs with the device and
+        # breaks compiled graphs, so compiled code uses an upper bound from the token count
+        if torch.compiler.is_compiling():
+            max_position = tokens.shape[-2] + 1
+        else:
+            max_position = int(positions.max()) + 1
         cos_comp, sin_comp = self._compute_frequency_components(
             feature_dim, max_position, tokens.device, tokens.dtype
         )
@@ -0,0 +1,175 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# References:
+#   https://github.com/facebookresearch/ToMe
+#   https://github.com/dbolya/tomesd
+
+"""
+Token merging (ToMe) for the per-view local blocks of the backbone.
+
+Patch tokens are split into a destination set (one token per ``sy x sx`` cell of the patch
+grid) and a source set. The ``r`` source tokens most similar to a destination token are
+averaged into it before attention and MLP, and copied back afterwards, so that the sequence
+length outside a block is unchanged and the DPT heads always see the full patch grid.
+Merged tokens keep the RoPE position of their destination token.
+"""
+
+from typing import Optional, Sequence, Tuple, Union
+import torch
+from torch import Tensor
+
+TokenMergeRatio = Union[float, Sequence[Tuple[int, int, float]]]
+
+
+class TokenMerge:
+    """Merge / unmerge operators for one block, built by bipartite_soft_matching_2d."""
+
+    def __init__(
+        self,
+        num_prefix: int,
+        a_idx: Tensor,
+        b_idx: Tensor,
+        unm_idx: Tensor,
+        src_idx: Tensor,
+        dst_idx: Tensor,
+    ):
+        self.num_prefix = num_prefix
+        self.a_idx, self.b_idx = a_idx, b_idx
+        self.unm_idx, self.src_idx, self.dst_idx = unm_idx, src_idx, dst_idx
+
+    def _split(self, x: Tensor) -> Tuple[Tensor, Tensor, Tensor]:
+        prefix, x = x[:, : self.num_prefix], x[:, self.num_prefix :]
+        C = x.shape[-1]
+        src = x.gather(1, self.a_idx.expand(x.shape[0], -1, C))
+        dst = x.gather(1, self.b_idx.expand(x.shape[0], -1, C))
+        return prefix, src, dst
+
+    def merge(self, x: Tensor) -> Tensor:
+        """Average the matched source tokens into their destination tokens."""
+        prefix, src, dst = self._split(x)
+        B, _, C = src.shape
+        unm = src.gather(1, self.unm_idx.expand(B, -1, C))
+        src = src.gather(1, self.src_idx.expand(B, -1, C))
+        dst = dst.scatter_reduce(1, self.dst_idx.expand(B, -1, C), src, reduce="mean")
+        return torch.cat([prefix, unm, dst], dim=1)
+
+    def merge_pos(self, pos: Optional[Tensor]) -> Optional[Tensor]:
+        """Merged tokens keep the position of their destination token."""
+        if pos is None:
+            return None
+        prefix, src, dst = self._split(pos)
+        unm = src.gather(1, self.unm_idx.expand(src.shape[0], -1, src.shape[-1]))
+        return torch.cat([prefix, unm, dst], dim=1)
+
+    def unmerge(self, x: Tensor) -> Tensor:
+        """Copy every merged token back to all the tokens it was merged from."""
+        B, _, C = x.shape
+        num_unm = self.unm_idx.shape[1]
+        prefix = x[:, : self.num_prefix]
+        unm = x[:, self.num_prefix : self.num_prefix + num_unm]
+        dst = x[:, self.num_prefix + num_unm :]
+        src = dst.gather(1, self.dst_idx.expand(B, -1, C))
+
+        num_patches = self.a_idx.shape[1] + self.b_idx.shape[1]
+        out = x.new_empty(B, num_patches, C)
+        out.scatter_(1, self.b_idx.expand(B, -1, C), dst)
+        a_idx = self.a_idx.expand(B, -1, -1)
+        out.scatter_(1, a_idx.gather(1, self.unm_idx).expand(B, -1, C), unm)
+        out.scatter_(1, a_idx.gather(1, self.src_idx).expand(B, -1, C), src)
+        return torch.cat([prefix, out], dim=1)
+
+
+def bipartite_soft_matching_2d(
+    metric: Tensor,
+    h: int,
+    w: int,
+    r: int,
+    num_prefix: int = 1,
+    sx: int = 2,
+    sy: int = 2,
+) -> Optional[TokenMerge]:
+    """
+    Bipartite soft matching with one destination token per ``sy x sx`` grid cell.
+
+    Args:
+        metric: Tokens used for matching, shape (B, num_prefix + h * w, C)
+        h, w: Patch grid size
+        r: Number of tokens to remove by merging
+        num_prefix: Number of leading special tokens (camera / register) that are never merged
+        sx, sy: Stride of the destination grid
+
+    Returns:
+        TokenMerge operators, or None if nothing is merged
+    """
+    if r <= 0:
+        return None
+    B, device = metric.shape[0], metric.device
+    hsy, wsx = h // sy, w // sx
+
+    with torch.no_grad():
+        # Mark the top-left token of every cell as destination (-1), everything else as source
+        idx_buffer_view = torch.zeros(hsy, wsx, sy * sx, device=device, dtype=torch.int64)
+        idx_buffer_view[..., 0] = -1
+        idx_buffer_view = idx_buffer_view.view(hsy, wsx, sy, sx).transpose(1, 2)
+        idx_buffer_view = idx_buffer_view.reshape(hsy * sy, wsx * sx)
+        if (hsy * sy) < h or (wsx * sx) < w:
+            idx_buffer = torch.zeros(h, w, device=device, dtype=torch.int64)
+            idx_buffer[: (hsy * sy), : (wsx * sx)] = idx_buffer_view
+        else:
+            idx_buffer = idx_buffer_view
+        # Stable sort keeps the raster order within the destination and source sets
+        rand_idx = idx_buffer.reshape(1, -1, 1).argsort(dim=1, stable=True)
+
+        num_dst = hsy * wsx
+        a_idx = rand_idx[:, num_dst:]  # src
+        b_idx = rand_idx[:, :num_dst]  # dst
+        r = min(a_idx.shape[1], r)
+
+        metric = metric[:, num_prefix:]
+        metric = metric / metric.norm(dim=-1, keepdim=True)
+        C = metric.shape[-1]
+        a = metric.gather(1, a_idx.expand(B, -1, C))
+        b = metric.gather(1, b_idx.expand(B, -1, C))
+        scores = a @ b.transpose(-1, -2)
+
+        node_max, node_idx = scores.max(dim=-1)
+        edge_idx = node_max.argsort(dim=-1, descending=True)[..., None]
+        unm_idx = edge_idx[:, r:]  # Unmerged src tokens
+        src_idx = edge_idx[:, :r]  # Merged src tokens
+        dst_idx = node_idx[..., None].gather(1, src_idx)
+
+    return TokenMerge(num_prefix, a_idx, b_idx, unm_idx, src_idx, dst_idx)
+
+
+def get_token_merge_ratio(ratio: Optional[TokenMergeRatio], block_idx: int) -> float:
+    """
+    Resolve the merge ratio of a block.
+
+    Args:
+        ratio: A single ratio for all local blocks, or a list of ``(start, end, ratio)``
+            block ranges (end exclusive)
+        block_idx: Index of the block
+
+    Returns:
+        Fraction of patch tokens removed by merging in this block
+    """
+    if not ratio:
+        return 0.0
+    if isinstance(ratio, (int, float)):
+        return float(ratio)
+    for start, end, block_ratio in ratio:
+        if start <= block_idx < end:
+            return float(block_ratio)
+    return 0.0
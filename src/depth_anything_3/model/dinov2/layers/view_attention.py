@@ -0,0 +1,152 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Sparse view-level attention for the global blocks of the backbone.
+
+Global blocks attend over the flattened ``(s n)`` token sequence of all views, which is
+quadratic in the number of views. The modes below restrict each view to a subset of key
+views so that the cost grows linearly with the sequence length:
+
+- ``full``: dense attention over all views (default behaviour).
+- ``window``: every view attends to the views within ``±window`` of its own index.
+- ``keyframe``: every view attends to itself and to a set of keyframes, given either as
+  an explicit list of view indices or as an interval (every ``keyframes``-th view).
+
+In all sparse modes the reference view (``ref_idx``, position 0 by default) is
+always kept as an anchor so that every view shares a common coordinate frame.
+"""
+
+from typing import Callable, Literal, Optional, Sequence, Union
+import torch
+import torch.nn.functional as F
+from torch import Tensor
+
+GlobalAttnMode = Literal["full", "window", "keyframe"]
+
+DEFAULT_WINDOW = 4
+DEFAULT_KEYFRAME_INTERVAL = 8
+
+
+def build_view_attn_mask(
+    num_views: int,
+    mode: GlobalAttnMode = "full",
+    window: int = DEFAULT_WINDOW,
+    keyframes: Optional[Union[int, Sequence[int]]] = None,
+    ref_idx: Optional[Tensor] = None,
+    device: Optional[torch.device] = None,
+) -> Optional[Tensor]:
+    """
+    Build a view-level attention mask for the global blocks.
+
+    Args:
+        num_views: Number of views S
+        mode: Sparse attention mode, one of "full", "window", "keyframe"
+        window: Half window size (in views) for the "window" mode
+        keyframes: Keyframe interval (int) or explicit keyframe indices for the
+            "keyframe" mode
+        ref_idx: Position of the reference view, shape (B,). Defaults to position 0.
+        device: Device of the returned mask
+
+    Returns:
+        Boolean mask of shape (B, S, S) where True means that the query view may attend
+        to the key view, or None if attention is dense.
+    """
+    if mode == "full":
+        return None
+
+    idx = torch.arange(num_views, device=device)
+    if mode == "window":
+        if window < 0:
+            raise ValueError(f"window must be non-negative, got {window}")
+        mask = (idx[:, None] - idx[None, :]).abs() <= window
+    elif mode == "keyframe":
+        if keyframes is None:
+            keyframes = DEFAULT_KEYFRAME_INTERVAL
+        is_keyframe = torch.zeros(num_views, dtype=torch.bool, device=device)
+        if isinstance(keyframes, int):
+            if keyframes <= 0:
+                raise ValueError(f"keyframe interval must be positive, got {keyframes}")
+            is_keyframe[::keyframes] = True
+        else:
+            keyframe_ids = torch.as_tensor(list(keyframes), dtype=torch.long, device=device)
+            if keyframe_ids.numel() > 0 and (
+                keyframe_ids.min() < 0 or keyframe_ids.max() >= num_views
+            ):
+                raise ValueError(
+                    f"keyframe indices must be in [0, {num_views}), got {list(keyframes)}"
+                )
+            is_keyframe[keyframe_ids] = True
+        mask = is_keyframe[None, :].expand(num_views, -1) | torch.eye(
+            num_views, dtype=torch.bool, device=device
+        )
+    else:
+        raise ValueError(f"Invalid global attention mode: {mode}")
+
+    mask = mask[None]
+    # The reference view is always kept as an anchor
+    if ref_idx is None:
+        mask[:, :, 0] = True
+    else:
+        mask = mask.expand(ref_idx.shape[0], -1, -1).clone()
+        mask[torch.arange(ref_idx.shape[0], device=mask.device), :, ref_idx] = True
+
+    if bool(mask.all()):
+        return None
+    return mask
+
+
+def make_sparse_view_attn_fn(
+    view_mask: Tensor, num_views: int
+) -> Callable[[Tensor, Tensor, Tensor], Tensor]:
+    """
+    Create an attention function that evaluates global attention view by view.
+
+    Each query view only gathers the keys and values of its allowed key views, so the
+    attention cost is proportional to the number of allowed (query, key) view pairs
+    instead of S^2. The key view lists are resolved once on the host so that the
+    per-layer loop does not synchronize with the device.
+
+    Args:
+        view_mask: Boolean mask of shape (B, S, S) from build_view_attn_mask
+        num_views: Number of views S
+
+    Returns:
+        Callable taking q, k, v of shape (B, heads, S * N, head_dim) and returning the
+        attention output of the same shape.
+    """
+    device = view_mask.device
+    # Views that differ across the batch still share one gather and are masked per item
+    uniform = bool((view_mask == view_mask[:1]).all())
+    union_mask = view_mask.any(dim=0).cpu()
+    key_views = [union_mask[i].nonzero(as_tuple=True)[0].to(device) for i in range(num_views)]
+    view_masks = [None if uniform else view_mask[:, i, key_views[i]] for i in range(num_views)]
+
+    def attn_fn(q: Tensor, k: Tensor, v: Tensor) -> Tensor:
+        B, num_heads, L, head_dim = q.shape
+        n = L // num_views
+        q = q.reshape(B, num_heads, num_views, n, head_dim)
+        k = k.reshape(B, num_heads, num_views, n, head_dim)
+        v = v.reshape(B, num_heads, num_views, n, head_dim)
+        out = torch.empty_like(q)
+        for i in range(num_views):
+            k_i = k.index_select(2, key_views[i]).flatten(2, 3)
+            v_i = v.index_select(2, key_views[i]).flatten(2, 3)
+            mask_i = view_masks[i]
+            if mask_i is not None:
+                mask_i = mask_i.repeat_interleave(n, dim=-1)[:, None, None]
+            out[:, :, i] = F.scaled_dot_product_attention(q[:, :, i], k_i, v_i, attn_mask=mask_i)
+        return out.view(B, num_heads, L, head_dim)
+
+    return attn_fn
@@ -26,10 +26,15 @@ from .layers import (  # noqa: F401
     RotaryPositionEmbedding2D,
     SwiGLUFFNFused,
 )
+from .deferred_feature import DeferredFeature
+from .layers.chunked_attention import make_chunked_attn_fn, plan_memory_budget
+from .layers.token_merge import bipartite_soft_matching_2d, get_token_merge_ratio
+from .layers.view_attention import build_view_attn_mask, make_sparse_view_attn_fn
+from depth_anything_3.model.utils.padding import group_views_by_size, valid_region_mask
+from depth_anything_3.model.utils.pos_cache import POSITIONAL_CACHE
 from depth_anything_3.model.reference_view_selector import (
     RefViewStrategy,
     select_reference_view,
-    reorder_by_reference,
     restore_original_order,
 )
 from depth_anything_3.utils.constants import THRESH_FOR_REF_SELECTION
@@ -73,6 +78,35 @@ def named_apply(
     return module
 
 
+def _bicubic_resample_matrix(out_size, in_size, offset, device):
+    """
+    (out_size, in_size) matrix of 1D bicubic interpolation, matching F.interpolate with
+    mode="bicubic", align_corners=False and scale factor (out_size + offset) / in_size.
+    """
+    A = -0.75  # Cubic convolution coefficient of PyTorch
+
+    def near(t):
+        return ((A + 2) * t - (A + 3)) * t * t + 1
+
+    def far(t):
+        return ((A * t - 5 * A) * t + 8 * A) * t - 4 * A
+
+    dst = torch.arange(out_size, dtype=torch.float32, device=device)
+    scale = in_size / (torch.full((), out_size, dtype=torch.float32, device=device) + offset)
+    src = (dst + 0.5) * scale - 0.5
+    start = src.floor()
+    t = src - start
+    weights = torch.stack([far(t + 1), near(t), near(1 - t), far(2 - t)], dim=-1)
+    taps = (start.long()[:, None] + torch.arange(-1, 3, device=device)).clamp(0, in_size - 1)
+    return (nn.functional.one_hot(taps, in_size).float() * weights[..., None]).sum(dim=1)
+
+
+def _identity_resample_matrix(out_size, in_size, device):
+    """(out_size, in_size) matrix equal to the identity when both sizes match."""
+    index = torch.arange(out_size, device=device).clamp(max=in_size - 1)
+    return nn.functional.one_hot(index, in_size).float()
+
+
 class BlockChunk(nn.ModuleList):
     def forward(self, x):
         for b in self:
@@ -149,6 +183,7 @@ class DinoVisionTransformer(nn.Module):
         self.num_tokens = 1
         self.n_blocks = depth
         self.num_heads = num_heads
+        self.mlp_ratio = mlp_ratio
         self.patch_size = patch_size
         self.num_register_tokens = num_register_tokens
         self.interpolate_antialias = interpolate_antialias
@@ -162,6 +197,8 @@ class DinoVisionTransformer(nn.Module):
         if self.alt_start != -1:
             self.camera_token = nn.Parameter(torch.randn(1, 2, embed_dim))
         self.pos_embed = nn.Parameter(torch.zeros(1, num_patches + self.num_tokens, embed_dim))
+        # Unique per instance; held by the cache keys so it is never reused while cached
+        self._pos_cache_token = object()
         assert num_register_tokens >= 0
         self.register_tokens = (
             nn.Parameter(torch.zeros(1, num_register_tokens, embed_dim))
@@ -221,8 +258,28 @@ class DinoVisionTransformer(nn.Module):
         previous_dtype = x.dtype
         npatch = x.shape[1] - 1
         N = self.pos_embed.shape[1] - 1
+        if torch.compiler.is_exporting() and not self.interpolate_antialias:
+            return self._interpolate_pos_encoding_symbolic(x, w, h)
         if npatch == N and w == h:
             return self.pos_embed
+        if torch.is_grad_enabled() and self.pos_embed.requires_grad:
+            return self._interpolate_pos_encoding(x, w, h)
+        # The weight version invalidates cached values when pos_embed is reloaded
+        return POSITIONAL_CACHE.get(
+            "vit_pos_embed",
+            h,
+            w,
+            self.pos_embed.device,
+            previous_dtype,
+            lambda: self._interpolate_pos_encoding(x, w, h),
+            self._pos_cache_token,
+            self.pos_embed.dtype,
+            self.pos_embed._version,
+        )
+
+    def _interpolate_pos_encoding(self, x, w, h):
+        previous_dtype = x.dtype
+        N = self.pos_embed.shape[1] - 1
         pos_embed = self.pos_embed.float()
         class_pos_embed = pos_embed[:, 0]
         patch_pos_embed = pos_embed[:, 1:]
@@ -253,12 +310,38 @@ class DinoVisionTransformer(nn.Module):
         patch_pos_embed = patch_pos_embed.permute(0, 2, 3, 1).view(1, -1, dim)
         return torch.cat((class_pos_embed.unsqueeze(0), patch_pos_embed), dim=1).to(previous_dtype)
 
+    def _interpolate_pos_encoding_symbolic(self, x, w, h):
+        """
+        Same as interpolate_pos_encoding for symbolic sizes during export. The bicubic
+        interpolation is written as two resampling matrices, so that the scale factors and
+        the unchanged-size shortcut do not specialize the graph to the example resolution.
+        """
+        N = self.pos_embed.shape[1] - 1
+        M = int(math.sqrt(N))
+        pos_embed = self.pos_embed.float()
+        patch_pos_embed = pos_embed[0, 1:].reshape(M, M, -1)
+        w0, h0 = w // self.patch_size, h // self.patch_size
+        rows = _bicubic_resample_matrix(w0, M, self.interpolate_offset, x.device)
+        cols = _bicubic_resample_matrix(h0, M, self.interpolate_offset, x.device)
+        # The pretrained grid is used as is for the native square resolution
+        keep = (torch.full((), w0, device=x.device) == M) & (
+            torch.full((), h0, device=x.device) == M
+        )
+        keep = keep.float()
+        rows = keep * _identity_resample_matrix(w0, M, x.device) + (1 - keep) * rows
+        cols = keep * _identity_resample_matrix(h0, M, x.device) + (1 - keep) * cols
+        dim = patch_pos_embed.shape[-1]
+        patch_pos_embed = (rows @ patch_pos_embed.reshape(M, -1)).reshape(-1, M, dim)
+        patch_pos_embed = (cols @ patch_pos_embed).reshape(1, -1, dim)
+        pos_embed = torch.cat((pos_embed[:, :1], patch_pos_embed), dim=1)
+        return pos_embed.to(x.dtype)
+
     def prepare_cls_token(self, B, S):
         cls_token = self.cls_token.expand(B, S, -1)
         cls_token = cls_token.reshape(B * S, -1, self.embed_dim)
         return cls_token
 
-    def prepare_tokens_with_masks(self, x, masks=None, cls_token=None, **kwargs):
+    def prepare_tokens_with_masks(self, x, masks=None, cls_token=None, view_sizes=None, **kwargs):
         B, S, nc, w, h = x.shape
         x = rearrange(x, "b s c h w -> (b s) c h w")
         x = self.patch_embed(x)
@@ -266,7 +349,10 @@ class DinoVisionTransformer(nn.Module):
             x = torch.where(masks.unsqueeze(-1), self.mask_token.to(x.dtype).unsqueeze(0), x)
         cls_token = self.prepare_cls_token(B, S)
         x = torch.cat((cls_token, x), dim=1)
-        x = x + self.interpolate_pos_encoding(x, w, h)
+        if view_sizes is None:
+            x = x + self.interpolate_pos_encoding(x, w, h)
+        else:
+            x = x + self.padded_pos_encoding(x, w, h, view_sizes)
         if self.register_tokens is not None:
             x = torch.cat(
                 (
@@ -279,6 +365,30 @@ class DinoVisionTransformer(nn.Module):
         x = rearrange(x, "(b s) n c -> b s n c", b=B, s=S)
         return x
 
+    def padded_pos_encoding(self, x, w, h, view_sizes):
+        """
+        Position embeddings of padded views: each view gets the embedding interpolated to
+        its own patch grid, placed at the top-left of the canvas grid.
+        """
+        Hc, Wc = w // self.patch_size, h // self.patch_size
+        pos_embed = x.new_zeros(view_sizes[..., 0].numel(), 1 + Hc * Wc, x.shape[-1])
+        for (vh, vw), idx in group_views_by_size(view_sizes):
+            gh, gw = vh // self.patch_size, vw // self.patch_size
+            view_embed = self.interpolate_pos_encoding(x[:1, : 1 + gh * gw], vh, vw)
+            canvas_embed = x.new_zeros(1 + Hc * Wc, x.shape[-1])
+            canvas_embed[0] = view_embed[0, 0]
+            canvas_embed[1:].view(Hc, Wc, -1)[:gh, :gw] = view_embed[0, 1:].view(gh, gw, -1)
+            pos_embed[idx] = canvas_embed
+        return pos_embed
+
+    def _prepare_key_padding_mask(self, view_sizes, H, W):
+        """Key-padding mask (B, S, N) of padded views, True for prefix and valid patch tokens."""
+        if view_sizes is None:
+            return None
+        patch_mask = valid_region_mask(view_sizes, H, W, self.patch_size).flatten(2)
+        prefix = patch_mask.new_ones(*patch_mask.shape[:2], 1 + self.num_register_tokens)
+        return torch.cat([prefix, patch_mask], dim=-1)
+
     def _prepare_rope(self, B, S, H, W, device):
         pos = None
         pos_nodiff = None
@@ -299,10 +409,20 @@ class DinoVisionTransformer(nn.Module):
 
     def _get_intermediate_layers_not_chunked(self, x, n=1, export_feat_layers=[], **kwargs):
         B, S, _, H, W = x.shape
-        x = self.prepare_tokens_with_masks(x)
+        # Views padded to a common size attend only to the tokens of their valid regions
+        view_sizes = kwargs.get("view_sizes", None)
+        key_padding_mask = self._prepare_key_padding_mask(view_sizes, H, W)
+        x = self.prepare_tokens_with_masks(x, view_sizes=view_sizes)
         output, total_block_len, aux_output = [], len(self.blocks), []
         blocks_to_take = range(total_block_len - n, total_block_len) if isinstance(n, int) else n
         pos, pos_nodiff = self._prepare_rope(B, S, H, W, x.device)
+        b_idx, global_attn_fn = None, None
+        # Cached global keys/values of previously processed views (streaming inference)
+        stream_state = kwargs.get("stream_state", None)
+        memory_plan = self._prepare_memory_plan(S, x.shape[2], **kwargs)
+        # Low-memory mode keeps references to block outputs instead of concatenated copies
+        low_memory = kwargs.get("low_memory", False)
+        offload_aux_feats = kwargs.get("offload_aux_feats", False)
 
         for i, blk in enumerate(self.blocks):
             if i < self.rope_start or self.rope is None:
@@ -311,49 +431,177 @@ class DinoVisionTransformer(nn.Module):
                 g_pos = pos_nodiff
                 l_pos = pos
 
-            if self.alt_start != -1 and (i == self.alt_start - 1) and x.shape[1] >= THRESH_FOR_REF_SELECTION:
-                # Select reference view using configured strategy
-                strategy = kwargs.get("ref_view_strategy", "saddle_balanced")
-                logger.info(f"Selecting reference view using strategy: {strategy}")
-                b_idx = select_reference_view(x, strategy=strategy)
-                # Reorder views to place reference view first
-                x = reorder_by_reference(x, b_idx)
-                local_x = reorder_by_reference(local_x, b_idx)
+            if (
+                self.alt_start != -1
+                and (i == self.alt_start - 1)
+                and (torch.compiler.is_exporting() or x.shape[1] >= THRESH_FOR_REF_SELECTION)
+                and stream_state is None
+            ):
+                b_idx = kwargs.get("ref_view_idx", None)
+                if b_idx is None:
+                    # Select reference view using configured strategy
+                    strategy = kwargs.get("ref_view_strategy", "saddle_balanced")
+                    logger.info(f"Selecting reference view using strategy: {strategy}")
+                    b_idx = select_reference_view(x, strategy=strategy)
+                if torch.compiler.is_exporting():
+                    # Exported graphs have a dynamic view count, keep the first view as the
+                    # reference below the threshold without branching on it
+                    use_ref = torch.full_like(b_idx, S) >= THRESH_FOR_REF_SELECTION
+                    b_idx = torch.where(use_ref, b_idx, torch.zeros_like(b_idx))
+                # Views keep their input order: global attention is equivariant to view
+                # permutations, so only the reference camera token and the sparse-attention
+                # anchor follow b_idx instead of moving the reference view first
 
             if self.alt_start != -1 and i == self.alt_start:
                 if kwargs.get("cam_token", None) is not None:
                     logger.info("Using camera conditions provided by the user")
                     cam_token = kwargs.get("cam_token")
+                    if b_idx is not None:
+                        # User camera tokens are assigned in reference-first view order
+                        cam_token = restore_original_order(cam_token, b_idx)
+                elif stream_state is not None and stream_state.num_views > 0:
+                    # The reference view is the first view of the stream
+                    cam_token = self.camera_token[:, 1:].expand(B, S, -1)
                 else:
-                    ref_token = self.camera_token[:, :1].expand(B, -1, -1)
-                    src_token = self.camera_token[:, 1:].expand(B, S - 1, -1)
-                    cam_token = torch.cat([ref_token, src_token], dim=1)
+                    # Reference token at the reference view, source token at the others;
+                    # a gather also avoids expanding to S - 1 views, which may be empty
+                    ref_pos = b_idx[:, None] if b_idx is not None else 0
+                    token_idx = (torch.arange(S, device=x.device) != ref_pos).long()
+                    cam_token = self.camera_token[0, token_idx].expand(B, -1, -1)
                 x[:, :, 0] = cam_token
+                global_attn_fn = self._prepare_global_attn_fn(
+                    B, S, x.device, b_idx=b_idx, **kwargs
+                )
+                if global_attn_fn is None and memory_plan is not None:
+                    global_attn_fn = make_chunked_attn_fn(memory_plan)
 
             if self.alt_start != -1 and i >= self.alt_start and i % 2 == 1:
                 x = self.process_attention(
-                    x, blk, "global", pos=g_pos, attn_mask=kwargs.get("attn_mask", None)
+                    x,
+                    blk,
+                    "global",
+                    pos=g_pos,
+                    attn_mask=kwargs.get("attn_mask", None),
+                    key_padding_mask=key_padding_mask,
+                    attn_fn=(
+                        stream_state.attn_fn(i) if stream_state is not None else global_attn_fn
+                    ),
+                    ffn_chunk_size=memory_plan.token_chunk_size if memory_plan else None,
                 )
             else:
-                x = self.process_attention(x, blk, "local", pos=l_pos)
+                x = self.process_attention(
+                    x,
+                    blk,
+                    "local",
+                    pos=l_pos,
+                    token_merge_ratio=get_token_merge_ratio(
+                        kwargs.get("token_merge_ratio", None), i
+                    ),
+                    patch_hw=(H // self.patch_size, W // self.patch_size),
+                    key_padding_mask=key_padding_mask,
+                    view_chunk_size=memory_plan.view_chunk_size if memory_plan else None,
+                )
                 local_x = x
 
-            if i in blocks_to_take:
+            if i in blocks_to_take and low_memory:
+                output.append(self._defer_layer_output(local_x, x))
+            elif i in blocks_to_take:
                 out_x = torch.cat([local_x, x], dim=-1) if self.cat_token else x
-                # Restore original view order if reordering was applied
-                if x.shape[1] >= THRESH_FOR_REF_SELECTION and self.alt_start != -1 and 'b_idx' in locals():
-                    out_x = restore_original_order(out_x, b_idx)
                 output.append((out_x[:, :, 0], out_x))
             if i in export_feat_layers:
-                aux_output.append(x)
-        return output, aux_output
+                aux_output.append(self._prepare_aux_output(x, offload_aux_feats))
+        if stream_state is not None:
+            stream_state.commit(S, x.shape[2])
+        return output, aux_output, b_idx
+
+    def _prepare_global_attn_fn(self, B, S, device, b_idx=None, **kwargs):
+        """Build the sparse attention function for global blocks, None for dense attention."""
+        mode = kwargs.get("global_attn_mode", "full")
+        if mode == "full":
+            return None
+        attn_kwargs = kwargs.get("global_attn_kwargs", None) or {}
+        # Views keep their input positions, only the reference position varies per batch
+        view_mask = build_view_attn_mask(S, mode=mode, ref_idx=b_idx, device=device, **attn_kwargs)
+        if view_mask is None:
+            return None
+        logger.info(f"Using sparse global attention: {mode} {attn_kwargs}")
+        return make_sparse_view_attn_fn(view_mask, S)
+
+    def _defer_layer_output(self, local_x, x):
+        """Camera token and DeferredFeature of a layer for the low-memory mode."""
+        # Camera tokens are small and may be overwritten in place later, so copy them now
+        cam_token = x[:, :, 0].clone()
+        if self.cat_token:
+            cam_token = torch.cat([local_x[:, :, 0], cam_token], dim=-1)
+        feat = DeferredFeature(
+            local_x if self.cat_token else None,
+            x,
+            self.norm,
+            num_prefix=1 + self.num_register_tokens,
+        )
+        return cam_token, feat
+
+    def _prepare_aux_output(self, x, offload=False):
+        """Normalize an exported feature, optionally on CPU in fp16."""
+        aux = self.norm(x[:, :, 1 + self.num_register_tokens :])
+        if offload:
+            aux = aux.to("cpu", torch.float16)
+        return aux
+
+    def _prepare_memory_plan(self, S, N, **kwargs):
+        """Derive chunk sizes from the activation memory budget, None if unbounded."""
+        memory_budget = kwargs.get("memory_budget", None)
+        if memory_budget is None:
+            return None
+        memory_plan = plan_memory_budget(
+            memory_budget, S, N, self.embed_dim, self.num_heads, self.mlp_ratio
+        )
+        logger.info(f"Using memory budget of {memory_budget} GB: {memory_plan}")
+        return memory_plan
 
-    def process_attention(self, x, block, attn_type="global", pos=None, attn_mask=None):
+    def process_attention(
+        self,
+        x,
+        block,
+        attn_type="global",
+        pos=None,
+        attn_mask=None,
+        attn_fn=None,
+        token_merge_ratio=0.0,
+        patch_hw=None,
+        key_padding_mask=None,
+        view_chunk_size=None,
+        ffn_chunk_size=None,
+    ):
         b, s, n = x.shape[:3]
+        if attn_type == "local" and view_chunk_size is not None and s > view_chunk_size:
+            # Views are independent in local blocks, so they can be processed chunk by chunk
+            out = torch.empty_like(x)
+            for s0 in range(0, s, view_chunk_size):
+                s1 = min(s0 + view_chunk_size, s)
+                out[:, s0:s1] = self.process_attention(
+                    x[:, s0:s1],
+                    block,
+                    "local",
+                    pos=pos[:, s0:s1] if pos is not None else None,
+                    token_merge_ratio=token_merge_ratio,
+                    patch_hw=patch_hw,
+                    key_padding_mask=(
+                        key_padding_mask[:, s0:s1] if key_padding_mask is not None else None
+                    ),
+                )
+            return out
+
+        token_merge = None
         if attn_type == "local":
             x = rearrange(x, "b s n c -> (b s) n c")
             if pos is not None:
                 pos = rearrange(pos, "b s n c -> (b s) n c")
+            if token_merge_ratio > 0:
+                num_prefix = 1 + self.num_register_tokens
+                token_merge = bipartite_soft_matching_2d(
+                    x, *patch_hw, int((n - num_prefix) * token_merge_ratio), num_prefix=num_prefix
+                )
         elif attn_type == "global":
             x = rearrange(x, "b s n c -> b (s n) c")
             if pos is not None:
@@ -361,7 +609,25 @@ class DinoVisionTransformer(nn.Module):
         else:
             raise ValueError(f"Invalid attention type: {attn_type}")
 
-        x = block(x, pos=pos, attn_mask=attn_mask)
+        if key_padding_mask is not None:
+            # (B * S, N) keys per view in local blocks, (B, S * N) keys in global blocks
+            key_padding_mask = (
+                key_padding_mask.flatten(0, 1)
+                if attn_type == "local"
+                else key_padding_mask.flatten(1, 2)
+            )
+            attn_mask = (
+                key_padding_mask if attn_mask is None else attn_mask & key_padding_mask[:, None]
+            )
+
+        x = block(
+            x,
+            pos=pos,
+            attn_mask=attn_mask,
+            attn_fn=attn_fn,
+            token_merge=token_merge,
+            ffn_chunk_size=ffn_chunk_size,
+        )
 
         if attn_type == "local":
             x = rearrange(x, "(b s) n c -> b s n c", b=b, s=s)
@@ -376,10 +642,14 @@ class DinoVisionTransformer(nn.Module):
         export_feat_layers: List[int] = [],
         **kwargs,
     ) -> Tuple[Union[torch.Tensor, Tuple[torch.Tensor]]]:
-        outputs, aux_outputs = self._get_intermediate_layers_not_chunked(
+        outputs, aux_outputs, ref_view_idx = self._get_intermediate_layers_not_chunked(
             x, n, export_feat_layers=export_feat_layers, **kwargs
         )
         camera_tokens = [out[0] for out in outputs]
+        if kwargs.get("low_memory", False):
+            # Features are normalized and cropped when the heads slice them
+            feats = tuple((out[1], cam) for out, cam in zip(outputs, camera_tokens))
+            return feats, aux_outputs, ref_view_idx
         if outputs[0][1].shape[-1] == self.embed_dim:
             outputs = [self.norm(out[1]) for out in outputs]
         elif outputs[0][1].shape[-1] == (self.embed_dim * 2):
@@ -392,10 +662,8 @@ class DinoVisionTransformer(nn.Module):
             ]
         else:
             raise ValueError(f"Invalid output shape: {outputs[0][1].shape}")
-        aux_outputs = [self.norm(out) for out in aux_outputs]
         outputs = [out[..., 1 + self.num_register_tokens :, :] for out in outputs]
-        aux_outputs = [out[..., 1 + self.num_register_tokens :, :] for out in aux_outputs]
-        return tuple(zip(outputs, camera_tokens)), aux_outputs
+        return tuple(zip(outputs, camera_tokens)), aux_outputs, ref_view_idx
 
 
 def vit_small(patch_size=16, num_register_tokens=0, depth=12, **kwargs):
@@ -14,7 +14,7 @@
 # limitations under the License.
 
 from typing import Dict as TyDict
-from typing import List, Sequence, Tuple
+from typing import List, Optional, Sequence, Set, Tuple
 import torch
 import torch.nn as nn
 from addict import Dict
@@ -22,9 +22,9 @@ from einops import rearrange
 
 from depth_anything_3.model.utils.head_utils import (
     Permute,
-    create_uv_grid,
     custom_interpolate,
-    position_grid_to_embed,
+    flatten_view_feats,
+    uv_pos_embed,
 )
 
 
@@ -163,6 +163,8 @@ class DPT(nn.Module):
         W: int,
         patch_start_idx: int,
         chunk_size: int = 8,
+        offload_to_cpu: bool = False,
+        outputs: Optional[Set[str]] = None,
         **kwargs,
     ) -> Dict:
         """
@@ -170,33 +172,44 @@ class DPT(nn.Module):
             feats: List of 4 entries, each entry is a tensor like [B, S, T, C] (or the 0th element of tuple/list is that tensor).
             H, W:  Original image dimensions
             patch_start_idx: Starting index of patch tokens in sequence (for cropping non-patch tokens)
-            chunk_size:      Chunk size along time dimension S
+            chunk_size:      Chunk size along the flattened B * S views
+            offload_to_cpu:  Move the outputs of each finished chunk to CPU memory
+            outputs:         Output keys to compute (None: all); branches whose outputs are
+                             not requested are skipped
 
         Returns:
             Dict[str, Tensor]
         """
         B, S, N, C = feats[0][0].shape
-        feats = [feat[0].reshape(B * S, N, C) for feat in feats]
+        feats = [flatten_view_feats(feat[0]) for feat in feats]
+        num_views = B * S
 
         # update image info, used by the GS-DPT head
         extra_kwargs = {}
+        if outputs is not None:
+            extra_kwargs["outputs"] = outputs
         if "images" in kwargs:
             extra_kwargs.update({"images": rearrange(kwargs["images"], "B S ... -> (B S) ...")})
 
-        if chunk_size is None or chunk_size >= S:
+        if chunk_size is None or chunk_size >= num_views:
+            feats = [f[:num_views] for f in feats]  # Slicing materializes deferred features
             out_dict = self._forward_impl(feats, H, W, patch_start_idx, **extra_kwargs)
-            out_dict = {k: v.view(B, S, *v.shape[1:]) for k, v in out_dict.items()}
+            out_dict = {
+                k: (v.cpu() if offload_to_cpu else v).view(B, S, *v.shape[1:])
+                for k, v in out_dict.items()
+            }
             return Dict(out_dict)
 
         out_dicts: List[TyDict[str, torch.Tensor]] = []
-        for s0 in range(0, S, chunk_size):
-            s1 = min(s0 + chunk_size, S)
-            kw = {}
+        for s0 in range(0, num_views, chunk_size):
+            s1 = min(s0 + chunk_size, num_views)
+            kw = {"outputs": outputs} if outputs is not None else {}
             if "images" in extra_kwargs:
                 kw.update({"images": extra_kwargs["images"][s0:s1]})
-            out_dicts.append(
-                self._forward_impl([f[s0:s1] for f in feats], H, W, patch_start_idx, **kw)
-            )
+            out = self._forward_impl([f[s0:s1] for f in feats], H, W, patch_start_idx, **kw)
+            if offload_to_cpu:
+                out = {k: v.cpu() for k, v in out.items()}
+            out_dicts.append(out)
         out_dict = {k: torch.cat([od[k] for od in out_dicts], dim=0) for k in out_dicts[0].keys()}
         out_dict = {k: v.view(B, S, *v.shape[1:]) for k, v in out_dict.items()}
         return Dict(out_dict)
@@ -210,6 +223,7 @@ class DPT(nn.Module):
         H: int,
         W: int,
         patch_start_idx: int,
+        outputs: Optional[Set[str]] = None,
     ) -> TyDict[str, torch.Tensor]:
         B, _, C = feats[0].shape
         ph, pw = H // self.patch_size, W // self.patch_size
@@ -230,8 +244,8 @@ class DPT(nn.Module):
         fused = self._fuse(resized_feats)
 
         # 3) Upsample to target resolution, optionally add position encoding again
-        h_out = int(ph * self.patch_size / self.down_ratio)
-        w_out = int(pw * self.patch_size / self.down_ratio)
+        h_out = ph * self.patch_size // self.down_ratio
+        w_out = pw * self.patch_size // self.down_ratio
 
         fused = self.scratch.output_conv1(fused)
         fused = custom_interpolate(fused, (h_out, w_out), mode="bilinear", align_corners=True)
@@ -242,6 +256,22 @@ class DPT(nn.Module):
         feat = fused
 
         # 5) Main head: logits -> activation
+        outs: TyDict[str, torch.Tensor] = {}
+        if outputs is None or self.head_main in outputs:
+            outs.update(self._main_head(feat))
+
+        # 6) Sky head (fixed 1 channel)
+        if self.use_sky_head and (outputs is None or self.sky_name in outputs):
+            sky_logits = self.scratch.sky_output_conv2(feat)
+            outs[self.sky_name] = self._apply_sky_activation(sky_logits).squeeze(1)
+
+        return outs
+
+    # -------------------------------------------------------------------------
+    # Subroutines
+    # -------------------------------------------------------------------------
+    def _main_head(self, feat: torch.Tensor) -> TyDict[str, torch.Tensor]:
+        """Main head on the upsampled neck features: prediction and optional confidence."""
         main_logits = self.scratch.output_conv2(feat)
         outs: TyDict[str, torch.Tensor] = {}
         if self.has_conf:
@@ -254,17 +284,8 @@ class DPT(nn.Module):
             outs[self.head_main] = self._apply_activation_single(
                 main_logits, self.activation
             ).squeeze(1)
-
-        # 6) Sky head (fixed 1 channel)
-        if self.use_sky_head:
-            sky_logits = self.scratch.sky_output_conv2(feat)
-            outs[self.sky_name] = self._apply_sky_activation(sky_logits).squeeze(1)
-
         return outs
 
-    # -------------------------------------------------------------------------
-    # Subroutines
-    # -------------------------------------------------------------------------
     def _fuse(self, feats: List[torch.Tensor]) -> torch.Tensor:
         """
         4-layer top-down fusion, returns finest scale features (after fusion, before neck1).
@@ -330,10 +351,8 @@ class DPT(nn.Module):
     def _add_pos_embed(self, x: torch.Tensor, W: int, H: int, ratio: float = 0.1) -> torch.Tensor:
         """Simple UV position encoding directly added to feature map."""
         pw, ph = x.shape[-1], x.shape[-2]
-        pe = create_uv_grid(pw, ph, aspect_ratio=W / H, dtype=x.dtype, device=x.device)
-        pe = position_grid_to_embed(pe, x.shape[1]) * ratio
-        pe = pe.permute(2, 0, 1)[None].expand(x.shape[0], -1, -1, -1)
-        return x + pe
+        pe = uv_pos_embed(pw, ph, x.shape[1], W / H, ratio, dtype=x.dtype, device=x.device)
+        return x + pe[None]
 
 
 # -----------------------------------------------------------------------------
@@ -13,7 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import List, Sequence, Tuple
+from typing import List, Optional, Sequence, Set, Tuple
 import torch
 import torch.nn as nn
 from addict import Dict
@@ -21,9 +21,9 @@ from addict import Dict
 from depth_anything_3.model.dpt import _make_fusion_block, _make_scratch
 from depth_anything_3.model.utils.head_utils import (
     Permute,
-    create_uv_grid,
     custom_interpolate,
-    position_grid_to_embed,
+    flatten_view_feats,
+    uv_pos_embed,
 )
 
 
@@ -160,13 +160,18 @@ class DualDPT(nn.Module):
         W: int,
         patch_start_idx: int,
         chunk_size: int = 8,
+        offload_to_cpu: bool = False,
+        outputs: Optional[Set[str]] = None,
     ) -> Dict[str, torch.Tensor]:
         """
         Args:
             aggregated_tokens_list: List of 4 tensors [B, S, T, C] from transformer.
             images:                [B, S, 3, H, W], in [0, 1].
             patch_start_idx:       Patch-token start in the token sequence (to drop non-patch tokens).
-            frames_chunk_size:     Optional chunking along S for memory.
+            frames_chunk_size:     Optional chunking along the flattened B * S views for memory.
+            offload_to_cpu:        Move the outputs of each finished chunk to CPU memory.
+            outputs:               Output keys to compute (None: all); the main or auxiliary
+                                   branch is skipped when none of its outputs is requested.
 
         Returns:
             Dict[str, Tensor] with keys based on `head_names`, e.g.:
@@ -179,20 +184,28 @@ class DualDPT(nn.Module):
               aux_cf:  [B, S, 1,       H/down_ratio, W/down_ratio]
         """
         B, S, N, C = feats[0][0].shape
-        feats = [feat[0].reshape(B * S, N, C) for feat in feats]
-        if chunk_size is None or chunk_size >= S:
-            out_dict = self._forward_impl(feats, H, W, patch_start_idx)
-            out_dict = {k: v.reshape(B, S, *v.shape[1:]) for k, v in out_dict.items()}
+        feats = [flatten_view_feats(feat[0]) for feat in feats]
+        num_views = B * S
+        if chunk_size is None or chunk_size >= num_views:
+            feats = [f[:num_views] for f in feats]  # Slicing materializes deferred features
+            out_dict = self._forward_impl(feats, H, W, patch_start_idx, outputs)
+            out_dict = {
+                k: (v.cpu() if offload_to_cpu else v).reshape(B, S, *v.shape[1:])
+                for k, v in out_dict.items()
+            }
             return Dict(out_dict)
         out_dicts = []
-        for s0 in range(0, S, chunk_size):
-            s1 = min(s0 + chunk_size, S)
+        for s0 in range(0, num_views, chunk_size):
+            s1 = min(s0 + chunk_size, num_views)
             out_dict = self._forward_impl(
                 [feat[s0:s1] for feat in feats],
                 H,
                 W,
                 patch_start_idx,
+                outputs,
             )
+            if offload_to_cpu:
+                out_dict = {k: v.cpu() for k, v in out_dict.items()}
             out_dicts.append(out_dict)
         out_dict = {
             k: torch.cat([out_dict[k] for out_dict in out_dicts], dim=0)
@@ -211,8 +224,11 @@ class DualDPT(nn.Module):
         H: int,
         W: int,
         patch_start_idx: int,
+        outputs: Optional[Set[str]] = None,
     ) -> Dict[str, torch.Tensor]:
         B, _, C = feats[0].shape
+        with_main = outputs is None or self.head_main in outputs
+        with_aux = outputs is None or self.head_aux in outputs
         ph, pw = H // self.patch_size, W // self.patch_size
         resized_feats = []
         for stage_idx, take_idx in enumerate(self.intermediate_layer_idx):
@@ -227,52 +243,57 @@ class DualDPT(nn.Module):
             resized_feats.append(x)
 
         # 2) Fuse pyramid (main & aux are completely independent)
-        fused_main, fused_aux_pyr = self._fuse(resized_feats)
+        fused_main, fused_aux_pyr = self._fuse(resized_feats, with_main, with_aux)
 
         # 3) Upsample to target resolution and (optional) add pos-embed again
-        h_out = int(ph * self.patch_size / self.down_ratio)
-        w_out = int(pw * self.patch_size / self.down_ratio)
+        h_out = ph * self.patch_size // self.down_ratio
+        w_out = pw * self.patch_size // self.down_ratio
 
-        fused_main = custom_interpolate(
-            fused_main, (h_out, w_out), mode="bilinear", align_corners=True
-        )
-        if self.pos_embed:
-            fused_main = self._add_pos_embed(fused_main, W, H)
-
-        # Primary head: conv1 -> conv2 -> activate
-        # fused_main = self.scratch.output_conv1(fused_main)
-        main_logits = self.scratch.output_conv2(fused_main)
-        fmap = main_logits.permute(0, 2, 3, 1)
-        main_pred = self._apply_activation_single(fmap[..., :-1], self.activation)
-        main_conf = self._apply_activation_single(fmap[..., -1], self.conf_activation)
-
-        # Auxiliary head (multi-level inside) -> only last level returned (after activation)
-        last_aux = fused_aux_pyr[-1]
-        if self.pos_embed:
-            last_aux = self._add_pos_embed(last_aux, W, H)
-        # neck (per-level pre-conv) then final projection (only for last level)
-        # last_aux = self.scratch.output_conv1_aux[-1](last_aux)
-        last_aux_logits = self.scratch.output_conv2_aux[-1](last_aux)
-        fmap_last = last_aux_logits.permute(0, 2, 3, 1)
-        aux_pred = self._apply_activation_single(fmap_last[..., :-1], "linear")
-        aux_conf = self._apply_activation_single(fmap_last[..., -1], self.conf_activation)
-        return {
-            self.head_main: main_pred.squeeze(-1),
-            f"{self.head_main}_conf": main_conf,
-            self.head_aux: aux_pred,
-            f"{self.head_aux}_conf": aux_conf,
-        }
+        out_dict = {}
+        if with_main:
+            fused_main = custom_interpolate(
+                fused_main, (h_out, w_out), mode="bilinear", align_corners=True
+            )
+            if self.pos_embed:
+                fused_main = self._add_pos_embed(fused_main, W, H)
+
+            # Primary head: conv1 -> conv2 -> activate
+            # fused_main = self.scratch.output_conv1(fused_main)
+            main_logits = self.scratch.output_conv2(fused_main)
+            fmap = main_logits.permute(0, 2, 3, 1)
+            main_pred = self._apply_activation_single(fmap[..., :-1], self.activation)
+            main_conf = self._apply_activation_single(fmap[..., -1], self.conf_activation)
+            out_dict[self.head_main] = main_pred.squeeze(-1)
+            out_dict[f"{self.head_main}_conf"] = main_conf
+
+        if with_aux:
+            # Auxiliary head (multi-level inside) -> only last level returned (after activation)
+            last_aux = fused_aux_pyr[-1]
+            if self.pos_embed:
+                last_aux = self._add_pos_embed(last_aux, W, H)
+            # neck (per-level pre-conv) then final projection (only for last level)
+            # last_aux = self.scratch.output_conv1_aux[-1](last_aux)
+            last_aux_logits = self.scratch.output_conv2_aux[-1](last_aux)
+            fmap_last = last_aux_logits.permute(0, 2, 3, 1)
+            aux_pred = self._apply_activation_single(fmap_last[..., :-1], "linear")
+            aux_conf = self._apply_activation_single(fmap_last[..., -1], self.conf_activation)
+            out_dict[self.head_aux] = aux_pred
+            out_dict[f"{self.head_aux}_conf"] = aux_conf
+        return out_dict
 
     # -------------------------------------------------------------------------
     # Subroutines
     # -------------------------------------------------------------------------
 
-    def _fuse(self, feats: List[torch.Tensor]) -> Tuple[torch.Tensor, List[torch.Tensor]]:
+    def _fuse(
+        self, feats: List[torch.Tensor], with_main: bool = True, with_aux: bool = True
+    ) -> Tuple[Optional[torch.Tensor], List[torch.Tensor]]:
         """
         Feature pyramid fusion.
         Returns:
-            fused_main: Tensor at finest scale (after refinenet1)
-            aux_pyr:    List of aux tensors at each level (pre out_conv1_aux)
+            fused_main: Tensor at finest scale (after refinenet1), None without the main chain
+            aux_pyr:    List of aux tensors at each level (pre out_conv1_aux), empty without
+                        the aux chain
         """
         l1, l2, l3, l4 = feats
 
@@ -281,31 +302,38 @@ class DualDPT(nn.Module):
         l3_rn = self.scratch.layer3_rn(l3)
         l4_rn = self.scratch.layer4_rn(l4)
 
+        out = None
+        if with_main:
+            # 4 -> 3 -> 2 -> 1
+            out = self.scratch.refinenet4(l4_rn, size=l3_rn.shape[2:])
+            out = self.scratch.refinenet3(out, l3_rn, size=l2_rn.shape[2:])
+            out = self.scratch.refinenet2(out, l2_rn, size=l1_rn.shape[2:])
+            out = self.scratch.refinenet1(out, l1_rn)
+            out = self.scratch.output_conv1(out)
+
+        aux_list: List[torch.Tensor] = []
+        if not with_aux:
+            return out, aux_list
+
         # level 4 -> 3
-        out = self.scratch.refinenet4(l4_rn, size=l3_rn.shape[2:])
         aux_out = self.scratch.refinenet4_aux(l4_rn, size=l3_rn.shape[2:])
-        aux_list: List[torch.Tensor] = []
         if self.aux_levels >= 4:
             aux_list.append(aux_out)
 
         # level 3 -> 2
-        out = self.scratch.refinenet3(out, l3_rn, size=l2_rn.shape[2:])
         aux_out = self.scratch.refinenet3_aux(aux_out, l3_rn, size=l2_rn.shape[2:])
         if self.aux_levels >= 3:
             aux_list.append(aux_out)
 
         # level 2 -> 1
-        out = self.scratch.refinenet2(out, l2_rn, size=l1_rn.shape[2:])
         aux_out = self.scratch.refinenet2_aux(aux_out, l2_rn, size=l1_rn.shape[2:])
         if self.aux_levels >= 2:
             aux_list.append(aux_out)
 
         # level 1 (final)
-        out = self.scratch.refinenet1(out, l1_rn)
         aux_out = self.scratch.refinenet1_aux(aux_out, l1_rn)
         aux_list.append(aux_out)
 
-        out = self.scratch.output_conv1(out)
         aux_list = [self.scratch.output_conv1_aux[i](aux) for i, aux in enumerate(aux_list)]
 
         return out, aux_list
@@ -313,10 +341,8 @@ class DualDPT(nn.Module):
     def _add_pos_embed(self, x: torch.Tensor, W: int, H: int, ratio: float = 0.1) -> torch.Tensor:
         """Simple UV positional embedding added to feature maps."""
         pw, ph = x.shape[-1], x.shape[-2]
-        pe = create_uv_grid(pw, ph, aspect_ratio=W / H, dtype=x.dtype, device=x.device)
-        pe = position_grid_to_embed(pe, x.shape[1]) * ratio
-        pe = pe.permute(2, 0, 1)[None].expand(x.shape[0], -1, -1, -1)
-        return x + pe
+        pe = uv_pos_embed(pw, ph, x.shape[1], W / H, ratio, dtype=x.dtype, device=x.device)
+        return x + pe[None]
 
     def _make_aux_out1_block(self, in_ch: int) -> nn.Sequential:
         """Factory for the aux pre-head stack before the final 1x1 projection."""
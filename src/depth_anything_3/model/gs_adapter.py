@@ -14,14 +14,14 @@
 
 from typing import Optional
 import torch
-from einops import einsum, rearrange, repeat
+from einops import einsum, rearrange
 from torch import nn
 
 from depth_anything_3.model.utils.transform import cam_quat_xyzw_to_world_quat_wxyz
 from depth_anything_3.specs import Gaussians
-from depth_anything_3.utils.geometry import affine_inverse, get_world_rays, sample_image_grid
+from depth_anything_3.utils.geometry import affine_inverse, homogenize_points, sample_image_grid
 from depth_anything_3.utils.pose_align import batch_align_poses_umeyama
-from depth_anything_3.utils.sh_helpers import rotate_sh
+from depth_anything_3.utils.sh_helpers import sh_rotation_matrix
 
 
 class GaussianAdapter(nn.Module):
@@ -109,13 +109,18 @@ class GaussianAdapter(nn.Module):
             xy_ray = xy_ray + offset_xy * pixel_size
             raw_gaussians = raw_gaussians[..., 2:]  # skip the offset_xy
         # 1.4) unproject depth + xy to world ray
-        origins, directions = get_world_rays(
-            xy_ray,
-            repeat(cam2worlds, "b v i j -> b v h w i j", h=H, w=W),
-            repeat(intr_normed, "b v i j -> b v h w i j", h=H, w=W),
+        # The pixels of a view share its camera matrices: one (h w, 3) x (3, 3) matmul per
+        # view instead of a matrix per pixel
+        intr_inv = intr_normed.float().inverse().to(intr_normed)
+        xy_homo = homogenize_points(xy_ray.to(intr_inv.dtype))
+        xy_homo = rearrange(xy_homo, "b v h w c -> b v (h w) c")
+        directions = xy_homo @ intr_inv.transpose(-1, -2)
+        directions = directions / directions.norm(dim=-1, keepdim=True)
+        directions = directions.to(cam2worlds.dtype) @ cam2worlds[..., :3, :3].transpose(-1, -2)
+        gs_means_world = cam2worlds[..., None, :3, 3] + directions * rearrange(
+            gs_depths, "b v h w -> b v (h w) ()"
         )
-        gs_means_world = origins + directions * gs_depths[..., None]
-        gs_means_world = rearrange(gs_means_world, "b v h w d -> b (v h w) d")
+        gs_means_world = rearrange(gs_means_world, "b v n d -> b (v n) d")
 
         # 2. compute other GS attributes
         scales, rotations, sh = raw_gaussians.split((3, 4, 3 * self.d_sh), dim=-1)
@@ -134,28 +139,25 @@ class GaussianAdapter(nn.Module):
         # due to historical issue, assume quaternion in order xyzw, not wxyz
         # Normalize the quaternion features to yield a valid quaternion.
         rotations = rotations / (rotations.norm(dim=-1, keepdim=True) + eps)
-        # rotate them to world space
-        cam_quat_xyzw = rearrange(rotations, "b v h w c -> b (v h w) c")
-        c2w_mat = repeat(
-            cam2worlds,
-            "b v i j -> b (v h w) i j",
-            h=H,
-            w=W,
-        )
-        world_quat_wxyz = cam_quat_xyzw_to_world_quat_wxyz(cam_quat_xyzw, c2w_mat)
-        gs_rotations_world = world_quat_wxyz  # b (v h w) c
+        # rotate them to world space, broadcasting the camera rotation of each view
+        cam_quat_xyzw = rearrange(rotations, "b v h w c -> b v (h w) c")
+        world_quat_wxyz = cam_quat_xyzw_to_world_quat_wxyz(cam_quat_xyzw, cam2worlds[:, :, None])
+        gs_rotations_world = rearrange(world_quat_wxyz, "b v n c -> b (v n) c")
 
         # 2.3) 3DGS color / SH coefficient (world space)
-        sh = rearrange(sh, "... (xyz d_sh) -> ... xyz d_sh", xyz=3)
-        if not self.pred_color:
-            sh = sh * self.sh_mask
-
+        sh = rearrange(sh, "b v h w (xyz d_sh) -> b v (h w xyz) d_sh", xyz=3)
         if self.pred_color or self.sh_degree == 0:
             # predict pre-computed color or predict only DC band, no need to transform
-            gs_sh_world = sh
+            gs_sh_world = sh if self.pred_color else sh * self.sh_mask
         else:
-            gs_sh_world = rotate_sh(sh, cam2worlds[:, :, None, None, None, :3, :3])
-        gs_sh_world = rearrange(gs_sh_world, "b v h w xyz d_sh -> b (v h w) xyz d_sh")
+            # Fold the SH mask into the rotation of each view, then rotate all
+            # coefficients of a view with one matmul: sh_world = R_sh @ (mask * sh)
+            sh_rotation = sh_rotation_matrix(cam2worlds[..., :3, :3], self.d_sh)
+            sh_transform = self.sh_mask[:, None] * sh_rotation.transpose(-1, -2)
+            gs_sh_world = sh @ sh_transform.to(sh.dtype)
+        gs_sh_world = rearrange(
+            gs_sh_world, "b v (n xyz) d_sh -> b (v n) xyz d_sh", xyz=3, d_sh=self.d_sh
+        )
 
         # 2.4) 3DGS opacity
         gs_opacities = rearrange(opacities, "b v h w ... -> b (v h w) ...")
@@ -0,0 +1,164 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+ONNX export of DepthAnything3Net.
+
+The exported graph covers the backbone, the depth head (DPT or DualDPT) and the camera
+decoder, with dynamic view-count and resolution axes. Host-side post-processing (mono sky
+handling) is left to the runtime, see ``depth_anything_3.onnx_api``.
+"""
+
+from __future__ import annotations
+
+import json
+import torch
+import torch.nn as nn
+from torch.export import Dim
+
+from depth_anything_3.model.da3 import DepthAnything3Net
+from depth_anything_3.model.utils.transform import pose_encoding_to_extri_intri
+from depth_anything_3.utils.constants import ONNX_INPUT_NAME
+from depth_anything_3.utils.geometry import affine_inverse
+from depth_anything_3.utils.logger import logger
+
+DEFAULT_OPSET = 18
+DEFAULT_SAMPLE_SHAPE = (4, 3, 280, 378)
+MIN_PATCHES = 3  # smallest height and width of the dynamic axes, in patches
+
+
+def onnx_output_names(net: DepthAnything3Net) -> list[str]:
+    """Names of the graph outputs exported for ``net``, in order."""
+    head = net.head
+    names = [head.head_main]
+    if getattr(head, "has_conf", True):
+        names.append(f"{head.head_main}_conf")
+    if getattr(head, "use_sky_head", False):
+        names.append(head.sky_name)
+    if net.cam_dec is not None:
+        names += ["extrinsics", "intrinsics"]
+    return names
+
+
+class OnnxExportWrapper(nn.Module):
+    """
+    Tensor-only forward of DepthAnything3Net for export.
+
+    Args:
+        net: Network to export
+        ref_view_strategy: Reference view selection strategy baked into the graph
+    """
+
+    def __init__(self, net: DepthAnything3Net, ref_view_strategy: str = "saddle_balanced"):
+        super().__init__()
+        self.net = net
+        self.ref_view_strategy = ref_view_strategy
+        self.output_names = onnx_output_names(net)
+
+    def forward(self, image: torch.Tensor) -> tuple[torch.Tensor, ...]:
+        """
+        Args:
+            image: Normalized input images (B, S, 3, H, W), H and W multiples of 14
+
+        Returns:
+            Tensors named by ``onnx_output_names``: depth (B, S, H, W), depth_conf
+            (B, S, H, W), optional sky (B, S, H, W), extrinsics (B, S, 3, 4) and
+            intrinsics (B, S, 3, 3)
+        """
+        H, W = image.shape[-2], image.shape[-1]
+        feats, _, _ = self.net.backbone(
+            image, export_feat_layers=[], ref_view_strategy=self.ref_view_strategy
+        )
+        # A single head chunk keeps the graph free of view-count branches
+        output = self.net.head(feats, H, W, patch_start_idx=0, chunk_size=None)
+        if self.net.cam_dec is not None:
+            pose_enc = self.net.cam_dec(feats[-1][1])
+            c2w, ixt = pose_encoding_to_extri_intri(pose_enc, (H, W))
+            output["extrinsics"] = affine_inverse(c2w)
+            output["intrinsics"] = ixt
+        return tuple(output[name] for name in self.output_names)
+
+
+def export_onnx(
+    net: DepthAnything3Net,
+    path: str,
+    sample_shape: tuple[int, int, int, int] | None = None,
+    max_views: int = 64,
+    max_resolution: int = 1036,
+    ref_view_strategy: str = "saddle_balanced",
+    opset_version: int = DEFAULT_OPSET,
+    metadata: dict[str, str] | None = None,
+) -> list[str]:
+    """
+    Export ``net`` to an ONNX file with dynamic view-count and resolution axes.
+
+    Args:
+        net: DepthAnything3Net in eval mode; nested and 3DGS branches are not exported
+        path: Output .onnx file
+        sample_shape: (S, 3, H, W) of the example input traced during export, clamped to
+            ``max_views`` and ``max_resolution``; by default (4, 3, 280, 378)
+        max_views: Upper bound of the view axis
+        max_resolution: Upper bound of the height and width axes in pixels
+        ref_view_strategy: Reference view selection strategy baked into the graph
+        opset_version: ONNX opset
+        metadata: Extra key/value pairs stored in the model metadata
+
+    Returns:
+        Names of the graph outputs
+    """
+    if not isinstance(net, DepthAnything3Net):
+        raise TypeError(f"Only DepthAnything3Net can be exported, got {type(net).__name__}")
+    patch_size = net.PATCH_SIZE
+    wrapper = OnnxExportWrapper(net, ref_view_strategy).eval()
+    device = next(net.parameters()).device
+
+    # Height and width stay multiples of the patch size
+    max_patches = max_resolution // patch_size
+    if max_patches < MIN_PATCHES:
+        raise ValueError(
+            f"max_resolution must be at least {MIN_PATCHES * patch_size}, got {max_resolution}"
+        )
+    # The traced example must lie within the bounds of the dynamic axes
+    num_views, _, sample_h, sample_w = sample_shape or DEFAULT_SAMPLE_SHAPE
+    sample_h, sample_w = (
+        patch_size * min(max(size // patch_size, MIN_PATCHES), max_patches)
+        for size in (sample_h, sample_w)
+    )
+    sample = torch.randn(1, min(num_views, max_views), 3, sample_h, sample_w, device=device)
+    views = Dim("views", min=1, max=max_views)
+    height = patch_size * Dim("height_patches", min=MIN_PATCHES, max=max_patches)
+    width = patch_size * Dim("width_patches", min=MIN_PATCHES, max=max_patches)
+    dynamic_shapes = {ONNX_INPUT_NAME: {1: views, 3: height, 4: width}}
+
+    with torch.no_grad():
+        program = torch.onnx.export(
+            wrapper,
+            (sample,),
+            input_names=[ONNX_INPUT_NAME],
+            output_names=wrapper.output_names,
+            dynamic_shapes=dynamic_shapes,
+            opset_version=opset_version,
+            dynamo=True,
+        )
+    program.model.metadata_props.update(
+        {
+            "patch_size": str(patch_size),
+            "output_names": json.dumps(wrapper.output_names),
+            "ref_view_strategy": ref_view_strategy,
+            **(metadata or {}),
+        }
+    )
+    program.save(path)
+    logger.info(f"Exported ONNX model to {path} with outputs {wrapper.output_names}")
+    return wrapper.output_names
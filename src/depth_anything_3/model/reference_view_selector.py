@@ -25,6 +25,9 @@ from typing import Literal
 
 RefViewStrategy = Literal["first", "middle", "saddle_balanced", "saddle_sim_range"]
 
+# Query views per similarity chunk of "saddle_sim_range", bounds memory to O(S * chunk)
+SIM_CHUNK_VIEWS = 1024
+
 
 def select_reference_view(
     x: torch.Tensor,
@@ -43,15 +46,17 @@ def select_reference_view(
             - "first": Always select the first view
             - "middle": Select the middle view
             - "saddle_balanced": Select view with balanced features across multiple metrics
-            - "saddle_sim_range": Select view with largest similarity range
+            - "saddle_sim_range": Select view with largest similarity range. Unlike the
+              other strategies its cost is quadratic in the number of views, O(S^2 * C)
     
     Returns:
         b_idx: Tensor of shape (B,) containing the selected view index for each batch
     """
     B, S, N, C = x.shape
     
-    # For single view, no reordering needed
-    if S <= 1:
+    # For single view, no reordering needed. Exported graphs skip this shape check, the
+    # reference index of a single view is masked to 0 by the caller.
+    if not torch.compiler.is_exporting() and S <= 1:
         return torch.zeros(B, dtype=torch.long, device=x.device)
     
     # Simple position-based strategies
@@ -67,10 +72,11 @@ def select_reference_view(
     
     if strategy == "saddle_balanced":
         # Select view with balanced features across multiple metrics
-        # Compute similarity matrix
-        sim = torch.matmul(img_class_feat, img_class_feat.transpose(1, 2))  # B S S
-        sim_no_diag = sim - torch.eye(S, device=sim.device).unsqueeze(0)
-        sim_score = sim_no_diag.sum(dim=-1) / (S - 1)  # B S
+        # Mean similarity to the other views: the row sums of the similarity matrix are
+        # the similarities to the summed class token, which is O(S * C) instead of O(S^2 * C)
+        feat_sum = img_class_feat.sum(dim=1, keepdim=True)  # B 1 C
+        sim_sum = torch.matmul(img_class_feat, feat_sum.transpose(1, 2)).squeeze(-1)  # B S
+        sim_score = (sim_sum - 1) / (S - 1)  # B S
         
         feat_norm = x[:, :, 0].norm(dim=-1)  # B S
         feat_var = img_class_feat.var(dim=-1)  # B S
@@ -95,12 +101,7 @@ def select_reference_view(
         
     elif strategy == "saddle_sim_range":
         # Select view with largest similarity range (max - min)
-        sim = torch.matmul(img_class_feat, img_class_feat.transpose(1, 2))  # B S S
-        sim_no_diag = sim - torch.eye(S, device=sim.device).unsqueeze(0)
-        
-        sim_max = sim_no_diag.max(dim=-1).values  # B S
-        sim_min = sim_no_diag.min(dim=-1).values  # B S
-        sim_range = sim_max - sim_min
+        sim_range = _similarity_range(img_class_feat)  # B S
         b_idx = sim_range.argmax(dim=1)
     
     else:
@@ -112,6 +113,41 @@ def select_reference_view(
     return b_idx
 
 
+def _similarity_range(
+    feat: torch.Tensor,
+    chunk_size: int = SIM_CHUNK_VIEWS,
+) -> torch.Tensor:
+    """
+    Range (max - min) of the similarities of every view to all views, with the
+    self-similarity offset by -1. Query views are processed in chunks so that the full
+    S x S similarity matrix is never materialized.
+
+    The extremes of the similarities are not decomposable like their mean, so the compute
+    stays O(S^2 * C); only the memory is bounded, to O(S * chunk_size).
+
+    Args:
+        feat: Normalized class tokens of shape (B, S, C)
+        chunk_size: Number of query views per chunk
+
+    Returns:
+        sim_range: Tensor of shape (B, S)
+    """
+    S = feat.shape[1]
+    if torch.compiler.is_exporting():
+        # Exported graphs have a dynamic view count, use a single chunk
+        sim = torch.matmul(feat, feat.transpose(1, 2))  # B S S
+        sim = sim - torch.eye(S, device=sim.device).unsqueeze(0)
+        return sim.max(dim=-1).values - sim.min(dim=-1).values
+    
+    sim_range = []
+    for start in range(0, S, chunk_size):
+        sim = torch.matmul(feat[:, start : start + chunk_size], feat.transpose(1, 2))  # B s S
+        rows = torch.arange(sim.shape[1], device=sim.device)
+        sim[:, rows, start + rows] -= 1
+        sim_range.append(sim.max(dim=-1).values - sim.min(dim=-1).values)
+    return torch.cat(sim_range, dim=1)
+
+
 def reorder_by_reference(
     x: torch.Tensor,
     b_idx: torch.Tensor,
@@ -132,8 +168,8 @@ def reorder_by_reference(
     """
     B, S = x.shape[0], x.shape[1]
     
-    # For single view, no reordering needed
-    if S <= 1:
+    # For single view, no reordering needed (the general path is the identity as well)
+    if not torch.compiler.is_exporting() and S <= 1:
         return x
     
     # Create position indices: (B, S) where each row is [0, 1, 2, ..., S-1]
@@ -186,8 +222,8 @@ def restore_original_order(
     """
     B, S = x.shape[0], x.shape[1]
     
-    # For single view, no restoration needed
-    if S <= 1:
+    # For single view, no restoration needed (the general path is the identity as well)
+    if not torch.compiler.is_exporting() and S <= 1:
         return x
     
     # Create target position indices: (B, S) where each row is [0, 1, 2, ..., S-1]
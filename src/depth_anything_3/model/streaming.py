@@ -0,0 +1,116 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Streaming state for incremental multi-view inference.
+
+The global blocks of the backbone let every view attend to the tokens of all other views.
+When frames are appended to a scene one batch at a time, the keys and values of the views
+that were already processed do not change, so they are cached per global layer and reused:
+new frames attend to the cached views and to each other, and only the new frames are
+pushed through the backbone and the heads.
+"""
+
+from __future__ import annotations
+
+from typing import Callable
+import torch
+import torch.nn.functional as F
+from torch import Tensor
+
+
+class StreamingState:
+    """
+    Per-layer key/value cache of the global blocks plus session-level constants.
+
+    Args:
+        max_cached_views: Maximum number of views kept in the cache. When exceeded, the
+            oldest views are evicted, except for the first view of the session which is
+            the reference view. None keeps all views.
+    """
+
+    def __init__(self, max_cached_views: int | None = None):
+        if max_cached_views is not None and max_cached_views < 1:
+            raise ValueError(f"max_cached_views must be positive, got {max_cached_views}")
+        self.max_cached_views = max_cached_views
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop all cached views."""
+        self.num_views = 0  # Total number of views processed in the session
+        self.scale_factor = None  # Metric scale of the nested model, fixed on the first call
+        self._keys: dict[int, Tensor] = {}
+        self._values: dict[int, Tensor] = {}
+        self._view_tokens: list[int] = []  # Number of cached tokens of each cached view
+
+    @property
+    def num_cached_views(self) -> int:
+        return len(self._view_tokens)
+
+    @property
+    def num_cached_tokens(self) -> int:
+        return sum(self._view_tokens)
+
+    def attn_fn(self, layer_idx: int) -> Callable[[Tensor, Tensor, Tensor], Tensor]:
+        """
+        Attention function for a global block that attends to the cached views.
+
+        The keys and values of the new tokens are written to the cache of the layer and
+        become visible to later calls once commit() is called.
+        """
+
+        def fn(q: Tensor, k: Tensor, v: Tensor) -> Tensor:
+            keys, values = self._append(layer_idx, k, v)
+            return F.scaled_dot_product_attention(q, keys, values)
+
+        return fn
+
+    def commit(self, num_new_views: int, tokens_per_view: int) -> None:
+        """Make the keys/values written during the last forward pass part of the cache."""
+        self.num_views += num_new_views
+        self._view_tokens.extend([tokens_per_view] * num_new_views)
+        if self.max_cached_views is not None and self.num_cached_views > self.max_cached_views:
+            self._evict()
+
+    def _append(self, layer_idx: int, k: Tensor, v: Tensor) -> tuple[Tensor, Tensor]:
+        length = self.num_cached_tokens
+        total = length + k.shape[2]
+        keys, values = self._keys.get(layer_idx), self._values.get(layer_idx)
+        if keys is None or keys.shape[2] < total:
+            # Grow geometrically so that appending frames does not copy the cache every time
+            capacity = max(total, 2 * keys.shape[2] if keys is not None else 0)
+            new_keys = k.new_empty(*k.shape[:2], capacity, k.shape[3])
+            new_values = v.new_empty(*v.shape[:2], capacity, v.shape[3])
+            if keys is not None:
+                new_keys[:, :, :length] = keys[:, :, :length]
+                new_values[:, :, :length] = values[:, :, :length]
+            keys, values = new_keys, new_values
+            self._keys[layer_idx], self._values[layer_idx] = keys, values
+        keys[:, :, length:total] = k
+        values[:, :, length:total] = v
+        return keys[:, :, :total], values[:, :, :total]
+
+    def _evict(self) -> None:
+        num_drop = self.num_cached_views - self.max_cached_views
+        ref_tokens = self._view_tokens[0]
+        drop_tokens = sum(self._view_tokens[1 : 1 + num_drop])
+        length = self.num_cached_tokens
+        for layer_idx in self._keys:
+            for cache in (self._keys, self._values):
+                buf = cache[layer_idx]
+                kept = torch.cat(
+                    [buf[:, :, :ref_tokens], buf[:, :, ref_tokens + drop_tokens : length]], dim=2
+                )
+                buf[:, :, : kept.shape[2]] = kept
+        self._view_tokens = self._view_tokens[:1] + self._view_tokens[1 + num_drop :]
@@ -0,0 +1,104 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Concurrent execution of two independent network branches.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Any, Callable, TypeVar
+import torch
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+
+def _autocast_state(device_type: str) -> tuple[bool, torch.dtype]:
+    try:
+        return torch.is_autocast_enabled(device_type), torch.get_autocast_dtype(device_type)
+    except (TypeError, AttributeError):
+        # PyTorch < 2.4
+        if device_type == "cpu":
+            return torch.is_autocast_cpu_enabled(), torch.get_autocast_cpu_dtype()
+        return torch.is_autocast_enabled(), torch.get_autocast_gpu_dtype()
+
+
+def _record_stream(obj: Any, stream: torch.cuda.Stream) -> None:
+    """Mark the tensors of a (nested) output as used on ``stream``."""
+    if isinstance(obj, torch.Tensor):
+        if obj.is_cuda:
+            obj.record_stream(stream)
+    elif isinstance(obj, dict):
+        for value in obj.values():
+            _record_stream(value, stream)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            _record_stream(value, stream)
+
+
+def run_concurrently(
+    main_fn: Callable[[], T], side_fn: Callable[[], U], device: torch.device
+) -> tuple[T, U]:
+    """
+    Run two independent functions concurrently on ``device``.
+
+    ``side_fn`` runs in a worker thread that inherits the caller's grad, inference-mode,
+    autocast and intra-op thread settings; on CUDA it is issued on a separate stream.
+    ``main_fn`` runs in the calling thread on the current stream.
+
+    Args:
+        main_fn: Function run in the calling thread
+        side_fn: Function run in the worker thread
+        device: Device both functions run on
+
+    Returns:
+        Outputs of ``main_fn`` and ``side_fn``, safe to use on the current stream
+    """
+    grad_enabled = torch.is_grad_enabled()
+    inference_mode = torch.is_inference_mode_enabled()
+    autocast_enabled, autocast_dtype = _autocast_state(device.type)
+    num_threads = torch.get_num_threads()
+    main_stream = side_stream = None
+    if device.type == "cuda":
+        main_stream = torch.cuda.current_stream(device)
+        side_stream = torch.cuda.Stream(device)
+        # Inputs are produced on the current stream
+        side_stream.wait_stream(main_stream)
+
+    def run_side() -> U:
+        # Grad mode, autocast and the current stream are thread-local
+        torch.set_num_threads(num_threads)
+        with ExitStack() as stack:
+            stack.enter_context(torch.inference_mode(inference_mode))
+            stack.enter_context(torch.set_grad_enabled(grad_enabled))
+            stack.enter_context(
+                torch.autocast(device.type, dtype=autocast_dtype, enabled=autocast_enabled)
+            )
+            if side_stream is not None:
+                stack.enter_context(torch.cuda.device(device))
+                stack.enter_context(torch.cuda.stream(side_stream))
+            return side_fn()
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        future = pool.submit(run_side)
+        main_out = main_fn()
+        side_out = future.result()
+
+    if side_stream is not None:
+        main_stream.wait_stream(side_stream)
+        _record_stream(side_out, main_stream)
+    return main_out, side_out
@@ -0,0 +1,323 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tile-based 3D Gaussian rasterizer in vectorized PyTorch.
+
+A device-agnostic fallback of gsplat's ``rasterization`` (classic mode, unpacked) used when
+gsplat or a GPU is unavailable. It follows the same conventions: EWA projection with a
+2D blur of ``eps2d``, 3-sigma tile culling, per-tile depth sorting and front-to-back
+alpha compositing that stops once the transmittance falls below 1e-4.
+
+Tiles are composited in rounds: every round takes the next depth-sorted Gaussians of all
+tiles that still have Gaussians and unfinished pixels, so finished tiles drop out early.
+Tiles default to 8x8 pixels instead of gsplat's 16x16, which evaluates fewer pixels per
+Gaussian on CPU.
+"""
+
+from __future__ import annotations
+
+from typing import Literal, Optional
+import torch
+
+from depth_anything_3.model.utils.transform import quat_to_mat
+from depth_anything_3.utils.sh_helpers import eval_sh_basis
+
+ALPHA_THRESHOLD = 1.0 / 255.0
+MAX_ALPHA = 0.999
+TRANSMITTANCE_THRESHOLD = 1e-4
+# Upper bound of (tiles * pixels per tile * Gaussians) evaluated per compositing round
+RASTER_CHUNK_ELEMENTS = 2**22
+
+
+def project_gaussians(
+    means: torch.Tensor,  # "N 3"
+    covars: torch.Tensor,  # "N 3 3"
+    viewmat: torch.Tensor,  # "4 4", world2cam
+    K: torch.Tensor,  # "3 3", pixel units
+    width: int,
+    height: int,
+    near_plane: float = 0.01,
+    far_plane: float = 1e10,
+    eps2d: float = 0.3,
+    radius_clip: float = 0.0,
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    EWA projection of 3D Gaussians to the image plane.
+
+    Returns:
+        means2d (N, 2), conics (N, 3) as (a, b, c) of the inverse 2D covariance,
+        depths (N,) and integer radii (N,), zero for culled Gaussians
+    """
+    R, t = viewmat[:3, :3], viewmat[:3, 3]
+    means_c = means @ R.T + t
+    covars_c = R @ covars @ R.T
+    x, y, z = means_c.unbind(-1)
+    fx, fy, cx, cy = K[0, 0], K[1, 1], K[0, 2], K[1, 2]
+
+    # Clamp the Jacobian of off-screen Gaussians like the reference kernels
+    tan_fov_x, tan_fov_y = 0.5 * width / fx, 0.5 * height / fy
+    lim_x_pos, lim_x_neg = (width - cx) / fx + 0.3 * tan_fov_x, cx / fx + 0.3 * tan_fov_x
+    lim_y_pos, lim_y_neg = (height - cy) / fy + 0.3 * tan_fov_y, cy / fy + 0.3 * tan_fov_y
+    rz = 1.0 / z
+    tx = z * torch.minimum(torch.maximum(x * rz, -lim_x_neg), lim_x_pos)
+    ty = z * torch.minimum(torch.maximum(y * rz, -lim_y_neg), lim_y_pos)
+    zeros = torch.zeros_like(z)
+    J = torch.stack(
+        [fx * rz, zeros, -fx * tx * rz * rz, zeros, fy * rz, -fy * ty * rz * rz], dim=-1
+    ).reshape(-1, 2, 3)
+    covars2d = J @ covars_c @ J.transpose(-1, -2)
+    a = covars2d[:, 0, 0] + eps2d
+    b = covars2d[:, 0, 1]
+    c = covars2d[:, 1, 1] + eps2d
+    det = a * c - b * b
+    means2d = torch.stack([fx * x * rz + cx, fy * y * rz + cy], dim=-1)
+
+    safe_det = torch.where(det > 0, det, torch.ones_like(det))
+    conics = torch.stack([c, -b, a], dim=-1) / safe_det[:, None]
+    mid = 0.5 * (a + c)
+    radii = torch.ceil(3.0 * (mid + (mid * mid - det).clamp(min=0.01).sqrt()).sqrt())
+
+    valid = (z > near_plane) & (z < far_plane) & (det > 0) & (radii > radius_clip)
+    valid &= (means2d[:, 0] + radii > 0) & (means2d[:, 0] - radii < width)
+    valid &= (means2d[:, 1] + radii > 0) & (means2d[:, 1] - radii < height)
+    radii = torch.where(valid, radii, torch.zeros_like(radii)).long()
+    return means2d, conics, z, radii
+
+
+def _tile_intersections(
+    means2d: torch.Tensor,
+    radii: torch.Tensor,
+    depths: torch.Tensor,
+    tiles_w: int,
+    tiles_h: int,
+    tile_size: int,
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Gaussians overlapping every tile, sorted by tile and then by depth.
+
+    Returns:
+        Gaussian indices (M,) sorted by (tile, depth), and the offset (T,) and count (T,)
+        of every tile's range in them
+    """
+    device = means2d.device
+    num_tiles = tiles_w * tiles_h
+    r = radii.to(means2d.dtype)
+    tile_x0 = torch.floor((means2d[:, 0] - r) / tile_size).clamp(0, tiles_w).long()
+    tile_x1 = torch.ceil((means2d[:, 0] + r) / tile_size).clamp(0, tiles_w).long()
+    tile_y0 = torch.floor((means2d[:, 1] - r) / tile_size).clamp(0, tiles_h).long()
+    tile_y1 = torch.ceil((means2d[:, 1] + r) / tile_size).clamp(0, tiles_h).long()
+    span_x = tile_x1 - tile_x0
+    num_isect = torch.where(radii > 0, span_x * (tile_y1 - tile_y0), torch.zeros_like(radii))
+
+    gauss_ids = torch.repeat_interleave(torch.arange(len(radii), device=device), num_isect)
+    first = torch.cumsum(num_isect, dim=0) - num_isect
+    local = torch.arange(len(gauss_ids), device=device) - first[gauss_ids]
+    span = span_x[gauss_ids]
+    tile_ids = (tile_y0[gauss_ids] + local // span) * tiles_w + tile_x0[gauss_ids] + local % span
+
+    depth_rank = torch.empty_like(radii)
+    depth_rank[torch.argsort(depths)] = torch.arange(len(depths), device=device)
+    order = torch.argsort(tile_ids * len(depths) + depth_rank[gauss_ids])
+    counts = torch.bincount(tile_ids, minlength=num_tiles)
+    offsets = torch.cumsum(counts, dim=0) - counts
+    return gauss_ids[order], offsets, counts
+
+
+def rasterize_to_pixels(
+    means2d: torch.Tensor,  # "N 2"
+    conics: torch.Tensor,  # "N 3"
+    colors: torch.Tensor,  # "N D"
+    opacities: torch.Tensor,  # "N"
+    depths: torch.Tensor,  # "N"
+    radii: torch.Tensor,  # "N"
+    width: int,
+    height: int,
+    tile_size: int = 8,
+    background: Optional[torch.Tensor] = None,  # "D"
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Alpha-composite projected Gaussians front to back, one tile of pixels at a time.
+
+    Returns:
+        Colors (height, width, D) and alphas (height, width, 1)
+    """
+    device, dtype = means2d.device, means2d.dtype
+    tiles_w, tiles_h = -(-width // tile_size), -(-height // tile_size)
+    num_tiles, tile_pixels = tiles_w * tiles_h, tile_size * tile_size
+    sorted_ids, offsets, counts = _tile_intersections(
+        means2d, radii, depths, tiles_w, tiles_h, tile_size
+    )
+
+    # Pixel centers of every tile, (T, P, 2)
+    local = torch.arange(tile_size, device=device)
+    local_y, local_x = torch.meshgrid(local, local, indexing="ij")
+    tile_y, tile_x = torch.meshgrid(
+        torch.arange(tiles_h, device=device), torch.arange(tiles_w, device=device), indexing="ij"
+    )
+    pix_x = tile_x.reshape(-1, 1) * tile_size + local_x.reshape(1, -1) + 0.5
+    pix_y = tile_y.reshape(-1, 1) * tile_size + local_y.reshape(1, -1) + 0.5
+    pixels = torch.stack([pix_x, pix_y], dim=-1).to(dtype)
+
+    # Per-Gaussian terms of the exponent: sigma = dx * (a / 2 * dx + b * dy) + c / 2 * dy^2
+    # and log(opacity) - sigma, gathered once per round
+    gauss_params = torch.stack(
+        [
+            means2d[:, 0],
+            means2d[:, 1],
+            0.5 * conics[:, 0],
+            conics[:, 1],
+            0.5 * conics[:, 2],
+            opacities.to(dtype).log(),
+        ],
+        dim=-1,
+    )
+    out_colors = torch.zeros(num_tiles, tile_pixels, colors.shape[-1], device=device, dtype=dtype)
+    transmittance = torch.ones(num_tiles, tile_pixels, device=device, dtype=dtype)
+    done = torch.zeros(num_tiles, tile_pixels, device=device, dtype=torch.bool)
+    active = torch.nonzero(counts > 0).squeeze(-1)
+    consumed = torch.zeros_like(counts)
+    while len(active) > 0:
+        chunk = max(1, RASTER_CHUNK_ELEMENTS // (len(active) * tile_pixels))
+        chunk = min(chunk, int((counts[active] - consumed[active]).max()))
+        slot = consumed[active, None] + torch.arange(chunk, device=device)  # (A, K)
+        in_range = slot < counts[active, None]
+        gauss = sorted_ids[(offsets[active, None] + slot).clamp(max=len(sorted_ids) - 1)]
+
+        mx, my, half_a, b, half_c, log_opacity = gauss_params[gauss][:, None].unbind(-1)
+        log_opacity = log_opacity.masked_fill(~in_range[:, None], -torch.inf)
+        pixel_x, pixel_y = pixels[active][..., None].unbind(-2)  # (A, P, 1)
+        dx, dy = mx - pixel_x, my - pixel_y  # (A, P, K)
+        sigma = dx * (half_a * dx + b * dy) + half_c * dy * dy
+        # Alphas under the threshold are skipped, so clamping the exponent only avoids
+        # slow denormals
+        alpha = torch.exp((log_opacity - sigma).clamp(min=-20.0)).clamp_(max=MAX_ALPHA)
+        alpha.masked_fill_(alpha < ALPHA_THRESHOLD, 0.0)
+
+        # Transmittance before and after every Gaussian; a pixel stops before the Gaussian
+        # that would bring it to the threshold, and so do all Gaussians behind it
+        t_start = transmittance[active].masked_fill(done[active], 0.0)[..., None]
+        t_after = torch.cumprod(1.0 - alpha, dim=-1).mul_(t_start)
+        weights = alpha.mul_(torch.cat([t_start, t_after[..., :-1]], dim=-1))
+        weights.masked_fill_(t_after <= TRANSMITTANCE_THRESHOLD, 0.0)
+
+        out_colors[active] += torch.bmm(weights.to(colors.dtype), colors[gauss]).to(dtype)
+        transmittance[active] -= weights.sum(dim=-1)
+        done[active] = t_after[..., -1] <= TRANSMITTANCE_THRESHOLD
+
+        consumed[active] += chunk
+        remaining = (consumed[active] < counts[active]) & ~done[active].all(dim=-1)
+        active = active[remaining]
+
+    alphas = 1.0 - transmittance
+    if background is not None:
+        out_colors = out_colors + transmittance[..., None] * background.to(dtype)
+
+    def to_image(x: torch.Tensor) -> torch.Tensor:
+        x = x.reshape(tiles_h, tiles_w, tile_size, tile_size, -1).permute(0, 2, 1, 3, 4)
+        return x.reshape(tiles_h * tile_size, tiles_w * tile_size, -1)[:height, :width]
+
+    return to_image(out_colors), to_image(alphas[..., None])
+
+
+def rasterization(
+    means: torch.Tensor,  # "N 3"
+    quats: torch.Tensor,  # "N 4", wxyz
+    scales: torch.Tensor,  # "N 3"
+    opacities: torch.Tensor,  # "N"
+    colors: torch.Tensor,  # "N 3" | "N K 3" SH coefficients
+    viewmats: torch.Tensor,  # "C 4 4", world2cam
+    Ks: torch.Tensor,  # "C 3 3", pixel units
+    width: int,
+    height: int,
+    near_plane: float = 0.01,
+    far_plane: float = 1e10,
+    radius_clip: float = 0.0,
+    eps2d: float = 0.3,
+    sh_degree: Optional[int] = None,
+    backgrounds: Optional[torch.Tensor] = None,  # "C 3"
+    render_mode: Literal["RGB", "D", "ED", "RGB+D", "RGB+ED"] = "RGB",
+    tile_size: int = 8,
+    **kwargs,
+) -> tuple[torch.Tensor, torch.Tensor, dict]:
+    """
+    Render Gaussians into C cameras, mirroring gsplat's ``rasterization`` interface.
+
+    Args:
+        means, quats, scales, opacities: Gaussian parameters in world space
+        colors: RGB colors, or SH coefficients when ``sh_degree`` is given (degree <= 4)
+        viewmats: World-to-camera matrices
+        Ks: Pixel-unit intrinsics
+        width, height: Image size in pixels
+        sh_degree: Degree of the SH coefficients, None for RGB colors
+        backgrounds: RGB background of every camera
+        render_mode: Rendered channels; "D" is the accumulated depth, "ED" the expected
+            depth (accumulated depth divided by alpha)
+        tile_size: Tile size in pixels
+        Remaining arguments: see gsplat; unsupported gsplat options are ignored
+
+    Returns:
+        Colors (C, height, width, channels), alphas (C, height, width, 1) and a dict with
+        the ``radii`` (C, N) and ``means2d`` (C, N, 2) of the projected Gaussians
+    """
+    rotmats = quat_to_mat(quats[..., [1, 2, 3, 0]])  # wxyz -> xyzw
+    covars = (rotmats * scales[:, None, :] ** 2) @ rotmats.transpose(-1, -2)
+
+    render_colors, render_alphas, all_radii, all_means2d = [], [], [], []
+    for cam in range(len(viewmats)):
+        viewmat, K = viewmats[cam].to(means.dtype), Ks[cam].to(means.dtype)
+        means2d, conics, depths, radii = project_gaussians(
+            means, covars, viewmat, K, width, height, near_plane, far_plane, eps2d, radius_clip
+        )
+        if sh_degree is None:
+            cam_colors = colors
+        else:
+            cam_center = -viewmat[:3, :3].T @ viewmat[:3, 3]
+            dirs = torch.nn.functional.normalize(means - cam_center, dim=-1)
+            basis = eval_sh_basis(dirs, sh_degree)
+            cam_colors = torch.einsum("nk,nkc->nc", basis, colors[:, : basis.shape[-1]])
+            cam_colors = (cam_colors + 0.5).clamp(min=0.0)
+
+        channels = []
+        if render_mode in ("RGB", "RGB+D", "RGB+ED"):
+            channels.append(cam_colors)
+        if render_mode != "RGB":
+            channels.append(depths[:, None])
+        background = None
+        if backgrounds is not None and render_mode != "D" and render_mode != "ED":
+            background = backgrounds[cam]
+            if render_mode != "RGB":
+                background = torch.cat([background, background.new_zeros(1)])
+
+        image, alpha = rasterize_to_pixels(
+            means2d,
+            conics,
+            torch.cat(channels, dim=-1),
+            opacities,
+            depths,
+            radii,
+            width,
+            height,
+            tile_size,
+            background,
+        )
+        if render_mode in ("ED", "RGB+ED"):
+            image = torch.cat([image[..., :-1], image[..., -1:] / alpha.clamp(min=1e-10)], -1)
+        render_colors.append(image)
+        render_alphas.append(alpha)
+        all_radii.append(radii)
+        all_means2d.append(means2d)
+
+    info = {"radii": torch.stack(all_radii), "means2d": torch.stack(all_means2d)}
+    return torch.stack(render_colors), torch.stack(render_alphas), info
@@ -14,11 +14,12 @@
 
 import math
 from math import isqrt
-from typing import Literal, Optional
+from typing import Iterator, Literal, Optional
 import torch
 from einops import rearrange, repeat
 from tqdm import tqdm
 
+from depth_anything_3.model.utils import gs_rasterizer
 from depth_anything_3.specs import Gaussians
 from depth_anything_3.utils.camera_trj_helpers import (
     interpolate_extrinsics,
@@ -34,13 +35,32 @@ from depth_anything_3.utils.logger import logger
 try:
     from gsplat import rasterization
 except ImportError:
+    rasterization = None
     logger.warn(
-        "Dependency `gsplat` is required for rendering 3DGS. "
+        "Dependency `gsplat` not found, 3DGS is rendered with the slower PyTorch rasterizer. "
         "Install via: pip install git+https://github.com/nerfstudio-project/"
         "gsplat.git@0b4dddf04cb687367602c01196913cde6a743d70"
     )
 
 
+def select_rasterizer(device: torch.device, backend: Literal["auto", "gsplat", "torch"] = "auto"):
+    """
+    Rasterization function for Gaussians on ``device``.
+
+    "auto" uses gsplat's CUDA rasterizer when it is installed and the Gaussians are on a
+    GPU, and the tile-based PyTorch rasterizer otherwise.
+    """
+    if backend == "gsplat" or (
+        backend == "auto" and rasterization is not None and device.type == "cuda"
+    ):
+        if rasterization is None:
+            raise ImportError("Dependency `gsplat` is required for the 'gsplat' backend")
+        return rasterization
+    if backend not in ("auto", "torch"):
+        raise ValueError(f"Unknown rasterizer backend: {backend}")
+    return gs_rasterizer.rasterization
+
+
 def render_3dgs(
     extrinsics: torch.Tensor,  # "batch_views 4 4", w2c
     intrinsics: torch.Tensor,  # "batch_views 3 3", normalized
@@ -50,6 +70,7 @@ def render_3dgs(
     use_sh: bool = True,
     num_view: int = 1,
     color_mode: Literal["RGB+D", "RGB+ED"] = "RGB+D",
+    backend: Literal["auto", "gsplat", "torch"] = "auto",
     **kwargs,
 ) -> tuple[
     torch.Tensor,  # "batch_views 3 height width"
@@ -86,6 +107,7 @@ def render_3dgs(
     focal_length_y = h / (2 * tan_fov_y)
 
     view_matrix = extrinsics.float()
+    rasterize_fn = select_rasterizer(gaussian_means.device, backend)
 
     all_images = []
     all_radii = []
@@ -110,6 +132,8 @@ def render_3dgs(
             "i j -> v i j",
             v=num_view,
         ).to(gaussian_means)
+        # repeat may return an expanded view, which .to() only copies across devices
+        K = K.clone()
         K[:, 0, 0] = focal_length_x.reshape(batch_scene, num_view)[i]
         K[:, 1, 1] = focal_length_y.reshape(batch_scene, num_view)[i]
 
@@ -123,7 +147,7 @@ def render_3dgs(
             i
         ]  # [v, 3]
 
-        render_colors, render_alphas, info = rasterization(
+        render_colors, render_alphas, info = rasterize_fn(
             means=i_means,
             quats=i_quats,  # [N, 4]
             scales=i_scales,  # [N, 3]
@@ -154,6 +178,31 @@ def render_3dgs(
 
 
 def run_renderer_in_chunk_w_trj_mode(
+    gaussians: Gaussians,
+    extrinsics: torch.Tensor,  # world2cam, "batch view 4 4" | "batch view 3 4"
+    intrinsics: torch.Tensor,  # unnormed intrinsics, "batch view 3 3"
+    image_shape: tuple[int, int],
+    chunk_size: Optional[int] = 8,
+    **kwargs,
+) -> tuple[
+    torch.Tensor,  # color, "batch view 3 height width"
+    torch.Tensor,  # depth, "batch view height width"
+]:
+    """Render the whole trajectory, see ``iter_renderer_in_chunk_w_trj_mode``."""
+    all_colors = []
+    all_depths = []
+    for color, depth in iter_renderer_in_chunk_w_trj_mode(
+        gaussians, extrinsics, intrinsics, image_shape, chunk_size, **kwargs
+    ):
+        all_colors.append(color)
+        all_depths.append(depth)
+    all_colors = torch.cat(all_colors, dim=1)
+    all_depths = torch.cat(all_depths, dim=1)
+
+    return all_colors, all_depths
+
+
+def iter_renderer_in_chunk_w_trj_mode(
     gaussians: Gaussians,
     extrinsics: torch.Tensor,  # world2cam, "batch view 4 4" | "batch view 3 4"
     intrinsics: torch.Tensor,  # unnormed intrinsics, "batch view 3 3"
@@ -172,10 +221,18 @@ def run_renderer_in_chunk_w_trj_mode(
     input_shape: Optional[tuple[int, int]] = None,
     enable_tqdm: Optional[bool] = False,
     **kwargs,
-) -> tuple[
-    torch.Tensor,  # color, "batch view 3 height width"
-    torch.Tensor,  # depth, "batch view height width"
+) -> Iterator[
+    tuple[
+        torch.Tensor,  # color, "batch chunk_view 3 height width"
+        torch.Tensor,  # depth, "batch chunk_view height width"
+    ]
 ]:
+    """
+    Render the views of a camera trajectory chunk by chunk.
+
+    Chunks are yielded in trajectory order as soon as they are rendered, so consumers such
+    as video writers only hold ``chunk_size`` views at a time.
+    """
     cam2world = affine_inverse(as_homogeneous(extrinsics))
     if input_shape is not None:
         in_h, in_w = input_shape
@@ -313,8 +370,6 @@ def run_renderer_in_chunk_w_trj_mode(
     if chunk_size is None:
         chunk_size = v
     chunk_size = min(v, chunk_size)
-    all_colors = []
-    all_depths = []
     for chunk_idx in tqdm(
         range(math.ceil(v / chunk_size)),
         desc="Rendering novel views",
@@ -332,9 +387,7 @@ def run_renderer_in_chunk_w_trj_mode(
             num_view=cur_n_view,
             **kwargs,
         )
-        all_colors.append(rearrange(color, "(b v) ... -> b v ...", v=cur_n_view))
-        all_depths.append(rearrange(depth, "(b v) ... -> b v ...", v=cur_n_view))
-    all_colors = torch.cat(all_colors, dim=1)
-    all_depths = torch.cat(all_depths, dim=1)
-
-    return all_colors, all_depths
+        yield (
+            rearrange(color, "(b v) ... -> b v ...", v=cur_n_view),
+            rearrange(depth, "(b v) ... -> b v ...", v=cur_n_view),
+        )
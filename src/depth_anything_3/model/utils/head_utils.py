@@ -17,6 +17,9 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+from depth_anything_3.model.utils.pos_cache import POSITIONAL_CACHE
+from depth_anything_3.utils.memory import get_free_memory_gb
+
 # -----------------------------------------------------------------------------
 # Activation functions
 # -----------------------------------------------------------------------------
@@ -173,6 +176,9 @@ def create_uv_grid(
     Returns:
         torch.Tensor: A (width, height, 2) tensor of UV coordinates.
     """
+    if torch.compiler.is_exporting():
+        return _create_uv_grid_symbolic(width, height, aspect_ratio, dtype, device)
+
     # Derive aspect ratio if not explicitly provided
     if aspect_ratio is None:
         aspect_ratio = float(width) / float(height)
@@ -199,6 +205,35 @@ def create_uv_grid(
     return uv_grid
 
 
+def _create_uv_grid_symbolic(
+    width: int,
+    height: int,
+    aspect_ratio: float = None,
+    dtype: torch.dtype = None,
+    device: torch.device = None,
+) -> torch.Tensor:
+    """
+    Same as create_uv_grid for symbolic sizes during export, where the spans are kept in
+    tensors instead of being specialized to Python floats.
+    """
+    dtype = dtype or torch.get_default_dtype()
+    if aspect_ratio is None:
+        aspect_ratio = width / height
+    aspect_ratio = torch.full((), aspect_ratio, dtype=torch.float32, device=device)
+    diag_factor = (aspect_ratio**2 + 1.0) ** 0.5
+
+    def coords(steps: int, span: torch.Tensor) -> torch.Tensor:
+        steps_t = torch.full((), steps, dtype=torch.float32, device=device)
+        bound = span * (steps_t - 1) / steps_t
+        step = 2 * bound / (steps_t - 1).clamp(min=1)
+        return (torch.arange(steps, dtype=torch.float32, device=device) * step - bound).to(dtype)
+
+    x_coords = coords(width, aspect_ratio / diag_factor)
+    y_coords = coords(height, 1.0 / diag_factor)
+    uu, vv = torch.meshgrid(x_coords, y_coords, indexing="xy")
+    return torch.stack((uu, vv), dim=-1)
+
+
 # -----------------------------------------------------------------------------
 # Interpolation (safe interpolation, avoid INT_MAX overflow)
 # -----------------------------------------------------------------------------
@@ -214,12 +249,17 @@ def custom_interpolate(
     """
     if size is None:
         assert scale_factor is not None, "Either size or scale_factor must be provided."
-        size = (int(x.shape[-2] * scale_factor), int(x.shape[-1] * scale_factor))
+        # sym_int truncates like int() without specializing symbolic sizes during export
+        size = (
+            torch.sym_int(x.shape[-2] * scale_factor),
+            torch.sym_int(x.shape[-1] * scale_factor),
+        )
 
     INT_MAX = 1610612736
     total = size[0] * size[1] * x.shape[0] * x.shape[1]
 
-    if total > INT_MAX:
+    # Exported graphs run outside of PyTorch and have symbolic sizes, skip the chunking
+    if not torch.compiler.is_exporting() and total > INT_MAX:
         chunks = torch.chunk(x, chunks=(total // INT_MAX) + 1, dim=0)
         outs = [
             nn.functional.interpolate(c, size=size, mode=mode, align_corners=align_corners)
@@ -228,3 +268,137 @@ def custom_interpolate(
         return torch.cat(outs, dim=0).contiguous()
 
     return nn.functional.interpolate(x, size=size, mode=mode, align_corners=align_corners)
+
+
+# -----------------------------------------------------------------------------
+# Chunking along the view axis
+# -----------------------------------------------------------------------------
+DEFAULT_HEAD_CHUNK_SIZE = 8
+# Share of the free device memory that automatically sized head chunks may use
+HEAD_FREE_MEMORY_FRACTION = 0.5
+HEAD_BYTES_PER_ELEMENT = 4  # Heads run in fp32
+
+
+def estimate_head_view_bytes(head: nn.Module, H: int, W: int) -> int:
+    """
+    Estimate the peak activation memory of a DPT-style head for one view.
+
+    The estimate follows the head layout: the four projected stages at x4, x2, x1 and /2
+    of the patch grid with their scratch adapters, the fusion chain up to twice the
+    finest stage (with residual-unit temporaries), and the full-resolution maps of the
+    output convolutions.
+
+    Args:
+        head: DPT, DualDPT or GSDPT head
+        H: Image height
+        W: Image width
+
+    Returns:
+        Estimated bytes per view
+    """
+    features = head.scratch.output_conv1.in_channels
+    out_channels = [project.out_channels for project in head.projects]
+    grid = (H // head.patch_size) * (W // head.patch_size)
+    pyramid = sum(
+        scale * (channels + features) for scale, channels in zip((16, 4, 1, 0.25), out_channels)
+    )
+    fusion = 3 * features * (64 + 16 + 4 + 1)
+    if hasattr(head.scratch, "refinenet1_aux"):
+        # DualDPT fuses a second, independent pyramid
+        fusion *= 2
+    full_res = (H // head.down_ratio) * (W // head.down_ratio) * (features + 3 * 32)
+    return int((pyramid * grid + fusion * grid + full_res) * HEAD_BYTES_PER_ELEMENT)
+
+
+def plan_head_chunk_size(
+    head: nn.Module,
+    num_views: int,
+    H: int,
+    W: int,
+    memory_budget: float | None = None,
+    device: torch.device | None = None,
+) -> int:
+    """
+    Number of views per head chunk that keeps the head activations within a budget.
+
+    Args:
+        head: DPT, DualDPT or GSDPT head
+        num_views: Number of views to process (B * S)
+        H: Image height
+        W: Image width
+        memory_budget: Activation memory budget of the head in GB. None uses a share of
+            the free memory of ``device``.
+        device: Device the head runs on
+
+    Returns:
+        Chunk size in views, between 1 and ``num_views``
+    """
+    if memory_budget is None:
+        free_gb = get_free_memory_gb(device) if device is not None else None
+        if free_gb is None:
+            return min(num_views, DEFAULT_HEAD_CHUNK_SIZE)
+        memory_budget = free_gb * HEAD_FREE_MEMORY_FRACTION
+    per_view = estimate_head_view_bytes(head, H, W)
+    return int(min(num_views, max(1, memory_budget * 1024**3 // per_view)))
+
+
+# -----------------------------------------------------------------------------
+# Backbone features
+# -----------------------------------------------------------------------------
+def flatten_view_feats(feat):
+    """
+    Flatten layer features [B, S, N, C] to rows [B*S, N, C].
+
+    Deferred features of the low-memory backbone are returned as is; they are
+    materialized when sliced along the flattened view rows.
+    """
+    if isinstance(feat, torch.Tensor):
+        return feat.reshape(-1, *feat.shape[2:])
+    return feat
+
+
+def select_view_feats(feat, view_idx: torch.Tensor):
+    """
+    Select views of layer features [B, S, N, C] along S.
+
+    Deferred features of the low-memory backbone stay deferred.
+    """
+    if isinstance(feat, torch.Tensor):
+        return feat[:, view_idx]
+    return feat.select_views(view_idx)
+
+
+def uv_pos_embed(
+    width: int,
+    height: int,
+    embed_dim: int,
+    aspect_ratio: float,
+    ratio: float = 0.1,
+    dtype: torch.dtype = None,
+    device: torch.device = None,
+) -> torch.Tensor:
+    """
+    Scaled sinusoidal UV position embedding, cached per resolution in the shared
+    positional cache.
+
+    Args:
+        width (int): Number of points horizontally.
+        height (int): Number of points vertically.
+        embed_dim (int): Output channel dimension for embeddings.
+        aspect_ratio (float): Width-to-height ratio of the image.
+        ratio (float): Scale applied to the embedding.
+        dtype (torch.dtype, optional): Data type of the UV grid.
+        device (torch.device, optional): Device on which the tensor is created.
+
+    Returns:
+        torch.Tensor: A (embed_dim, height, width) tensor, shared between calls.
+    """
+
+    def compute_embed() -> torch.Tensor:
+        pe = create_uv_grid(width, height, aspect_ratio=aspect_ratio, dtype=dtype, device=device)
+        pe = position_grid_to_embed(pe, embed_dim) * ratio
+        return pe.permute(2, 0, 1).contiguous()
+
+    return POSITIONAL_CACHE.get(
+        "uv_pos_embed", height, width, device, dtype, compute_embed, embed_dim, aspect_ratio, ratio
+    )
@@ -0,0 +1,86 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers for padded batches of views with different sizes.
+
+Every view is padded at the bottom and right to a common canvas (H, W), so pixel
+coordinates and intrinsics of the valid region are unchanged. ``view_sizes`` of shape
+(B, S, 2) holds the valid (height, width) of each view in pixels, multiples of the
+patch size.
+"""
+
+from __future__ import annotations
+
+import torch
+
+
+def valid_region_mask(
+    view_sizes: torch.Tensor, height: int, width: int, stride: int = 1
+) -> torch.Tensor:
+    """
+    Mask of the valid region of each view on the canvas grid.
+
+    Args:
+        view_sizes: Valid (height, width) of each view in pixels, shape (B, S, 2)
+        height: Canvas height in pixels
+        width: Canvas width in pixels
+        stride: Pixels per grid cell, e.g. the patch size for the token grid
+
+    Returns:
+        Boolean mask of shape (B, S, height // stride, width // stride)
+    """
+    device = view_sizes.device
+    rows = torch.arange(height // stride, device=device) * stride
+    cols = torch.arange(width // stride, device=device) * stride
+    valid_rows = rows < view_sizes[..., 0, None]
+    valid_cols = cols < view_sizes[..., 1, None]
+    return valid_rows[..., :, None] & valid_cols[..., None, :]
+
+
+def group_views_by_size(view_sizes: torch.Tensor) -> list[tuple[tuple[int, int], torch.Tensor]]:
+    """
+    Group views of equal valid size.
+
+    Args:
+        view_sizes: Valid (height, width) of each view in pixels, shape (B, S, 2)
+
+    Returns:
+        List of ((height, width), indices) with indices into the flattened B * S views
+    """
+    flat_sizes = view_sizes.reshape(-1, 2)
+    groups: dict[tuple[int, int], list[int]] = {}
+    for i, (h, w) in enumerate(flat_sizes.tolist()):
+        groups.setdefault((h, w), []).append(i)
+    return [(size, torch.tensor(idx, device=view_sizes.device)) for size, idx in groups.items()]
+
+
+def crop_view_tokens(
+    tokens: torch.Tensor, idx: torch.Tensor, grid_hw: tuple[int, int], canvas_hw: tuple[int, int]
+) -> torch.Tensor:
+    """
+    Patch tokens of the valid region of some views.
+
+    Args:
+        tokens: Patch tokens (B, S, Hc * Wc, C) on the canvas patch grid
+        idx: Indices into the flattened B * S views
+        grid_hw: Valid patch grid (h, w) of the selected views
+        canvas_hw: Canvas patch grid (Hc, Wc)
+
+    Returns:
+        Patch tokens of shape (1, len(idx), h * w, C)
+    """
+    h, w = grid_hw
+    tokens = tokens.flatten(0, 1)[idx].unflatten(1, canvas_hw)
+    return tokens[:, :h, :w].flatten(1, 2)[None]
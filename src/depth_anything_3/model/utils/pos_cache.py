@@ -0,0 +1,109 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Shared cache for resolution-dependent positional tensors.
+
+The interpolated backbone position embedding, the UV embeddings of the DPT heads and the
+RoPE frequency tables only depend on the input resolution, so they are computed once per
+(H, W, device, dtype) and reused by later forward passes. All components share one cache
+with bounded LRU eviction, so that running many different resolutions does not grow
+memory without bound.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+import torch
+
+DEFAULT_MAX_ENTRIES = 64
+
+
+class PositionalCache:
+    """
+    Thread-safe LRU cache of tensors.
+
+    Keys are ``(name, H, W, device, dtype, *extra)`` tuples, where ``name`` identifies the
+    component and ``extra`` holds the remaining parameters the value depends on.
+
+    Args:
+        max_entries: Maximum number of cached values, the least recently used one is
+            evicted first
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be positive, got {max_entries}")
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self,
+        name: str,
+        H: int,
+        W: int,
+        device: torch.device,
+        dtype: Optional[torch.dtype],
+        compute_fn: Callable[[], Any],
+        *extra: Hashable,
+    ) -> Any:
+        """
+        Return the cached value for the key, computing and inserting it on a miss.
+
+        Args:
+            name: Name of the component
+            H, W: Resolution the value was computed for
+            device, dtype: Device and dtype of the value
+            compute_fn: Called without arguments to compute the value on a miss
+            *extra: Additional hashable key components
+
+        Returns:
+            The cached or newly computed value
+        """
+        if torch.compiler.is_compiling():
+            # Values are constant-folded into the compiled graph
+            return compute_fn()
+        # Tensors created in inference mode cannot be used by autograd, keep them apart
+        key = (name, H, W, torch.device(device), dtype, torch.is_inference_mode_enabled(), *extra)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = compute_fn()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def resize(self, max_entries: int) -> None:
+        """Change the capacity, evicting the least recently used values if needed."""
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be positive, got {max_entries}")
+        with self._lock:
+            self.max_entries = max_entries
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+POSITIONAL_CACHE = PositionalCache()
@@ -181,10 +181,34 @@ def standardize_quaternion(quaternions: torch.Tensor) -> torch.Tensor:
     return torch.where(quaternions[..., 3:4] < 0, -quaternions, quaternions)
 
 
+def quat_multiply(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    """
+    Hamilton product of quaternions, composing the rotation of ``b`` followed by ``a``.
+
+    Args:
+        a: Quaternions with real part last, shape (..., 4)
+        b: Quaternions with real part last, broadcastable with ``a``
+
+    Returns:
+        Quaternions with real part last, shape of the broadcast inputs
+    """
+    ax, ay, az, aw = torch.unbind(a, -1)
+    bx, by, bz, bw = torch.unbind(b, -1)
+    return torch.stack(
+        (
+            aw * bx + ax * bw + ay * bz - az * by,
+            aw * by - ax * bz + ay * bw + az * bx,
+            aw * bz + ax * by - ay * bx + az * bw,
+            aw * bw - ax * bx - ay * by - az * bz,
+        ),
+        -1,
+    )
+
+
 def cam_quat_xyzw_to_world_quat_wxyz(cam_quat_xyzw, c2w):
     # cam_quat_xyzw: (b, n, 4) in xyzw
-    # c2w: (b, n, 4, 4)
-    b, n = cam_quat_xyzw.shape[:2]
+    # c2w: (b, n, 4, 4), or any shape broadcastable with it, e.g. (b, v, 1, 4, 4) per view
+    # for quaternions of shape (b, v, n, 4)
     # 1. xyzw -> wxyz
     cam_quat_wxyz = torch.cat(
         [
@@ -195,14 +219,10 @@ def cam_quat_xyzw_to_world_quat_wxyz(cam_quat_xyzw, c2w):
         ],
         dim=-1,
     )
-    # 2. Quaternion to matrix
-    cam_quat_wxyz_flat = cam_quat_wxyz.reshape(-1, 4)
-    rotmat_cam = quat_to_mat(cam_quat_wxyz_flat).reshape(b, n, 3, 3)
-    # 3. Transform to world space
-    rotmat_c2w = c2w[..., :3, :3]
-    rotmat_world = torch.matmul(rotmat_c2w, rotmat_cam)
-    # 4. Matrix to quaternion (wxyz)
-    rotmat_world_flat = rotmat_world.reshape(-1, 3, 3)
-    world_quat_wxyz_flat = mat_to_quat(rotmat_world_flat)
-    world_quat_wxyz = world_quat_wxyz_flat.reshape(b, n, 4)
-    return world_quat_wxyz
+    # 2. Transform to world space by composing with the rotation of c2w, which equals
+    # mat_to_quat(c2w[..., :3, :3] @ quat_to_mat(cam_quat_wxyz)) without a rotation matrix
+    # per quaternion
+    c2w_quat = mat_to_quat(c2w[..., :3, :3])
+    cam_quat_wxyz = cam_quat_wxyz / cam_quat_wxyz.norm(dim=-1, keepdim=True)
+    world_quat_wxyz = quat_multiply(c2w_quat, cam_quat_wxyz)
+    return standardize_quaternion(world_quat_wxyz)
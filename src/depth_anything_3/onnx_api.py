@@ -0,0 +1,161 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+onnxruntime execution backend.
+
+Runs a graph exported with ``DepthAnything3.export_onnx`` through the same input and
+output processing as ``DepthAnything3.inference``, without loading the PyTorch weights.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from typing import Sequence
+import numpy as np
+import torch
+from addict import Dict
+from PIL import Image
+
+from depth_anything_3.specs import Prediction
+from depth_anything_3.utils.constants import ONNX_INPUT_NAME
+from depth_anything_3.utils.io.input_processor import InputProcessor
+from depth_anything_3.utils.io.output_processor import OutputProcessor
+from depth_anything_3.utils.logger import logger
+from depth_anything_3.utils.prediction_helpers import (
+    add_processed_images,
+    align_to_input_extrinsics_intrinsics,
+    process_mono_sky_estimation,
+)
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+
+class OnnxDepthAnything3:
+    """
+    Depth Anything 3 inference with onnxruntime.
+
+    The exported graph predicts depth, confidence and, for models with a camera decoder,
+    camera poses. It is not conditioned on input cameras: input extrinsics/intrinsics are
+    only used to align the predictions, and the ray-pose and 3DGS branches are not
+    available.
+
+    Usage:
+        model = OnnxDepthAnything3("da3-large.onnx")
+        prediction = model.inference(images)
+
+    Args:
+        model_path: Path of the .onnx file
+        providers: onnxruntime execution providers, defaults to CPUExecutionProvider
+        num_threads: Number of intra-op threads (None: onnxruntime default)
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        providers: Sequence[str] | None = None,
+        num_threads: int | None = None,
+    ):
+        if ort is None:
+            raise ImportError(
+                "Dependency `onnxruntime` is required for ONNX inference. "
+                "Install via: pip install onnxruntime"
+            )
+        options = ort.SessionOptions()
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            model_path, options, providers=list(providers or ["CPUExecutionProvider"])
+        )
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.output_names = json.loads(metadata["output_names"])
+        self.patch_size = int(metadata.get("patch_size", InputProcessor.PATCH_SIZE))
+        self.input_processor = InputProcessor()
+        self.output_processor = OutputProcessor()
+
+    def forward(self, image: np.ndarray) -> dict[str, np.ndarray]:
+        """
+        Run the exported graph.
+
+        Args:
+            image: Normalized input batch (B, N, 3, H, W), H and W multiples of the patch size
+
+        Returns:
+            Dictionary of graph outputs, e.g. depth, depth_conf, extrinsics, intrinsics
+        """
+        outputs = self.session.run(
+            self.output_names, {ONNX_INPUT_NAME: np.ascontiguousarray(image, dtype=np.float32)}
+        )
+        return dict(zip(self.output_names, outputs))
+
+    def inference(
+        self,
+        image: list[np.ndarray | Image.Image | str],
+        extrinsics: np.ndarray | None = None,
+        intrinsics: np.ndarray | None = None,
+        align_to_input_ext_scale: bool = True,
+        process_res: int = 504,
+        process_res_method: str = "upper_bound_resize",
+        export_dir: str | None = None,
+        export_format: str = "mini_npz",
+        export_kwargs: dict | None = None,
+    ) -> Prediction:
+        """
+        Run inference on input images.
+
+        Args:
+            image: List of input images (numpy arrays, PIL Images, or file paths)
+            extrinsics: Camera extrinsics (N, 4, 4) the predictions are aligned to
+            intrinsics: Camera intrinsics (N, 3, 3)
+            align_to_input_ext_scale: whether to align the input pose scale to the prediction
+            process_res: Processing resolution
+            process_res_method: Resize method for processing
+            export_dir: Directory to export results
+            export_format: Export format (mini_npz, npz, glb, ply, depth_vis, ...)
+            export_kwargs: additional arguments to export functions.
+
+        Returns:
+            Prediction object containing depth maps and camera parameters
+        """
+        if "gs" in export_format:
+            raise ValueError("3DGS exports are not available with the ONNX backend")
+        imgs_cpu, extrinsics, intrinsics = self.input_processor(
+            image,
+            extrinsics.copy() if extrinsics is not None else None,
+            intrinsics.copy() if intrinsics is not None else None,
+            process_res,
+            process_res_method,
+        )
+
+        start_time = time.time()
+        raw_output = self.forward(imgs_cpu[None].numpy())
+        logger.info(f"ONNX Forward Pass Done. Time: {time.time() - start_time} seconds")
+
+        output = Dict({k: torch.from_numpy(v) for k, v in raw_output.items()})
+        output = process_mono_sky_estimation(output)
+        prediction = self.output_processor(output)
+        prediction = align_to_input_extrinsics_intrinsics(
+            extrinsics, intrinsics, prediction, align_to_input_ext_scale
+        )
+        prediction = add_processed_images(prediction, imgs_cpu)
+
+        if export_dir is not None:
+            # The exporters import the Gaussian renderer, which loads the model package
+            from depth_anything_3.utils.export import export
+
+            export(prediction, export_format, export_dir, **(export_kwargs or {}))
+        return prediction
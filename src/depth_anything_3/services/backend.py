@@ -34,7 +34,9 @@ from fastapi.responses import FileResponse, HTMLResponse
 from pydantic import BaseModel
 
 from ..api import DepthAnything3
+from ..utils.device import resolve_device
 from ..utils.memory import (
+    get_cpu_memory_info,
     get_gpu_memory_info,
     cleanup_cuda_memory,
     check_memory_availability,
@@ -96,9 +98,17 @@ class TaskStatus(BaseModel):
 class ModelBackend:
     """Model backend service with persistent model loading."""
 
-    def __init__(self, model_dir: str, device: str = "cuda"):
+    def __init__(
+        self,
+        model_dir: str,
+        device: str = "auto",
+        compile_cache_dir: Optional[str] = None,
+        num_threads: Optional[int] = None,
+    ):
         self.model_dir = model_dir
-        self.device = device
+        self.device = resolve_device(device)
+        self.compile_cache_dir = compile_cache_dir
+        self.num_threads = num_threads
         self.model = None
         self.model_loaded = False
         self.load_time = None
@@ -119,6 +129,12 @@ class ModelBackend:
 
             self.model = DepthAnything3.from_pretrained(self.model_dir).to(self.device)
             self.model.eval()
+            if self.device == "cpu":
+                self.model.configure_cpu(num_threads=self.num_threads)
+            if self.compile_cache_dir:
+                # Buckets built by `da3 warmup` load from the cache instead of compiling
+                self.model.enable_compile(self.compile_cache_dir)
+                self.model.warmup()
 
             self.model_loaded = True
             self.load_time = time.time() - start_time
@@ -231,7 +247,7 @@ def _run_inference_task(task_id: str):
 
         # Check memory availability
         estimated_memory = estimate_memory_requirement(num_images, request.process_res)
-        mem_available, mem_msg = check_memory_availability(estimated_memory)
+        mem_available, mem_msg = check_memory_availability(estimated_memory, _backend.device)
         print(f"[{task_id}] {mem_msg}")
 
         if not mem_available:
@@ -241,10 +257,10 @@ def _run_inference_task(task_id: str):
             time.sleep(0.5)  # Give system time to reclaim memory
 
             # Check again
-            mem_available, mem_msg = check_memory_availability(estimated_memory)
+            mem_available, mem_msg = check_memory_availability(estimated_memory, _backend.device)
             if not mem_available:
                 raise RuntimeError(
-                    f"Insufficient GPU memory after cleanup. {mem_msg}\n"
+                    f"Insufficient memory after cleanup. {mem_msg}\n"
                     f"Suggestions:\n"
                     f"  1. Reduce process_res (current: {request.process_res})\n"
                     f"  2. Process fewer images at once (current: {num_images})\n"
@@ -556,11 +572,17 @@ def build_group_manifest(root_dir: str, group: str) -> dict:
     return {"group": group, "items": items}
 
 
-def create_app(model_dir: str, device: str = "cuda", gallery_dir: Optional[str] = None) -> FastAPI:
+def create_app(
+    model_dir: str,
+    device: str = "auto",
+    gallery_dir: Optional[str] = None,
+    compile_cache_dir: Optional[str] = None,
+    num_threads: Optional[int] = None,
+) -> FastAPI:
     """Create FastAPI application with model backend."""
     global _backend, _app
 
-    _backend = ModelBackend(model_dir, device)
+    _backend = ModelBackend(model_dir, device, compile_cache_dir, num_threads)
     _app = FastAPI(
         title="Depth Anything 3 Backend",
         description="Model inference service for Depth Anything 3",
@@ -1173,6 +1195,17 @@ def create_app(model_dir: str, device: str = "cuda", gallery_dir: Optional[str]
         else:
             status["gpu_memory"] = None
 
+        # Host RAM bounds CPU inference
+        cpu_memory = get_cpu_memory_info()
+        if cpu_memory:
+            status["cpu_memory"] = {
+                "total_gb": round(cpu_memory["total_gb"], 2),
+                "free_gb": round(cpu_memory["free_gb"], 2),
+                "utilization_percent": round(cpu_memory["utilization"], 1),
+            }
+        else:
+            status["cpu_memory"] = None
+
         return status
 
     @_app.post("/inference", response_model=InferenceResponse)
@@ -1370,17 +1403,19 @@ def create_app(model_dir: str, device: str = "cuda", gallery_dir: Optional[str]
 
 def start_server(
     model_dir: str,
-    device: str = "cuda",
+    device: str = "auto",
     host: str = "127.0.0.1",
     port: int = 8000,
     gallery_dir: Optional[str] = None,
+    compile_cache_dir: Optional[str] = None,
+    num_threads: Optional[int] = None,
 ):
     """Start the backend server."""
-    app = create_app(model_dir, device, gallery_dir)
+    app = create_app(model_dir, device, gallery_dir, compile_cache_dir, num_threads)
 
     print("Starting Depth Anything 3 Backend...")
     print(f"Model directory: {model_dir}")
-    print(f"Device: {device}")
+    print(f"Device: {resolve_device(device)}")
     print(f"Server: http://{host}:{port}")
     print(f"Dashboard: http://{host}:{port}/dashboard")
     print(f"API Status: http://{host}:{port}/status")
@@ -1408,10 +1443,20 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Depth Anything 3 Backend Server")
     parser.add_argument("--model-dir", required=True, help="Model directory path")
-    parser.add_argument("--device", default="cuda", help="Device to use")
+    parser.add_argument("--device", default="auto", help="Device to use (auto, cuda, cpu)")
     parser.add_argument("--host", default="127.0.0.1", help="Host to bind to")
     parser.add_argument("--port", type=int, default=8000, help="Port to bind to")
     parser.add_argument("--gallery-dir", help="Gallery directory path (optional)")
+    parser.add_argument("--compile-cache-dir", help="Compile plan/artifact directory (optional)")
+    parser.add_argument("--num-threads", type=int, help="CPU threads of the forward pass")
 
     args = parser.parse_args()
-    start_server(args.model_dir, args.device, args.host, args.port, args.gallery_dir)
+    start_server(
+        args.model_dir,
+        args.device,
+        args.host,
+        args.port,
+        args.gallery_dir,
+        args.compile_cache_dir,
+        args.num_threads,
+    )
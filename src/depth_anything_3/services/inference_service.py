@@ -23,14 +23,16 @@ import requests
 import typer
 
 from ..api import DepthAnything3
+from ..utils.device import resolve_device
 
 
 class InferenceService:
     """Unified inference service class"""
 
-    def __init__(self, model_dir: str, device: str = "cuda"):
+    def __init__(self, model_dir: str, device: str = "auto", num_threads: Optional[int] = None):
         self.model_dir = model_dir
-        self.device = device
+        self.device = resolve_device(device)
+        self.num_threads = num_threads
         self.model = None
 
     def load_model(self):
@@ -38,6 +40,8 @@ class InferenceService:
         if self.model is None:
             typer.echo(f"Loading model from {self.model_dir}...")
             self.model = DepthAnything3.from_pretrained(self.model_dir).to(self.device)
+            if self.device == "cpu":
+                self.model.configure_cpu(num_threads=self.num_threads)
         return self.model
 
     def run_local_inference(
@@ -180,7 +184,8 @@ def run_inference(
     image_paths: List[str],
     export_dir: str,
     model_dir: str,
-    device: str = "cuda",
+    device: str = "auto",
+    num_threads: Optional[int] = None,
     backend_url: Optional[str] = None,
     export_format: str = "mini_npz-glb",
     process_res: int = 504,
@@ -198,7 +203,7 @@ def run_inference(
 ) -> Union[Any, Dict[str, Any]]:
     """Unified inference interface"""
 
-    service = InferenceService(model_dir, device)
+    service = InferenceService(model_dir, device, num_threads)
 
     if backend_url:
         return service.run_backend_inference(
@@ -0,0 +1,98 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Streaming inference session.
+
+A session keeps the global-attention keys/values of the frames it has already processed,
+so that frames of a live capture can be appended without re-running earlier frames.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+import numpy as np
+from PIL import Image
+
+from depth_anything_3.model.streaming import StreamingState
+from depth_anything_3.specs import Prediction
+from depth_anything_3.utils.prediction_helpers import add_processed_images
+
+if TYPE_CHECKING:
+    from depth_anything_3.api import DepthAnything3
+
+
+class StreamingSession:
+    """
+    Stateful session for incremental multi-view inference.
+
+    Created by ``DepthAnything3.open_session()``. Every call to ``add_frames`` runs the
+    backbone and the heads on the new frames only; in the global blocks the new frames
+    attend to the cached tokens of all earlier frames of the session. Predictions of
+    every call are expressed in the coordinate frame of the first frame of the session.
+
+    Usage:
+        session = model.open_session()
+        for frame in stream:
+            prediction = session.add_frames([frame])
+    """
+
+    def __init__(
+        self,
+        model: DepthAnything3,
+        infer_gs: bool = False,
+        use_ray_pose: bool = False,
+        process_res: int = 504,
+        process_res_method: str = "upper_bound_resize",
+        max_cached_views: int | None = None,
+    ):
+        self.model = model
+        self.infer_gs = infer_gs
+        self.use_ray_pose = use_ray_pose
+        self.process_res = process_res
+        self.process_res_method = process_res_method
+        self.state = StreamingState(max_cached_views=max_cached_views)
+
+    @property
+    def num_frames(self) -> int:
+        """Number of frames processed in this session."""
+        return self.state.num_views
+
+    def add_frames(self, images: list[np.ndarray | Image.Image | str]) -> Prediction:
+        """
+        Append frames to the session and predict them.
+
+        Args:
+            images: List of new frames (numpy arrays, PIL Images, or file paths)
+
+        Returns:
+            Prediction for the new frames only
+        """
+        imgs_cpu, _, _, _ = self.model._preprocess_inputs(
+            images, None, None, self.process_res, self.process_res_method
+        )
+        imgs, _, _ = self.model._prepare_model_inputs(imgs_cpu, None, None)
+        raw_output = self.model._run_model_forward(
+            imgs,
+            None,
+            None,
+            infer_gs=self.infer_gs,
+            use_ray_pose=self.use_ray_pose,
+            stream_state=self.state,
+        )
+        prediction = self.model._convert_to_prediction(raw_output)
+        return add_processed_images(prediction, imgs_cpu)
+
+    def reset(self) -> None:
+        """Drop all cached frames; the next frame becomes the new reference view."""
+        self.state.reset()
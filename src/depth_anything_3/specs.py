@@ -33,7 +33,7 @@ class Gaussians:
 
 @dataclass
 class Prediction:
-    depth: np.ndarray  # N, H, W
+    depth: np.ndarray | None  # N, H, W - None if not selected in ``outputs``
     is_metric: int
     sky: np.ndarray | None = None  # N, H, W
     conf: np.ndarray | None = None  # N, H, W
@@ -43,3 +43,7 @@ class Prediction:
     gaussians: Gaussians | None = None  # 3D gaussians
     aux: dict[str, Any] = None  #
     scale_factor: Optional[float] = None  # metric scale
+    ref_view_idx: Optional[int] = None  # selected reference view, None if not selected
+    view_sizes: Optional[np.ndarray] = None  # N, 2 - valid (H, W) of padded views, top-left
+    ray: np.ndarray | None = None  # N, h, w, 6 - raw ray maps, only if "rays" is selected
+    ray_conf: np.ndarray | None = None  # N, h, w
@@ -17,3 +17,4 @@ DEFAULT_EXPORT_DIR = "workspace/gallery/scene"
 DEFAULT_GALLERY_DIR = "workspace/gallery"
 DEFAULT_GRADIO_DIR = "workspace/gradio"
 THRESH_FOR_REF_SELECTION = 3
+ONNX_INPUT_NAME = "image"
@@ -0,0 +1,133 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Device selection, autocast precision and CPU threading helpers.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Iterator
+import torch
+import torch.nn as nn
+
+from depth_anything_3.utils.logger import logger
+
+CPU_STAGES = ("preprocess", "forward", "export")
+
+
+def resolve_device(device: str | torch.device | None = "auto") -> str:
+    """
+    Resolve a device option, mapping "auto" (or None) to CUDA when available, else CPU.
+
+    Args:
+        device: Device string such as "auto", "cpu", "cuda" or "cuda:1"
+
+    Returns:
+        Device string accepted by ``torch.device``
+    """
+    if device is None or str(device) == "auto":
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    return str(device)
+
+
+def cpu_supports_bf16() -> bool:
+    """Whether the CPU has native bf16 matmuls (AMX or AVX512-BF16)."""
+    try:
+        return torch.cpu._is_amx_tile_supported() or torch.cpu._is_avx512_bf16_supported()
+    except AttributeError:
+        # Older PyTorch: no capability query, stay in fp32
+        return False
+
+
+def get_autocast_dtype(device_type: str, cpu_bf16: bool | None = None) -> torch.dtype | None:
+    """
+    Autocast dtype of the forward pass on ``device_type``.
+
+    Args:
+        device_type: torch device type, e.g. "cuda" or "cpu"
+        cpu_bf16: Force bf16 (True) or fp32 (False) on CPU. None detects native bf16 support.
+
+    Returns:
+        bf16/fp16 on accelerators, bf16 on CPUs with native bf16 support, None (fp32,
+        autocast disabled) otherwise
+    """
+    if device_type == "cpu":
+        use_bf16 = cpu_supports_bf16() if cpu_bf16 is None else cpu_bf16
+        return torch.bfloat16 if use_bf16 else None
+    if device_type == "cuda" and torch.cuda.is_bf16_supported():
+        return torch.bfloat16
+    return torch.float16
+
+
+@contextmanager
+def cpu_threads(num_threads: int | None) -> Iterator[None]:
+    """
+    Temporarily set the number of intra-op CPU threads.
+
+    Args:
+        num_threads: Number of threads, None keeps the current setting
+    """
+    if num_threads is None:
+        yield
+        return
+    previous = torch.get_num_threads()
+    torch.set_num_threads(num_threads)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(previous)
+
+
+def set_interop_threads(num_threads: int) -> bool:
+    """
+    Set the number of inter-op CPU threads.
+
+    PyTorch only accepts this before the first parallel operation of the process.
+
+    Args:
+        num_threads: Number of inter-op threads
+
+    Returns:
+        Whether the setting was applied
+    """
+    if torch.get_num_interop_threads() == num_threads:
+        return True
+    try:
+        torch.set_num_interop_threads(num_threads)
+        return True
+    except RuntimeError as e:
+        logger.warn(f"Could not set inter-op threads to {num_threads}: {e}")
+        return False
+
+
+def convs_to_channels_last(module: nn.Module) -> int:
+    """
+    Store the weights of all 2D convolutions of ``module`` in channels_last format.
+
+    oneDNN then runs these convolutions, and the ones consuming their outputs, in NHWC
+    layout without reordering activations at every layer.
+
+    Args:
+        module: Module to convert in place
+
+    Returns:
+        Number of converted convolutions
+    """
+    num_converted = 0
+    for m in module.modules():
+        if isinstance(m, (nn.Conv2d, nn.ConvTranspose2d)):
+            m.to(memory_format=torch.channels_last)
+            num_converted += 1
+    return num_converted
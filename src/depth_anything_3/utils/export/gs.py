@@ -14,20 +14,26 @@
 
 import os
 from typing import Literal, Optional
-import moviepy.editor as mpy
 import torch
 
-from depth_anything_3.model.utils.gs_renderer import run_renderer_in_chunk_w_trj_mode
+from depth_anything_3.model.utils.gs_renderer import iter_renderer_in_chunk_w_trj_mode
 from depth_anything_3.specs import Prediction
+from depth_anything_3.utils.gs_simplify_helpers import simplify_gaussians
 from depth_anything_3.utils.gsply_helpers import save_gaussian_ply
 from depth_anything_3.utils.layout_helpers import hcat, vcat
-from depth_anything_3.utils.visualize import vis_depth_map_tensor
+from depth_anything_3.utils.splat_helpers import save_gaussian_splat, save_gaussian_spz
+from depth_anything_3.utils.visualize import depth_map_log_range, vis_depth_map_tensor
 
-VIDEO_QUALITY_MAP = {
-    "low": {"crf": "28", "preset": "veryfast"},
-    "medium": {"crf": "23", "preset": "medium"},
-    "high": {"crf": "18", "preset": "slow"},
-}
+from .video import VideoWriter, frames_to_uint8
+
+
+def _gs_export_inputs(prediction: Prediction, gs_views_interval: Optional[int]):
+    """Gaussians, input depth "v h w 1" and view interval shared by the 3DGS file exports."""
+    gs_world = prediction.gaussians
+    pred_depth = torch.from_numpy(prediction.depth).unsqueeze(-1).to(gs_world.means)  # v h w 1
+    if gs_views_interval is None:  # select around 12 views in total
+        gs_views_interval = max(pred_depth.shape[0] // 12, 1)
+    return gs_world, pred_depth, gs_views_interval
 
 
 def export_to_gs_ply(
@@ -36,14 +42,12 @@ def export_to_gs_ply(
     gs_views_interval: Optional[
         int
     ] = 1,  # export GS every N views, useful for extremely dense inputs
+    simplify: Optional[dict] = None,  # kwargs of simplify_gaussians, e.g. a splat budget
 ):
-    gs_world = prediction.gaussians
-    pred_depth = torch.from_numpy(prediction.depth).unsqueeze(-1).to(gs_world.means)  # v h w 1
+    gs_world, pred_depth, gs_views_interval = _gs_export_inputs(prediction, gs_views_interval)
     idx = 0
     os.makedirs(os.path.join(export_dir, "gs_ply"), exist_ok=True)
     save_path = os.path.join(export_dir, f"gs_ply/{idx:04d}.ply")
-    if gs_views_interval is None:  # select around 12 views in total
-        gs_views_interval = max(pred_depth.shape[0] // 12, 1)
     save_gaussian_ply(
         gaussians=gs_world,
         save_path=save_path,
@@ -55,6 +59,45 @@ def export_to_gs_ply(
         prune_by_depth_percent=0.9,
         prune_border_gs=True,
         match_3dgs_mcmc_dev=False,
+        simplify=simplify,
+    )
+
+
+def export_to_gs_splat(
+    prediction: Prediction,
+    export_dir: str,
+    gs_views_interval: Optional[int] = 1,  # export GS every N views, as for gs_ply
+    simplify: Optional[dict] = None,  # kwargs of simplify_gaussians, as for gs_ply
+):
+    gs_world, pred_depth, gs_views_interval = _gs_export_inputs(prediction, gs_views_interval)
+    save_gaussian_splat(
+        gaussians=gs_world,
+        save_path=os.path.join(export_dir, "gs_splat/0000.splat"),
+        ctx_depth=pred_depth,
+        gs_views_interval=gs_views_interval,
+        prune_by_depth_percent=0.9,
+        prune_border_gs=True,
+        simplify=simplify,
+    )
+
+
+def export_to_gs_spz(
+    prediction: Prediction,
+    export_dir: str,
+    gs_views_interval: Optional[int] = 1,  # export GS every N views, as for gs_ply
+    sh_degree: int = 0,  # SH bands to keep, up to 3
+    simplify: Optional[dict] = None,  # kwargs of simplify_gaussians, as for gs_ply
+):
+    gs_world, pred_depth, gs_views_interval = _gs_export_inputs(prediction, gs_views_interval)
+    save_gaussian_spz(
+        gaussians=gs_world,
+        save_path=os.path.join(export_dir, "gs_spz/0000.spz"),
+        ctx_depth=pred_depth,
+        gs_views_interval=gs_views_interval,
+        prune_by_depth_percent=0.9,
+        prune_border_gs=True,
+        sh_degree=sh_degree,
+        simplify=simplify,
     )
 
 
@@ -80,17 +123,20 @@ def export_to_gs_video(
     enable_tqdm: Optional[bool] = True,
     output_name: Optional[str] = None,
     video_quality: Literal["low", "medium", "high"] = "high",
+    simplify: Optional[dict] = None,  # kwargs of simplify_gaussians, as for gs_ply
 ) -> None:
     gs_world = prediction.gaussians
+    if simplify is not None:
+        gs_world = simplify_gaussians(gs_world, **simplify)
+    # metric predictions are scaled, the Gaussians are not
+    scale_factor = prediction.scale_factor if prediction.is_metric else None
     # if target poses are not provided, render the (smooth/interpolate) input poses
     if extrinsics is not None:
         tgt_extrs = extrinsics
     else:
         tgt_extrs = torch.from_numpy(prediction.extrinsics).unsqueeze(0).to(gs_world.means)
-        if prediction.is_metric:
-            scale_factor = prediction.scale_factor
-            if scale_factor is not None:
-                tgt_extrs[:, :, :3, 3] /= scale_factor
+        if scale_factor is not None:
+            tgt_extrs[:, :, :3, 3] /= scale_factor
     tgt_intrs = (
         intrinsics
         if intrinsics is not None
@@ -106,7 +152,8 @@ def export_to_gs_video(
         trj_mode = "wander"
         # trj_mode = "dolly_zoom"
 
-    color, depth = run_renderer_in_chunk_w_trj_mode(
+    # frames are encoded chunk by chunk, so only chunk_size views are held at a time
+    chunks = iter_renderer_in_chunk_w_trj_mode(
         gaussians=gs_world,
         extrinsics=tgt_extrs,
         intrinsics=tgt_intrs,
@@ -117,38 +164,34 @@ def export_to_gs_video(
         color_mode=color_mode,
         enable_tqdm=enable_tqdm,
     )
-
-    # save as video
-    ffmpeg_params = [
-        "-crf",
-        VIDEO_QUALITY_MAP[video_quality]["crf"],
-        "-preset",
-        VIDEO_QUALITY_MAP[video_quality]["preset"],
-        "-pix_fmt",
-        "yuv420p",
-    ]  # best compatibility
-
-    os.makedirs(os.path.join(export_dir, "gs_video"), exist_ok=True)
-    for idx in range(color.shape[0]):
-        video_i = color[idx]
-        if vis_depth is not None:
-            depth_i = vis_depth_map_tensor(depth[0])
-            cat_fn = hcat if vis_depth == "hcat" else vcat
-            video_i = torch.stack([cat_fn(c, d) for c, d in zip(video_i, depth_i)])
-        frames = list(
-            (video_i.clamp(0, 1) * 255).byte().permute(0, 2, 3, 1).cpu().numpy()
-        )  # T x H x W x C, uint8, numpy()
-
-        fps = 24
-        clip = mpy.ImageSequenceClip(frames, fps=fps)
-        output_name = f"{idx:04d}_{trj_mode}" if output_name is None else output_name
-        save_path = os.path.join(export_dir, f"gs_video/{output_name}.mp4")
-        # clip.write_videofile(save_path, codec="libx264", audio=False, bitrate="4000k")
-        clip.write_videofile(
-            save_path,
-            codec="libx264",
-            audio=False,
-            fps=fps,
-            ffmpeg_params=ffmpeg_params,
-        )
+    # the depth color range is fixed for the whole video. The input-view depths see the
+    # scene the trajectory is built around, and are available before the first frame
+    depth_range = None
+    if vis_depth is not None and prediction.depth is not None:
+        input_depth = torch.from_numpy(prediction.depth).to(gs_world.means)
+        if scale_factor is not None:
+            input_depth = input_depth / scale_factor
+        depth_range = depth_map_log_range(input_depth)
+    writers = []
+    depth_ranges = []
+    try:
+        for color, depth in chunks:
+            if not writers:
+                for idx in range(color.shape[0]):
+                    name = f"{idx:04d}_{trj_mode}" if output_name is None else output_name
+                    save_path = os.path.join(export_dir, f"gs_video/{name}.mp4")
+                    writers.append(VideoWriter(save_path, fps=24, video_quality=video_quality))
+                    # without input depths, fall back to the range of the first chunk
+                    if vis_depth is not None:
+                        depth_ranges.append(depth_range or depth_map_log_range(depth[idx]))
+            for idx, writer in enumerate(writers):
+                video_i = color[idx]
+                if vis_depth is not None:
+                    depth_i = vis_depth_map_tensor(depth[idx], log_range=depth_ranges[idx])
+                    cat_fn = hcat if vis_depth == "hcat" else vcat
+                    video_i = torch.stack([cat_fn(c, d) for c, d in zip(video_i, depth_i)])
+                writer.write(frames_to_uint8(video_i))
+    finally:
+        for writer in writers:
+            writer.close()
     return
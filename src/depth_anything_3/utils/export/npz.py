@@ -34,11 +34,10 @@ def export_to_npz(
     image = prediction.processed_images  # (N,H,W,3) uint8
 
     # Build save dict with only non-None values
-    save_dict = {
-        "image": image,
-        "depth": np.round(prediction.depth, 6),
-    }
+    save_dict = {"image": image}
 
+    if prediction.depth is not None:
+        save_dict["depth"] = np.round(prediction.depth, 6)
     if prediction.conf is not None:
         save_dict["conf"] = np.round(prediction.conf, 2)
     if prediction.extrinsics is not None:
@@ -59,10 +58,10 @@ def export_to_mini_npz(
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
 
     # Build save dict with only non-None values
-    save_dict = {
-        "depth": np.round(prediction.depth, 6),
-    }
+    save_dict = {}
 
+    if prediction.depth is not None:
+        save_dict["depth"] = np.round(prediction.depth, 6)
     if prediction.conf is not None:
         save_dict["conf"] = np.round(prediction.conf, 2)
     if prediction.extrinsics is not None:
@@ -0,0 +1,213 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Simplification of pixel-aligned Gaussians before export and rendering.
+
+Every pixel of every view predicts a Gaussian, so overlapping views place near-duplicate
+Gaussians on the same surface. ``simplify_gaussians`` drops Gaussians that barely
+contribute, merges the Gaussians sharing a voxel into one with the same first and second
+moments, and coarsens the voxels until an optional budget of Gaussians is met.
+"""
+
+import math
+from typing import Optional
+import torch
+from torch import Tensor
+
+from depth_anything_3.model.utils.transform import mat_to_quat, quat_to_mat
+from depth_anything_3.specs import Gaussians
+from depth_anything_3.utils.logger import logger
+
+GAUSSIAN_FIELDS = ("means", "scales", "rotations", "harmonics", "opacities")
+
+# Default voxel edge relative to the median of the largest scale of the Gaussians
+VOXEL_SIZE_SCALE_RATIO = 0.5
+
+# Voxel coarsening steps tried to meet a budget before falling back to top-k selection
+MAX_BUDGET_STEPS = 8
+
+
+def contribution_score(scales: Tensor, opacities: Tensor) -> Tensor:
+    """Opacity times the largest cross-section of each Gaussian, a proxy of its image footprint."""
+    sorted_scales = scales.sort(dim=-1, descending=True).values
+    return opacities * sorted_scales[..., 0] * sorted_scales[..., 1]
+
+
+def _voxel_keys(means: Tensor, voxel_size: float) -> Tensor:
+    """One int64 key per occupied voxel, compacted to 0..num_voxels-1."""
+    coords = torch.floor(means / voxel_size).long()
+    coords = coords - coords.min(dim=0).values
+    extent = coords.max(dim=0).values + 1
+    if math.prod(extent.tolist()) < 2**62:
+        keys = (coords[:, 0] * extent[1] + coords[:, 1]) * extent[2] + coords[:, 2]
+        return torch.unique(keys, return_inverse=True)[1]
+    return torch.unique(coords, dim=0, return_inverse=True)[1]
+
+
+def merge_in_voxels(
+    means: Tensor,  # "gaussian 3"
+    scales: Tensor,  # "gaussian 3"
+    rotations: Tensor,  # "gaussian 4", wxyz
+    harmonics: Tensor,  # "gaussian 3 d_sh"
+    opacities: Tensor,  # "gaussian"
+    voxel_size: float,
+) -> tuple[Tensor, Tensor, Tensor, Tensor, Tensor]:
+    """
+    Merge the Gaussians of each voxel by moment matching.
+
+    Members are weighted by opacity times volume. The merged mean and covariance are the
+    mean and covariance of the weighted mixture, the SH coefficients are averaged with the
+    same weights, and the opacity is the coverage of the members composited on top of each
+    other. Gaussians alone in their voxel are kept as they are.
+    """
+    keys = _voxel_keys(means, voxel_size)
+    num_voxels = int(keys.max()) + 1 if len(keys) else 0
+    counts = torch.bincount(keys, minlength=num_voxels)
+    shared = counts[keys] > 1
+    if not shared.any():
+        return means, scales, rotations, harmonics, opacities
+
+    keys = torch.unique(keys[shared], return_inverse=True)[1]
+    num_merged = int(keys.max()) + 1
+    m_means, m_scales, m_harmonics, m_opacities = (
+        means[shared].double(),
+        scales[shared].double(),
+        harmonics[shared].double(),
+        opacities[shared].double(),
+    )
+    weights = m_opacities * m_scales.prod(dim=-1) + 1e-12
+
+    def weighted_sum(x: Tensor) -> Tensor:
+        shape = (num_merged,) + x.shape[1:]
+        w = weights.view(-1, *([1] * (x.dim() - 1)))
+        return x.new_zeros(shape).index_add_(0, keys, x * w)
+
+    total = weighted_sum(torch.ones_like(weights))
+    mean = weighted_sum(m_means) / total[:, None]
+    rotmats = quat_to_mat(rotations[shared].double()[:, [1, 2, 3, 0]])  # wxyz -> xyzw
+    offsets = m_means - mean[keys]
+    covariances = (rotmats * m_scales.square()[:, None]) @ rotmats.transpose(-1, -2)
+    covariances = covariances + offsets[:, :, None] * offsets[:, None, :]
+    covariance = weighted_sum(covariances) / total[:, None, None]
+
+    eigenvalues, eigenvectors = torch.linalg.eigh(covariance)
+    # eigenvectors of a proper rotation, so that the quaternion is well defined
+    flip = torch.linalg.det(eigenvectors) < 0
+    eigenvectors[..., 2] *= 1 - 2 * flip[:, None].double()
+    merged_rotations = mat_to_quat(eigenvectors)[:, [3, 0, 1, 2]]  # xyzw -> wxyz
+    merged_scales = eigenvalues.clamp(min=1e-20).sqrt()
+    merged_harmonics = weighted_sum(m_harmonics) / total[:, None, None]
+    log_transmittance = m_opacities.new_zeros(num_merged).index_add_(
+        0, keys, torch.log1p(-m_opacities.clamp(max=0.9999))
+    )
+    merged_opacities = 1 - log_transmittance.exp()
+
+    def combine(kept: Tensor, merged: Tensor) -> Tensor:
+        return torch.cat([kept[~shared], merged.to(kept.dtype)])
+
+    return (
+        combine(means, mean),
+        combine(scales, merged_scales),
+        combine(rotations, merged_rotations),
+        combine(harmonics, merged_harmonics),
+        combine(opacities, merged_opacities),
+    )
+
+
+def simplify_scene(
+    means: Tensor,  # "gaussian 3"
+    scales: Tensor,  # "gaussian 3"
+    rotations: Tensor,  # "gaussian 4", wxyz
+    harmonics: Tensor,  # "gaussian 3 d_sh"
+    opacities: Tensor,  # "gaussian"
+    min_opacity: float = 0.005,
+    voxel_size: Optional[float] = None,
+    max_gaussians: Optional[int] = None,
+) -> tuple[Tensor, Tensor, Tensor, Tensor, Tensor]:
+    """Simplify the Gaussians of one scene, see ``simplify_gaussians``."""
+    keep = opacities >= min_opacity
+    means, scales, rotations, harmonics, opacities = (
+        x[keep] for x in (means, scales, rotations, harmonics, opacities)
+    )
+    if len(means) == 0:
+        return means, scales, rotations, harmonics, opacities
+    if voxel_size is None:
+        voxel_size = VOXEL_SIZE_SCALE_RATIO * scales.max(dim=-1).values.median().item()
+
+    simplified = merge_in_voxels(means, scales, rotations, harmonics, opacities, voxel_size)
+    for _ in range(MAX_BUDGET_STEPS):
+        if max_gaussians is None or len(simplified[0]) <= max_gaussians:
+            break
+        # surfaces hold a number of Gaussians inversely proportional to the voxel area
+        voxel_size *= max(math.sqrt(len(simplified[0]) / max_gaussians), 1.25)
+        simplified = merge_in_voxels(means, scales, rotations, harmonics, opacities, voxel_size)
+    if max_gaussians is not None and len(simplified[0]) > max_gaussians:
+        score = contribution_score(simplified[1], simplified[4])
+        top = score.topk(max_gaussians).indices
+        simplified = tuple(x[top] for x in simplified)
+    return simplified
+
+
+@torch.no_grad()
+def simplify_gaussians(
+    gaussians: Gaussians,
+    min_opacity: float = 0.005,
+    voxel_size: Optional[float] = None,
+    max_gaussians: Optional[int] = None,
+) -> Gaussians:
+    """
+    Reduce the number of Gaussians while keeping their appearance.
+
+    Args:
+        gaussians: Gaussians with opacities of shape "batch gaussian"
+        min_opacity: Gaussians below this opacity are dropped
+        voxel_size: Edge of the voxels whose Gaussians are merged, in world units; by
+            default half the median of the largest scale of the Gaussians
+        max_gaussians: Budget per scene. Voxels are coarsened until it is met, then the
+            Gaussians with the largest ``contribution_score`` are kept
+
+    Returns:
+        Simplified Gaussians. With several scenes, the smaller ones are padded with
+        transparent Gaussians to the size of the largest one.
+    """
+    assert gaussians.opacities.dim() == 2, "opacity SH are not supported"
+    scenes = []
+    for b in range(gaussians.means.shape[0]):
+        scene = simplify_scene(
+            gaussians.means[b],
+            gaussians.scales[b],
+            gaussians.rotations[b],
+            gaussians.harmonics[b],
+            gaussians.opacities[b],
+            min_opacity=min_opacity,
+            voxel_size=voxel_size,
+            max_gaussians=max_gaussians,
+        )
+        logger.info(f"Simplified {gaussians.means.shape[1]} Gaussians to {len(scene[0])}")
+        scenes.append(scene)
+
+    num_gaussians = max(max(len(scene[0]) for scene in scenes), 1)
+    batched = {}
+    for attribute, name in enumerate(GAUSSIAN_FIELDS):
+        original = getattr(gaussians, name)
+        padded = []
+        for scene in scenes:
+            x = scene[attribute]
+            padding = original[0, :1].expand(num_gaussians - len(x), *original.shape[2:])
+            if name == "opacities":
+                padding = torch.zeros_like(padding)
+            padded.append(torch.cat([x, padding]))
+        batched[name] = torch.stack(padded)
+    return Gaussians(**batched)
@@ -11,15 +11,15 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import sys
 from pathlib import Path
 from typing import Optional
-import numpy as np
 import torch
-from einops import rearrange, repeat
-from plyfile import PlyData, PlyElement
+from einops import rearrange
 from torch import Tensor
 
 from depth_anything_3.specs import Gaussians
+from depth_anything_3.utils.gs_simplify_helpers import simplify_gaussians
 
 
 def construct_list_of_attributes(num_rest: int) -> list[str]:
@@ -36,6 +36,19 @@ def construct_list_of_attributes(num_rest: int) -> list[str]:
     return attributes
 
 
+# Gaussians gathered, converted and written per chunk when streaming a PLY export
+PLY_WRITE_CHUNK_SIZE = 1 << 20
+
+
+def write_ply_header(file, num_vertices: int, attributes: list[str]) -> None:
+    """Write the header of a binary PLY file with one float32 property per attribute."""
+    lines = ["ply", f"format binary_{'little' if sys.byteorder == 'little' else 'big'}_endian 1.0"]
+    lines.append(f"element vertex {num_vertices}")
+    lines.extend(f"property float {attribute}" for attribute in attributes)
+    lines.append("end_header")
+    file.write(("\n".join(lines) + "\n").encode("ascii"))
+
+
 def export_ply(
     means: Tensor,  # "gaussian 3"
     scales: Tensor,  # "gaussian 3"
@@ -46,7 +59,15 @@ def export_ply(
     shift_and_scale: bool = False,
     save_sh_dc_only: bool = True,
     match_3dgs_mcmc_dev: Optional[bool] = False,
+    chunk_size: Optional[int] = PLY_WRITE_CHUNK_SIZE,
 ):
+    """
+    Write Gaussians to a binary PLY file in the layout of the original 3DGS code.
+
+    The attributes of each chunk of ``chunk_size`` Gaussians are concatenated into one
+    float32 matrix on the device of the inputs, copied to the host and written as raw rows,
+    so no per-Gaussian Python objects are created. None writes all Gaussians at once.
+    """
     if shift_and_scale:
         # Shift the scene so that the median Gaussian is at the origin.
         means = means - means.median(dim=0).values
@@ -56,8 +77,6 @@ def export_ply(
         means = means / scale_factor
         scales = scales / scale_factor
 
-    rotations = rotations.detach().cpu().numpy()
-
     # Since current model use SH_degree = 4,
     # which require large memory to store, we can only save the DC band to save memory.
     f_dc = harmonics[..., 0]
@@ -66,69 +85,72 @@ def export_ply(
     if match_3dgs_mcmc_dev:
         sh_degree = 3
         n_rest = 3 * (sh_degree + 1) ** 2 - 3
-        f_rest = repeat(
-            torch.zeros_like(harmonics[..., :1]), "... i -> ... (n i)", n=(n_rest // 3)
-        ).flatten(start_dim=1)
-        dtype_full = [
-            (attribute, "f4")
+        f_rest = f_rest.new_zeros(f_rest.shape[0], n_rest)
+        attributes = [
+            attribute
             for attribute in construct_list_of_attributes(num_rest=n_rest)
             if attribute not in ("nx", "ny", "nz")
         ]
     else:
-        dtype_full = [
-            (attribute, "f4")
-            for attribute in construct_list_of_attributes(
-                0 if save_sh_dc_only else f_rest.shape[1]
-            )
-        ]
-    elements = np.empty(means.shape[0], dtype=dtype_full)
-    attributes = [
-        means.detach().cpu().numpy(),
-        torch.zeros_like(means).detach().cpu().numpy(),
-        f_dc.detach().cpu().contiguous().numpy(),
-        f_rest.detach().cpu().contiguous().numpy(),
-        opacities[..., None].detach().cpu().numpy(),
-        scales.log().detach().cpu().numpy(),
+        attributes = construct_list_of_attributes(0 if save_sh_dc_only else f_rest.shape[1])
+    columns = [
+        means,
+        torch.zeros_like(means),
+        f_dc,
+        f_rest,
+        opacities[..., None],
+        scales.log(),
         rotations,
     ]
     if match_3dgs_mcmc_dev:
-        attributes.pop(1)  # dummy normal is not needed
+        columns.pop(1)  # dummy normal is not needed
     elif save_sh_dc_only:
-        attributes.pop(3)  # remove f_rest from attributes
+        columns.pop(3)  # remove f_rest from attributes
 
-    attributes = np.concatenate(attributes, axis=1)
-    elements[:] = list(map(tuple, attributes))
+    num_gaussians = means.shape[0]
+    if chunk_size is None:
+        chunk_size = max(num_gaussians, 1)
     path.parent.mkdir(exist_ok=True, parents=True)
-    PlyData([PlyElement.describe(elements, "vertex")]).write(path)
+    with open(path, "wb") as file:
+        write_ply_header(file, num_gaussians, attributes)
+        for start in range(0, num_gaussians, chunk_size):
+            rows = torch.cat(
+                [column[start : start + chunk_size].float() for column in columns], dim=1
+            )
+            file.write(rows.detach().cpu().numpy().tobytes())
 
 
 def inverse_sigmoid(x):
     return torch.log(x / (1 - x))
 
 
-def save_gaussian_ply(
+def select_gaussians_for_export(
     gaussians: Gaussians,
-    save_path: str,
     ctx_depth: torch.Tensor,  # depth of input views; for getting shape and filtering, "v h w 1"
-    shift_and_scale: bool = False,
-    save_sh_dc_only: bool = True,
     gs_views_interval: int = 1,
-    inv_opacity: Optional[bool] = True,
     prune_by_depth_percent: Optional[float] = 1.0,
     prune_border_gs: Optional[bool] = True,
-    match_3dgs_mcmc_dev: Optional[bool] = False,
-):
+    simplify: Optional[dict] = None,
+) -> Gaussians:
+    """
+    Select the pixel-aligned Gaussians kept by the 3DGS exporters.
+
+    Args:
+        gaussians: Pixel-aligned Gaussians of one scene, batch size must be 1
+        ctx_depth: Depth of the input views, giving their shape and the depth pruning
+        gs_views_interval: Keep the Gaussians of every N-th view
+        prune_by_depth_percent: Drop Gaussians beyond this depth percentile of their view
+        prune_border_gs: Drop Gaussians at the image borders, generally of lower quality
+        simplify: Keyword arguments of ``simplify_gaussians`` applied after the pruning,
+            e.g. ``{"max_gaussians": 500_000}``; None keeps the pruned Gaussians as they are
+
+    Returns:
+        Unbatched Gaussians, "gaussian ..." for every attribute
+    """
     b = gaussians.means.shape[0]
     assert b == 1, "must set batch_size=1 when exporting 3D gaussians"
     src_v, out_h, out_w, _ = ctx_depth.shape
 
-    # extract gs params
-    world_means = gaussians.means
-    world_shs = gaussians.harmonics
-    world_rotations = gaussians.rotations
-    gs_scales = gaussians.scales
-    gs_opacities = inverse_sigmoid(gaussians.opacities) if inv_opacity else gaussians.opacities
-
     # Create a mask to filter the Gaussians.
 
     # TODO: prune the sky region here
@@ -160,14 +182,53 @@ def save_gaussian_ply(
         selected_element = selected_element[::gs_views_interval][mask[::gs_views_interval]]
         return selected_element
 
+    selected = Gaussians(
+        means=trim_select_reshape(gaussians.means),
+        scales=trim_select_reshape(gaussians.scales),
+        rotations=trim_select_reshape(gaussians.rotations),
+        harmonics=trim_select_reshape(gaussians.harmonics),
+        opacities=trim_select_reshape(gaussians.opacities),
+    )
+    if simplify is not None:
+        selected = simplify_gaussians(
+            Gaussians(**{k: v[None] for k, v in vars(selected).items()}), **simplify
+        )
+        selected = Gaussians(**{k: v[0] for k, v in vars(selected).items()})
+    return selected
+
+
+def save_gaussian_ply(
+    gaussians: Gaussians,
+    save_path: str,
+    ctx_depth: torch.Tensor,  # depth of input views; for getting shape and filtering, "v h w 1"
+    shift_and_scale: bool = False,
+    save_sh_dc_only: bool = True,
+    gs_views_interval: int = 1,
+    inv_opacity: Optional[bool] = True,
+    prune_by_depth_percent: Optional[float] = 1.0,
+    prune_border_gs: Optional[bool] = True,
+    match_3dgs_mcmc_dev: Optional[bool] = False,
+    chunk_size: Optional[int] = PLY_WRITE_CHUNK_SIZE,
+    simplify: Optional[dict] = None,
+):
+    selected = select_gaussians_for_export(
+        gaussians,
+        ctx_depth,
+        gs_views_interval=gs_views_interval,
+        prune_by_depth_percent=prune_by_depth_percent,
+        prune_border_gs=prune_border_gs,
+        simplify=simplify,
+    )
+    opacities = inverse_sigmoid(selected.opacities) if inv_opacity else selected.opacities
     export_ply(
-        means=trim_select_reshape(world_means),
-        scales=trim_select_reshape(gs_scales),
-        rotations=trim_select_reshape(world_rotations),
-        harmonics=trim_select_reshape(world_shs),
-        opacities=trim_select_reshape(gs_opacities),
+        means=selected.means,
+        scales=selected.scales,
+        rotations=selected.rotations,
+        harmonics=selected.harmonics,
+        opacities=opacities,
         path=Path(save_path),
         shift_and_scale=shift_and_scale,
         save_sh_dc_only=save_sh_dc_only,
         match_3dgs_mcmc_dev=match_3dgs_mcmc_dev,
+        chunk_size=chunk_size,
     )
@@ -74,11 +74,19 @@ class InputProcessor:
         print_progress: bool = False,
         sequential: bool | None = None,
         desc: str | None = "Preprocess",
+        pad_mixed_sizes: bool = False,
     ) -> tuple[torch.Tensor, torch.Tensor | None, torch.Tensor | None]:
         """
+        Args:
+            pad_mixed_sizes: Pad images of different sizes at the bottom and right to the
+                largest H and W instead of center-cropping them to the smallest ones.
+                Intrinsics are unchanged by the padding.
+
         Returns:
             (tensor, extrinsics_list, intrinsics_list)
             tensor shape: (1, N, 3, H, W)
+            With ``pad_mixed_sizes``, a fourth element holds the valid (H, W) of each image
+            as a (N, 2) tensor, or None if all images have the same size.
         """
         sequential = self._resolve_sequential(sequential, num_workers)
         exts_list, ixts_list = self._validate_and_pack_meta(image, extrinsics, intrinsics)
@@ -96,7 +104,13 @@ class InputProcessor:
         )
 
         proc_imgs, out_sizes, out_ixts, out_exts = self._unpack_results(results)
-        proc_imgs, out_sizes, out_ixts = self._unify_batch_shapes(proc_imgs, out_sizes, out_ixts)
+        view_sizes = None
+        if pad_mixed_sizes:
+            proc_imgs, view_sizes = self._pad_batch_shapes(proc_imgs, out_sizes)
+        else:
+            proc_imgs, out_sizes, out_ixts = self._unify_batch_shapes(
+                proc_imgs, out_sizes, out_ixts
+            )
 
         batch_tensor = self._stack_batch(proc_imgs)
         out_exts = (
@@ -109,6 +123,8 @@ class InputProcessor:
             if out_ixts is not None and out_ixts[0] is not None
             else None
         )
+        if pad_mixed_sizes:
+            return (batch_tensor, out_exts, out_ixts, view_sizes)
         return (batch_tensor, out_exts, out_ixts)
 
     # -----------------------------
@@ -210,6 +226,30 @@ class InputProcessor:
                 new_ixts.append(K_adj)
         return new_imgs, new_sizes, new_ixts
 
+    def _pad_batch_shapes(
+        self,
+        processed_images: list[torch.Tensor],
+        out_sizes: list[tuple[int, int]],
+    ) -> tuple[list[torch.Tensor], torch.Tensor | None]:
+        """Pad all tensors at the bottom and right to the largest H, W with black pixels."""
+        if len(set(out_sizes)) <= 1:
+            return processed_images, None
+
+        max_h = max(h for h, _ in out_sizes)
+        max_w = max(w for _, w in out_sizes)
+        logger.info(f"Images in batch have different sizes; padding all to ({max_h},{max_w})")
+
+        # Normalized value of a black pixel
+        mean = torch.tensor(self.NORMALIZE.mean)[:, None, None]
+        std = torch.tensor(self.NORMALIZE.std)[:, None, None]
+        pad_value = -mean / std
+        new_imgs = []
+        for img_t, (H, W) in zip(processed_images, out_sizes):
+            canvas = pad_value.to(img_t.dtype).expand(3, max_h, max_w).clone()
+            canvas[:, :H, :W] = img_t
+            new_imgs.append(canvas)
+        return new_imgs, torch.tensor(out_sizes, dtype=torch.long)
+
     def _stack_batch(self, processed_images: list[torch.Tensor]) -> torch.Tensor:
         return torch.stack(processed_images)
 
@@ -58,9 +58,16 @@ class OutputProcessor:
         extrinsics = self._extract_extrinsics(model_output)
         intrinsics = self._extract_intrinsics(model_output)
         sky = self._extract_sky(model_output)
+        ray, ray_conf = self._extract_rays(model_output)
         aux = self._extract_aux(model_output)
         gaussians = model_output.get("gaussians", None)
         scale_factor = model_output.get("scale_factor", None)
+        ref_view_idx = model_output.get("ref_view_idx", None)
+        if ref_view_idx is not None:
+            ref_view_idx = int(ref_view_idx[0])
+        view_sizes = model_output.get("view_sizes", None)
+        if view_sizes is not None:
+            view_sizes = view_sizes.squeeze(0).cpu().numpy()  # (N, 2)
 
         return Prediction(
             depth=depth,
@@ -72,9 +79,13 @@ class OutputProcessor:
             gaussians=gaussians,
             aux=aux,
             scale_factor=scale_factor,
+            ref_view_idx=ref_view_idx,
+            view_sizes=view_sizes,
+            ray=ray,
+            ray_conf=ray_conf,
         )
 
-    def _extract_depth(self, model_output: dict[str, torch.Tensor]) -> np.ndarray:
+    def _extract_depth(self, model_output: dict[str, torch.Tensor]) -> np.ndarray | None:
         """
         Extract depth tensor from model output and convert to numpy.
 
@@ -82,9 +93,11 @@ class OutputProcessor:
             model_output: Model output dictionary
 
         Returns:
-            Depth array with shape (N, H, W)
+            Depth array with shape (N, H, W) or None
         """
-        depth = model_output["depth"].squeeze(0).squeeze(-1).cpu().numpy()  # (N, H, W)
+        depth = model_output.get("depth", None)
+        if depth is not None:
+            depth = depth.squeeze(0).squeeze(-1).cpu().numpy()  # (N, H, W)
         return depth
 
     def _extract_conf(self, model_output: dict[str, torch.Tensor]) -> np.ndarray | None:
@@ -147,6 +160,26 @@ class OutputProcessor:
             sky = sky.squeeze(0).cpu().numpy() >= 0.5  # (N, H, W)
         return sky
 
+    def _extract_rays(
+        self, model_output: dict[str, torch.Tensor]
+    ) -> tuple[np.ndarray | None, np.ndarray | None]:
+        """
+        Extract raw ray maps and their confidence from model output and convert to numpy.
+
+        Args:
+            model_output: Model output dictionary
+
+        Returns:
+            Ray array with shape (N, h, w, 6) and confidence with shape (N, h, w), or None
+        """
+        ray = model_output.get("ray", None)
+        ray_conf = model_output.get("ray_conf", None)
+        if ray is not None:
+            ray = ray.squeeze(0).cpu().numpy()  # (N, h, w, 6)
+        if ray_conf is not None:
+            ray_conf = ray_conf.squeeze(0).cpu().numpy()  # (N, h, w)
+        return ray, ray_conf
+
     def _extract_aux(self, model_output: dict[str, torch.Tensor]) -> AddictDict:
         """
         Extract auxiliary data from model output and convert to numpy.
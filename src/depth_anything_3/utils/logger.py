@@ -34,6 +34,12 @@ def get_env_log_level():
     return LOG_LEVELS.get(level, LOG_LEVELS["INFO"])
 
 
+def _is_compiling():
+    # Nothing is compiled before torch is imported; do not import it for the logger
+    torch = sys.modules.get("torch")
+    return torch is not None and torch.compiler.is_compiling()
+
+
 class Logger:
     def __init__(self):
         self.level = get_env_log_level()
@@ -43,6 +49,9 @@ class Logger:
         level_val = LOG_LEVELS.get(level_key)
         if level_val is None:
             raise ValueError(f"Unknown log level: {level_str}")
+        if _is_compiling():
+            # Printing breaks compiled graphs; messages would only show while tracing anyway
+            return
         if self.level >= level_val:
             color = COLOR_MAP[level_key]
             msg = " ".join(str(arg) for arg in args)
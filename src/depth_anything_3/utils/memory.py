@@ -1,5 +1,5 @@
 """
-GPU memory utility helpers.
+GPU and host memory utility helpers.
 
 Shared cleanup and memory checking logic used by both the backend API and
 the Gradio UI to keep memory-management behavior consistent.
@@ -7,6 +7,7 @@ the Gradio UI to keep memory-management behavior consistent.
 from __future__ import annotations
 
 import gc
+import os
 
 from typing import Any, Dict, Optional
 
@@ -39,6 +40,56 @@ def get_gpu_memory_info() -> Optional[Dict[str, Any]]:
         return None
 
 
+def get_cpu_memory_info() -> Optional[Dict[str, Any]]:
+    """Return a snapshot of host RAM usage or None if it cannot be determined.
+
+    Keys in returned dict: total_gb, free_gb, utilization
+    """
+    try:
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        total_memory = os.sysconf("SC_PHYS_PAGES") * page_size
+        free_memory = os.sysconf("SC_AVPHYS_PAGES") * page_size
+        try:
+            # MemAvailable also counts reclaimable page cache
+            with open("/proc/meminfo") as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        free_memory = int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            pass
+
+        return {
+            "total_gb": total_memory / 1024 ** 3,
+            "free_gb": free_memory / 1024 ** 3,
+            "utilization": (1 - free_memory / total_memory) * 100,
+        }
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def get_free_memory_gb(device: str | torch.device) -> Optional[float]:
+    """Return the memory available for new tensors on ``device`` in GB, None if unknown.
+
+    On CUDA this includes memory cached by PyTorch's allocator that is not in use; on
+    CPU it is the available system RAM.
+    """
+    try:
+        device = torch.device(device)
+        if device.type == "cuda":
+            free_memory, _ = torch.cuda.mem_get_info(device)
+            cached_memory = torch.cuda.memory_reserved(device) - torch.cuda.memory_allocated(
+                device
+            )
+            return (free_memory + cached_memory) / 1024 ** 3
+        if device.type == "cpu":
+            mem_info = get_cpu_memory_info()
+            return mem_info["free_gb"] if mem_info is not None else None
+        return None
+    except Exception:
+        return None
+
+
 def cleanup_cuda_memory() -> None:
     """Perform a robust GPU cleanup sequence.
 
@@ -75,26 +126,39 @@ def cleanup_cuda_memory() -> None:
         print(f"Warning: CUDA cleanup failed: {e}")
 
 
-def check_memory_availability(required_gb: float = 2.0) -> tuple[bool, str]:
-    """Return whether at least ``required_gb`` seems available on the current GPU.
+def check_memory_availability(
+    required_gb: float = 2.0, device: str | torch.device | None = None
+) -> tuple[bool, str]:
+    """Return whether at least ``required_gb`` seems available on ``device``.
 
-    The returned tuple is (is_available, message) with a human-friendly message.
+    ``device`` defaults to the current GPU when CUDA is available, else the host. On CPU
+    the available system RAM is checked. The returned tuple is (is_available, message)
+    with a human-friendly message.
     """
     try:
-        if not torch.cuda.is_available():
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        device_type = torch.device(device).type
+        if device_type == "cuda" and not torch.cuda.is_available():
             return False, "CUDA is not available"
 
-        mem_info = get_gpu_memory_info()
+        if device_type == "cuda":
+            mem_info, memory_name = get_gpu_memory_info(), "GPU memory"
+        elif device_type == "cpu":
+            mem_info, memory_name = get_cpu_memory_info(), "system RAM"
+        else:
+            mem_info, memory_name = None, f"{device_type} memory"
         if mem_info is None:
             return True, "Cannot check memory, proceeding anyway"
 
         if mem_info["free_gb"] < required_gb:
+            used_gb = mem_info["total_gb"] - mem_info["free_gb"]
             return (
                 False,
                 (
-                    f"Insufficient GPU memory: {mem_info['free_gb']:.2f}GB available, "
+                    f"Insufficient {memory_name}: {mem_info['free_gb']:.2f}GB available, "
                     f"{required_gb:.2f}GB required. Total: {mem_info['total_gb']:.2f}GB, "
-                    f"Used: {mem_info['reserved_gb']:.2f}GB ({mem_info['utilization']:.1f}%)"
+                    f"Used: {used_gb:.2f}GB ({mem_info['utilization']:.1f}%)"
                 ),
             )
 
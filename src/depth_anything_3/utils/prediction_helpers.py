@@ -0,0 +1,110 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Post-processing of raw outputs and predictions shared by the inference backends.
+
+Kept free of model imports so that the onnxruntime backend does not load the PyTorch
+model stack.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import torch
+from addict import Dict
+
+from depth_anything_3.specs import Prediction
+from depth_anything_3.utils.alignment import compute_sky_mask, set_sky_regions_to_max_depth
+from depth_anything_3.utils.pose_align import align_poses_umeyama
+
+
+def process_mono_sky_estimation(
+    output: Dict[str, torch.Tensor], valid_mask: torch.Tensor | None = None
+) -> Dict[str, torch.Tensor]:
+    """Process mono sky estimation."""
+    if "sky" not in output or "depth" not in output:
+        return output
+    if output.depth.shape[0] > 1:
+        # The sky depth of each scene follows its own depth range
+        for b in range(output.depth.shape[0]):
+            scene = process_mono_sky_estimation(
+                Dict(depth=output.depth[b : b + 1], sky=output.sky[b : b + 1]),
+                valid_mask[b : b + 1] if valid_mask is not None else None,
+            )
+            output.depth[b] = scene.depth[0]
+        return output
+    non_sky_mask = compute_sky_mask(output.sky, threshold=0.3)
+    if non_sky_mask.sum() <= 10:
+        return output
+    if (~non_sky_mask).sum() <= 10:
+        return output
+
+    # Padded pixels count as non-sky but do not contribute to the depth statistics
+    non_sky_depth = output.depth[non_sky_mask if valid_mask is None else non_sky_mask & valid_mask]
+    if non_sky_depth.numel() > 100000:
+        idx = torch.randint(0, non_sky_depth.numel(), (100000,), device=non_sky_depth.device)
+        sampled_depth = non_sky_depth[idx]
+    else:
+        sampled_depth = non_sky_depth
+    non_sky_max = torch.quantile(sampled_depth, 0.99)
+
+    # Set sky regions to maximum depth and high confidence
+    output.depth, _ = set_sky_regions_to_max_depth(
+        output.depth, None, non_sky_mask, max_depth=non_sky_max
+    )
+    return output
+
+
+def align_to_input_extrinsics_intrinsics(
+    extrinsics: torch.Tensor | None,
+    intrinsics: torch.Tensor | None,
+    prediction: Prediction,
+    align_to_input_ext_scale: bool = True,
+    ransac_view_thresh: int = 10,
+) -> Prediction:
+    """Align depth map to input extrinsics"""
+    if extrinsics is None:
+        return prediction
+    prediction.intrinsics = intrinsics.numpy()
+    _, _, scale, aligned_extrinsics = align_poses_umeyama(
+        prediction.extrinsics,
+        extrinsics.numpy(),
+        ransac=len(extrinsics) >= ransac_view_thresh,
+        return_aligned=True,
+        random_state=42,
+    )
+    if align_to_input_ext_scale:
+        prediction.extrinsics = extrinsics[..., :3, :].numpy()
+        if prediction.depth is not None:
+            prediction.depth /= scale
+    else:
+        prediction.extrinsics = aligned_extrinsics
+    return prediction
+
+
+def add_processed_images(prediction: Prediction, imgs_cpu: torch.Tensor) -> Prediction:
+    """Add processed images to prediction for visualization."""
+    # Convert from (N, 3, H, W) to (N, H, W, 3) and denormalize
+    processed_imgs = imgs_cpu.permute(0, 2, 3, 1).cpu().numpy()  # (N, H, W, 3)
+
+    # Denormalize from ImageNet normalization
+    mean = np.array([0.485, 0.456, 0.406])
+    std = np.array([0.229, 0.224, 0.225])
+    processed_imgs = processed_imgs * std + mean
+    processed_imgs = np.clip(processed_imgs, 0, 1)
+    processed_imgs = (processed_imgs * 255).astype(np.uint8)
+
+    prediction.processed_images = processed_imgs
+    return prediction
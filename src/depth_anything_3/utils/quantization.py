@@ -0,0 +1,264 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Quantized linear layers for CPU deployments.
+
+Supported modes:
+- ``dynamic_int8``: int8 weights with one scale per output channel, prepacked once for the
+  int8 GEMM kernels of oneDNN (FBGEMM when oneDNN is unavailable). Activations are
+  quantized at run time. The packed weights are the only resident copy of the weights.
+
+Weight-only modes (int8/int4 weights dequantized before a float matmul) are not offered:
+without a CPU kernel for weight-only low-bit matmuls that beats the dense one at the token
+counts of multi-view inputs, they only compress the weights and run slower than float.
+See ``benchmarks/quantization_throughput.py`` for the speed of ``dynamic_int8``.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import os
+import warnings
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from depth_anything_3.specs import Prediction
+
+QUANTIZATION_MODES = ("dynamic_int8",)
+
+
+def dynamic_int8_engine() -> str:
+    """Quantized CPU backend of ``dynamic_int8``, oneDNN when available."""
+    engines = torch.backends.quantized.supported_engines
+    if "onednn" in engines and torch.backends.mkldnn.is_available():
+        return "onednn"
+    return "fbgemm" if "fbgemm" in engines else torch.backends.quantized.engine
+
+
+@contextlib.contextmanager
+def quantized_engine(engine: str):
+    """Temporarily select the quantized backend used to prepack weights."""
+    previous = torch.backends.quantized.engine
+    torch.backends.quantized.engine = engine
+    try:
+        yield
+    finally:
+        torch.backends.quantized.engine = previous
+
+
+@contextlib.contextmanager
+def _quantized_tensors():
+    # the quantized tensor API is deprecated in favour of torchao
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        yield
+
+
+def quantized_weights_path(weights_dir: str, mode: str) -> str:
+    """Path of the quantized weights stored next to ``model.safetensors``."""
+    return os.path.join(weights_dir, f"model.{mode}.safetensors")
+
+
+class QuantizedLinear(nn.Module):
+    """
+    Drop-in replacement of ``nn.Linear`` with int8 weights and int8 activations.
+
+    On CPU the weights are prepacked for the int8 GEMM kernels on the first call and the
+    ``qweight`` buffer is released, so that the packed weights are the only resident copy;
+    ``state_dict`` rebuilds ``qweight`` from them. On other devices the weights are
+    dequantized before a float matmul.
+
+    Args:
+        in_features: Size of each input sample
+        out_features: Size of each output sample
+        bias: Whether the layer has a bias (kept in floating point)
+    """
+
+    def __init__(self, in_features: int, out_features: int, bias: bool = True):
+        super().__init__()
+        self.in_features = in_features
+        self.out_features = out_features
+        self.register_buffer("qweight", torch.empty(out_features, in_features, dtype=torch.int8))
+        self.register_buffer("scale", torch.empty(out_features))
+        self.bias = nn.Parameter(torch.empty(out_features), requires_grad=False) if bias else None
+        # (engine, packed weights) once prepacked
+        self._packed = None
+
+    @classmethod
+    def from_linear(cls, linear: nn.Linear, quantize_weights: bool = True) -> QuantizedLinear:
+        """
+        Build a quantized layer from a floating-point one.
+
+        Args:
+            linear: Layer to convert
+            quantize_weights: Quantize the weights of ``linear``. If False, only the
+                structure is built, e.g. to load quantized weights from disk afterwards.
+
+        Returns:
+            QuantizedLinear on the device of ``linear``
+        """
+        layer = cls(linear.in_features, linear.out_features, linear.bias is not None)
+        layer = layer.to(linear.weight.device)
+        if linear.bias is not None:
+            layer.bias.data = linear.bias.detach().clone()
+        if quantize_weights:
+            with torch.no_grad():
+                weight = linear.weight.detach().float()
+                scale = (weight.abs().amax(dim=1) / 127).clamp(min=1e-8)
+                layer.qweight.copy_(torch.round(weight / scale[:, None]).clamp(-127, 127))
+                layer.scale.copy_(scale)
+        return layer
+
+    @property
+    def packed_nbytes(self) -> int:
+        """Size of the prepacked weights, which are not a parameter or buffer."""
+        return self.out_features * self.in_features if self._packed is not None else 0
+
+    def int8_weight(self) -> torch.Tensor:
+        """int8 weight of shape (out_features, in_features)."""
+        if self._packed is None:
+            return self.qweight
+        engine, packed = self._packed
+        if engine == "onednn":
+            return packed.to_dense().t().contiguous().to(self.scale.device)
+        return torch.ops.quantized.linear_unpack(packed)[0].int_repr().to(self.scale.device)
+
+    def dequantize(self, dtype: torch.dtype = torch.float32) -> torch.Tensor:
+        """Floating-point weight of shape (out_features, in_features)."""
+        return self.int8_weight().to(dtype) * self.scale[:, None].to(dtype)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        if x.device.type == "cpu" and self.scale.device.type == "cpu":
+            return self._forward_int8(x)
+        return F.linear(x, self.dequantize(x.dtype), self.bias)
+
+    def _pack(self) -> None:
+        engine = dynamic_int8_engine()
+        # the packed weights outlive the inference_mode call that builds them
+        with torch.inference_mode(False):
+            if engine == "onednn":
+                packed = torch.ops.onednn.qlinear_prepack(self.qweight, None)
+            else:
+                zero_points = torch.zeros(self.out_features, dtype=torch.long)
+                bias = self.bias.detach().float() if self.bias is not None else None
+                with quantized_engine(engine), _quantized_tensors():
+                    weight = torch._make_per_channel_quantized_tensor(
+                        self.qweight, self.scale.double(), zero_points, 0
+                    )
+                    packed = torch.ops.quantized.linear_prepack(weight, bias)
+            self._packed = (engine, packed)
+            self.qweight = self.qweight.new_empty(0)
+
+    def _forward_int8(self, x: torch.Tensor) -> torch.Tensor:
+        if self._packed is None:
+            self._pack()
+        engine, packed = self._packed
+        x2d = x.reshape(-1, self.in_features).float().contiguous()
+        if engine == "onednn":
+            with _quantized_tensors():
+                qx = torch.quantize_per_tensor_dynamic(x2d, torch.quint8, False)
+            zero_points = torch.zeros(self.out_features, dtype=torch.long)
+            bias = self.bias.float() if self.bias is not None else None
+            out = torch.ops.onednn.qlinear_pointwise(
+                qx.int_repr(), qx.q_scale(), qx.q_zero_point(), packed, self.scale.float(),
+                zero_points, bias, 1.0, 0, torch.float32, "none", [], "",
+            )  # fmt: skip
+        else:
+            # FBGEMM without VNNI saturates int16 accumulations unless the range is reduced
+            out = torch.ops.quantized.linear_dynamic(x2d, packed, True)
+        return out.to(x.dtype).reshape(*x.shape[:-1], self.out_features)
+
+    def _save_to_state_dict(self, destination, prefix, keep_vars):
+        super()._save_to_state_dict(destination, prefix, keep_vars)
+        if self._packed is not None:
+            destination[prefix + "qweight"] = self.int8_weight()
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        if self._packed is not None:
+            # new weights, pack them again on the next call
+            self.qweight = torch.empty(
+                self.out_features, self.in_features, dtype=torch.int8, device=self.scale.device
+            )
+            self._packed = None
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
+    def extra_repr(self) -> str:
+        return (
+            f"in_features={self.in_features}, out_features={self.out_features}, "
+            f"bias={self.bias is not None}"
+        )
+
+
+def quantize_linears(
+    module: nn.Module, mode: str = "dynamic_int8", quantize_weights: bool = True
+) -> int:
+    """
+    Replace all ``nn.Linear`` layers of ``module`` in place by QuantizedLinear.
+
+    Args:
+        module: Module to convert
+        mode: One of QUANTIZATION_MODES
+        quantize_weights: See QuantizedLinear.from_linear
+
+    Returns:
+        Number of converted layers
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode {mode}, expected {QUANTIZATION_MODES}")
+    num_converted = 0
+    for name, child in list(module.named_children()):
+        if isinstance(child, nn.Linear):
+            setattr(module, name, QuantizedLinear.from_linear(child, quantize_weights))
+            num_converted += 1
+        else:
+            num_converted += quantize_linears(child, mode, quantize_weights)
+    return num_converted
+
+
+def module_nbytes(module: nn.Module) -> int:
+    """Resident size of the parameters, buffers and prepacked weights of ``module`` in bytes."""
+    tensors = list(module.parameters()) + list(module.buffers())
+    packed = sum(m.packed_nbytes for m in module.modules() if isinstance(m, QuantizedLinear))
+    return sum(t.numel() * t.element_size() for t in tensors) + packed
+
+
+def compare_predictions(reference: Prediction, prediction: Prediction) -> dict[str, float]:
+    """
+    Accuracy of a prediction relative to a reference prediction of the same inputs.
+
+    Args:
+        reference: Prediction of the floating-point model
+        prediction: Prediction of the quantized model
+
+    Returns:
+        Dictionary with the depth AbsRel and delta < 1.25 ratio, and the mean camera
+        rotation (degrees) and translation errors when poses are predicted
+    """
+    depth_ref, depth = reference.depth, prediction.depth
+    valid = depth_ref > 0
+    ratio = depth[valid] / depth_ref[valid]
+    metrics = {
+        "depth_abs_rel": float(np.mean(np.abs(ratio - 1))),
+        "depth_delta1": float(np.mean(np.maximum(ratio, 1 / ratio) < 1.25)),
+    }
+    if reference.extrinsics is not None and prediction.extrinsics is not None:
+        rot_ref, rot = reference.extrinsics[..., :3, :3], prediction.extrinsics[..., :3, :3]
+        cos = (np.trace(rot_ref.transpose(0, 2, 1) @ rot, axis1=1, axis2=2) - 1) / 2
+        metrics["rotation_error_deg"] = float(np.degrees(np.arccos(np.clip(cos, -1, 1))).mean())
+        trans_err = reference.extrinsics[..., :3, 3] - prediction.extrinsics[..., :3, 3]
+        metrics["translation_error"] = float(np.linalg.norm(trans_err, axis=-1).mean())
+    return metrics
@@ -17,6 +17,10 @@ from einops import repeat
 from .geometry import unproject_depth
 
 
+# Upper bound of (views * iterations * points) scored at once by the batched RANSAC
+RANSAC_SCORE_CHUNK_ELEMENTS = 2**23
+
+
 def compute_optimal_rotation_intrinsics_batch(
     rays_origin, rays_target, z_threshold=1e-4, reproj_threshold=0.2, weights=None,
     n_sample = None,
@@ -52,63 +56,61 @@ def compute_optimal_rotation_intrinsics_batch(
     assert weights is not None, "weights must be provided"
     weights[~z_mask] = 0 
 
-    A_list = []
-    max_chunk_size = 2
-    for i in range(0, rays_origin.shape[0], max_chunk_size):
-        A = ransac_find_homography_weighted_fast_batch(
-            rays_origin[i:i+max_chunk_size],
-            rays_target[i:i+max_chunk_size],
-            weights[i:i+max_chunk_size],
-            n_iter=n_iter,
-            n_sample = n_sample,
-            num_sample_for_ransac=num_sample_for_ransac,
-            reproj_threshold=reproj_threshold,
-            rand_sample_iters_idx=rand_sample_iters_idx,
-            max_inlier_num=8000,
-        )
-        A = A.to(device)
-        A_need_inv_mask = torch.linalg.det(A) < 0
-        A[A_need_inv_mask] = -A[A_need_inv_mask]
-        A_list.append(A)
-
-    A = torch.cat(A_list, dim=0)
-
-    R_list = []
-    f_list = []
-    pp_list = []
-    for i in range(A.shape[0]):
-        R, L = ql_decomposition(A[i])
-        L = L / L[2][2]
-
-        f = torch.stack((L[0][0], L[1][1]))
-        pp = torch.stack((L[2][0], L[2][1]))
-        R_list.append(R)
-        f_list.append(f)
-        pp_list.append(pp)
-        
-    R = torch.stack(R_list)
-    f = torch.stack(f_list)
-    pp = torch.stack(pp_list)
+    A = ransac_find_homography_weighted_fast_batch(
+        rays_origin,
+        rays_target,
+        weights,
+        n_iter=n_iter,
+        n_sample=n_sample,
+        num_sample_for_ransac=num_sample_for_ransac,
+        reproj_threshold=reproj_threshold,
+        rand_sample_iters_idx=rand_sample_iters_idx,
+        max_inlier_num=8000,
+    ).to(device)
+    A_need_inv_mask = torch.linalg.det(A) < 0
+    A[A_need_inv_mask] = -A[A_need_inv_mask]
+
+    R, L = ql_decomposition(A)
+    L = L / L[:, 2:3, 2:3]
+    f = torch.stack((L[:, 0, 0], L[:, 1, 1]), dim=-1)
+    pp = torch.stack((L[:, 2, 0], L[:, 2, 1]), dim=-1)
 
     return R, f, pp
 
 
 # https://www.reddit.com/r/learnmath/comments/v1crd7/linear_algebra_qr_to_ql_decomposition/
 def ql_decomposition(A):
+    """
+    QL decomposition A = Q @ L of one or a batch of matrices (..., 3, 3), with the
+    diagonal of L made positive.
+    """
     P = torch.tensor([[0, 0, 1], [0, 1, 0], [1, 0, 0]], device=A.device).float()
     A_tilde = torch.matmul(A, P)
     Q_tilde, R_tilde = torch.linalg.qr(A_tilde)
     Q = torch.matmul(Q_tilde, P)
     L = torch.matmul(torch.matmul(P, R_tilde), P)
-    d = torch.diag(L)
-    Q[:, 0] *= torch.sign(d[0])
-    Q[:, 1] *= torch.sign(d[1])
-    Q[:, 2] *= torch.sign(d[2])
-    L[0] *= torch.sign(d[0])
-    L[1] *= torch.sign(d[1])
-    L[2] *= torch.sign(d[2])
+    d_sign = torch.sign(torch.diagonal(L, dim1=-2, dim2=-1))
+    Q = Q * d_sign.unsqueeze(-2)  # Columns of Q
+    L = L * d_sign.unsqueeze(-1)  # Rows of L
     return Q, L
 
+def sample_ransac_subsets(n_iter, n_sample, num_sample_for_ransac, device=None):
+    """
+    Draw the point subsets of all RANSAC iterations at once.
+
+    Every row is a random subset of ``num_sample_for_ransac`` distinct indices in
+    ``[0, n_sample)``, taken from a random permutation of all candidates. One randperm
+    per iteration keeps the random stream, and so the results under a fixed seed, of
+    the per-iteration sampling.
+
+    Returns:
+        (n_iter, num_sample_for_ransac) indices
+    """
+    return torch.stack(
+        [torch.randperm(n_sample, device=device)[:num_sample_for_ransac] for _ in range(n_iter)]
+    )
+
+
 def find_homography_least_squares_weighted_torch(src_pts, dst_pts, confident_weight):
     """
     src_pts: (N,2) source points (torch.Tensor, float32/float64)
@@ -137,8 +139,9 @@ def find_homography_least_squares_weighted_torch(src_pts, dst_pts, confident_wei
     A = torch.cat([A1, A2], dim=0)  # (2N, 9)
 
     # SVD
-    # Note: torch.linalg.svd returns U, S, Vh, where Vh is the transpose of V
-    _, _, Vh = torch.linalg.svd(A)
+    # Note: torch.linalg.svd returns U, S, Vh, where Vh is the transpose of V. Only Vh
+    # is needed; the full U of the tall system would be (2N, 2N)
+    _, _, Vh = torch.linalg.svd(A, full_matrices=A.shape[0] < 9)
     H = Vh[-1].reshape(3, 3)
     H = H / H[-1, -1]
     return H
@@ -225,8 +228,8 @@ def find_homography_least_squares_weighted_torch_batch(
     A1 = torch.cat([-x * w, -y * w, -w, zeros, zeros, zeros, x * u * w, y * u * w, u * w], dim=2)
     A2 = torch.cat([zeros, zeros, zeros, -x * w, -y * w, -w, x * v * w, y * v * w, v * w], dim=2)
     A = torch.cat([A1, A2], dim=1)  # (B, 2K, 9)
-    # SVD: torch.linalg.svd supports batch
-    _, _, Vh = torch.linalg.svd(A)
+    # SVD: torch.linalg.svd supports batch; only Vh is needed
+    _, _, Vh = torch.linalg.svd(A, full_matrices=2 * K < 9)
     H = Vh[:, -1].reshape(B, 3, 3)
     H = H / H[:, 2:3, 2:3]
     return H
@@ -256,9 +259,8 @@ def ransac_find_homography_weighted_fast(
     sorted_idx = torch.argsort(confident_weight, descending=True)
     candidate_idx = sorted_idx[:n_sample]  # (n_sample,)
     if rand_sample_iters_idx is None:
-        rand_sample_iters_idx = torch.stack(
-            [torch.randperm(n_sample, device=device)[:num_sample_for_ransac] for _ in range(n_iter)],
-            dim=0,
+        rand_sample_iters_idx = sample_ransac_subsets(
+            n_iter, n_sample, num_sample_for_ransac, device
         )  # (n_iter, num_sample_for_ransac)
     # 2. Generate all sampling groups at once
     # shape: (n_iter, num_sample_for_ransac)
@@ -345,11 +347,10 @@ def ransac_find_homography_weighted_fast_batch(
     # 2. Generate all sampling groups at once
     # rand_idx: (B, n_iter, num_sample_for_ransac)
     if rand_sample_iters_idx is None:
-        rand_sample_iters_idx = torch.stack(
-            [torch.randperm(n_sample, device=device)[:num_sample_for_ransac] for _ in range(n_iter)],
-            dim=0,
+        rand_sample_iters_idx = sample_ransac_subsets(
+            n_iter, n_sample, num_sample_for_ransac, device
         )  # (n_iter, num_sample_for_ransac)
-    
+
     rand_idx = candidate_idx[:, rand_sample_iters_idx]  # (B, n_iter, num_sample_for_ransac)
 
     # 3. Construct batch input
@@ -368,67 +369,106 @@ def ransac_find_homography_weighted_fast_batch(
     )  # (B, n_iter, 3, 3)
     H_batch = H_batch.unflatten(0, (cB, cN))
 
-    # 5. Batch evaluate inliers for all H
+    # 5. Batch evaluate inliers for all H, in groups of views that bound the
+    # (views, n_iter, N, 3) projections
+    chunk = max(1, RANSAC_SCORE_CHUNK_ELEMENTS // (n_iter * N))
+    best_inlier_mask = torch.cat(
+        [
+            _best_ransac_inliers(
+                src_pts[b0 : b0 + chunk],
+                dst_pts[b0 : b0 + chunk],
+                confident_weight[b0 : b0 + chunk],
+                H_batch[b0 : b0 + chunk],
+                reproj_threshold,
+            )
+            for b0 in range(0, B, chunk)
+        ]
+    )  # (B, N)
+
+    # 6. Refit Homography using (a random subset of) the inliers of every view at once;
+    # views with fewer points are padded with zero-weight rows
+    refit_idx, refit_valid = _subsample_inliers(best_inlier_mask, confident_weight, max_inlier_num)
+
+    def gather(x):
+        return torch.gather(x, 1, refit_idx.unsqueeze(-1).expand(-1, -1, x.shape[-1]))
+
+    H_inlier = find_homography_least_squares_weighted_torch_batch(
+        gather(src_pts),
+        gather(dst_pts),
+        torch.gather(confident_weight, 1, refit_idx) * refit_valid,
+    )  # (B, 3, 3)
+    return H_inlier
+
+
+def _best_ransac_inliers(src_pts, dst_pts, confident_weight, H_batch, reproj_threshold):
+    """
+    Inliers of the best scoring hypothesis of every view.
+
+    Args:
+        src_pts: (B, N, 2)
+        dst_pts: (B, N, 2)
+        confident_weight: (B, N)
+        H_batch: (B, n_iter, 3, 3) hypotheses
+        reproj_threshold: Maximum reprojection error of an inlier
+
+    Returns:
+        (B, N) inlier mask
+    """
+    B, N, _ = src_pts.shape
     src_homo = torch.cat(
         [src_pts, torch.ones(B, N, 1, dtype=src_pts.dtype, device=src_pts.device)], dim=2
     )  # (B, N, 3)
-    src_homo_expand = src_homo.unsqueeze(1).expand(B, n_iter, N, 3)  # (B, n_iter, N, 3)
-    dst_pts_expand = dst_pts.unsqueeze(1).expand(B, n_iter, N, 2)  # (B, n_iter, N, 2)
-    confident_weight_expand = confident_weight.unsqueeze(1).expand(B, n_iter, N)  # (B, n_iter, N)
-
-    # H_batch: (B, n_iter, 3, 3)
-    # Need to reshape H_batch to (B*n_iter, 3, 3), src_homo_expand to (B*n_iter, N, 3)
-    H_batch_flat = H_batch.reshape(-1, 3, 3)
-    src_homo_expand_flat = src_homo_expand.reshape(-1, N, 3)
-    proj = torch.bmm(src_homo_expand_flat, H_batch_flat.transpose(1, 2))  # (B*n_iter, N, 3)
-    proj_xy = proj[:, :, :2] / proj[:, :, 2:3]  # (B*n_iter, N, 2)
-    proj_xy = proj_xy.reshape(B, n_iter, N, 2)
-    error = ((proj_xy - dst_pts_expand) ** 2).sum(dim=3).sqrt()  # (B, n_iter, N)
+    proj = torch.matmul(src_homo.unsqueeze(1), H_batch.transpose(-1, -2))  # (B, n_iter, N, 3)
+    proj_xy = proj[..., :2] / proj[..., 2:3]  # (B, n_iter, N, 2)
+    error = ((proj_xy - dst_pts.unsqueeze(1)) ** 2).sum(dim=3).sqrt()  # (B, n_iter, N)
     inlier_mask = error < reproj_threshold  # (B, n_iter, N)
-    total_score = (inlier_mask * confident_weight_expand).sum(dim=2)  # (B, n_iter)
-
-    # 6. Select the sampling group with the highest score
+    total_score = (inlier_mask * confident_weight.unsqueeze(1)).sum(dim=2)  # (B, n_iter)
     best_idx = torch.argmax(total_score, dim=1)  # (B,)
-    best_inlier_mask = inlier_mask[torch.arange(B, device=device), best_idx]  # (B, N)
+    return inlier_mask[torch.arange(B, device=src_pts.device), best_idx]
+
+
+def _subsample_inliers(inlier_mask, confident_weight, max_inlier_num):
+    """
+    Points used to refit the homography of every view.
+
+    Views with more than ``max_inlier_num`` inliers keep a random subset of
+    ``max_inlier_num`` points among their 95% most confident inliers. The subsets are
+    drawn view by view, as in the per-view refit, so that a fixed seed gives the same
+    points.
+
+    Args:
+        inlier_mask: (B, N)
+        confident_weight: (B, N)
+        max_inlier_num: Maximum number of points per view
+
+    Returns:
+        (B, K) indices of the selected points and (B, K) mask of the valid ones, K being
+        the largest number of points selected in a view
+    """
+    num_inliers = inlier_mask.sum(dim=1)  # (B,)
+    # Inliers first, most confident first
+    inlier_weight = confident_weight.masked_fill(~inlier_mask, -torch.inf)
+    order = torch.argsort(inlier_weight, dim=1, descending=True)  # (B, N)
+    num_selected = num_inliers.clamp(max=max_inlier_num)
+    K = max(int(num_selected.max()), 1)
+    selected = order[:, :K].clone()
+    for b in torch.nonzero(num_inliers > max_inlier_num).flatten().tolist():
+        # random choose from first 95% confident pts
+        keep_len = max(int(int(num_inliers[b]) * 0.95), max_inlier_num)
+        perm = torch.randperm(keep_len, device=order.device)[:max_inlier_num]
+        selected[b] = order[b, perm]
+    valid = torch.arange(K, device=order.device) < num_selected.unsqueeze(1)
+    return selected, valid
 
-    # 7. Refit Homography using inliers
-    H_inlier_list = []
-    for b in range(B):
-        mask = best_inlier_mask[b]
-        inlier_src_pts = src_pts[b][mask]  # (?, 3)
-        inlier_dst_pts = dst_pts[b][mask]  # (?, 2)
-        inlier_confident_weight = confident_weight[b][mask]  # (?)
-
-        sorted_idx = torch.argsort(inlier_confident_weight, descending=True)
-        # # method 1: sort according to confident_weight, and only keep max_inlier_num pts
-        # sorted_idx = sorted_idx[:max_inlier_num]
-        # method 2: random choose max_inlier_num pts
-        if len(sorted_idx) > max_inlier_num:
-            # random choose from first 95% confident pts
-            keep_len = max(int(len(sorted_idx) * 0.95), max_inlier_num)
-            sorted_idx = sorted_idx[:keep_len]
-            perm = torch.randperm(len(sorted_idx), device=device)[:max_inlier_num]
-            sorted_idx = sorted_idx[perm]
-        inlier_src_pts = inlier_src_pts[sorted_idx]
-        inlier_dst_pts = inlier_dst_pts[sorted_idx]
-        inlier_confident_weight = inlier_confident_weight[sorted_idx]
-
-        H_inlier = find_homography_least_squares_weighted_torch(
-            inlier_src_pts, inlier_dst_pts, inlier_confident_weight
-        )  # (3, 3)
-        H_inlier_list.append(H_inlier)
-    H_inlier = torch.stack(H_inlier_list, dim=0)  # (B, 3, 3)
-    return H_inlier
 
 def get_params_for_ransac(N, device):
     n_iter=100
     sample_ratio=0.3
     num_sample_for_ransac=8
     n_sample = max(num_sample_for_ransac, int(N * sample_ratio))
-    rand_sample_iters_idx = torch.stack(
-            [torch.randperm(n_sample, device=device)[:num_sample_for_ransac] for _ in range(n_iter)],
-            dim=0,
-        )  # (n_iter, num_sample_for_ransac)
+    rand_sample_iters_idx = sample_ransac_subsets(
+        n_iter, n_sample, num_sample_for_ransac, device
+    )  # (n_iter, num_sample_for_ransac)
     return n_iter, num_sample_for_ransac, n_sample, rand_sample_iters_idx
 
 
@@ -12,16 +12,150 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from math import isqrt
+"""
+Rotation of real spherical harmonics (SH) coefficients in the 3DGS basis convention.
+
+SH rotation matrices are evaluated in closed form for degrees 0 to 4: the rotated SH basis
+is sampled at fixed directions and projected back onto the basis with a precomputed
+pseudo-inverse, which is exact because every degree spans a rotation-invariant space.
+Matrices of recent rotations are cached, keyed by the rotation of each view.
+"""
+
+from collections import OrderedDict
+from math import isqrt, pi, sqrt
 import torch
 from einops import einsum
 
-try:
-    from e3nn.o3 import matrix_to_angles, wigner_D
-except ImportError:
-    from depth_anything_3.utils.logger import logger
-
-    logger.warn("Dependency 'e3nn' not found. Required for rotating the camera space SH coeff")
+MAX_SH_DEGREE = 4
+# Number of rotations whose SH rotation matrices are kept
+SH_ROTATION_CACHE_SIZE = 1024
+# Directions sampled to fit the rotation matrices, at least (MAX_SH_DEGREE + 1) ** 2
+_NUM_SH_SAMPLES = 64
+
+_sh_rotation_cache: "OrderedDict[tuple, torch.Tensor]" = OrderedDict()
+
+
+def eval_sh_basis(directions: torch.Tensor, degree: int) -> torch.Tensor:
+    """
+    Real SH basis functions of the 3DGS convention up to ``degree`` (at most 4).
+
+    Args:
+        directions: Unit vectors of shape (..., 3)
+        degree: Highest SH degree
+
+    Returns:
+        Basis values of shape (..., (degree + 1) ** 2)
+    """
+    if not 0 <= degree <= MAX_SH_DEGREE:
+        raise ValueError(f"SH degree must be in [0, {MAX_SH_DEGREE}], got {degree}")
+    x, y, z = directions.unbind(-1)
+    basis = [torch.full_like(x, 0.28209479177387814)]
+    if degree >= 1:
+        basis += [-0.4886025119029199 * y, 0.4886025119029199 * z, -0.4886025119029199 * x]
+    if degree >= 2:
+        xx, yy, zz = x * x, y * y, z * z
+        basis += [
+            1.0925484305920792 * x * y,
+            -1.0925484305920792 * y * z,
+            0.31539156525252005 * (2 * zz - xx - yy),
+            -1.0925484305920792 * x * z,
+            0.5462742152960396 * (xx - yy),
+        ]
+    if degree >= 3:
+        basis += [
+            -0.5900435899266435 * y * (3 * xx - yy),
+            2.890611442640554 * x * y * z,
+            -0.4570457994644658 * y * (4 * zz - xx - yy),
+            0.3731763325901154 * z * (2 * zz - 3 * xx - 3 * yy),
+            -0.4570457994644658 * x * (4 * zz - xx - yy),
+            1.445305721320277 * z * (xx - yy),
+            -0.5900435899266435 * x * (xx - 3 * yy),
+        ]
+    if degree >= 4:
+        basis += [
+            2.5033429417967046 * x * y * (xx - yy),
+            -1.7701307697799304 * y * z * (3 * xx - yy),
+            0.9461746957575601 * x * y * (7 * zz - 1),
+            -0.6690465435572892 * y * z * (7 * zz - 3),
+            0.10578554691520431 * (zz * (35 * zz - 30) + 3),
+            -0.6690465435572892 * x * z * (7 * zz - 3),
+            0.47308734787878004 * (xx - yy) * (7 * zz - 1),
+            -1.7701307697799304 * x * z * (xx - 3 * yy),
+            0.6258357354491761 * (xx * (xx - 3 * yy) - yy * (3 * xx - yy)),
+        ]
+    return torch.stack(basis, dim=-1)
+
+
+def _sh_sample_directions() -> tuple[torch.Tensor, torch.Tensor]:
+    """Fibonacci sphere directions (K, 3) and the pseudo-inverse (25, K) of their SH basis."""
+    index = torch.arange(_NUM_SH_SAMPLES, dtype=torch.float64) + 0.5
+    z = 1 - 2 * index / _NUM_SH_SAMPLES
+    radius = (1 - z * z).sqrt()
+    azimuth = pi * (3 - sqrt(5)) * index
+    directions = torch.stack([radius * azimuth.cos(), radius * azimuth.sin(), z], dim=-1)
+    basis_pinv = torch.linalg.pinv(eval_sh_basis(directions, MAX_SH_DEGREE))
+    return directions.float(), basis_pinv.float()
+
+
+_SH_SAMPLE_DIRECTIONS, _SH_BASIS_PINV = _sh_sample_directions()
+
+
+def _compute_sh_rotation_matrix(rotations: torch.Tensor, n: int) -> torch.Tensor:
+    """Uncached ``sh_rotation_matrix`` of float32 rotations (..., 3, 3)."""
+    degree = isqrt(n) - 1
+    directions = _SH_SAMPLE_DIRECTIONS.to(rotations.device)
+    basis_pinv = _SH_BASIS_PINV[:n].to(rotations.device)
+    # A color c(d) = sh . Y(d) in camera space reads c(R^T d) in world space. Rows of
+    # directions @ R are the sampled R^T d
+    rotated_basis = eval_sh_basis(directions @ rotations, degree)  # (..., K, n)
+    return basis_pinv @ rotated_basis
+
+
+def sh_rotation_matrix(
+    rotations: torch.Tensor,  # "*#batch 3 3"
+    n: int,
+) -> torch.Tensor:  # "*batch n n"
+    """
+    Block-diagonal matrix M rotating the first ``n`` SH coefficients, so that
+    ``rotate_sh(sh, rotations) == (M @ sh[..., None])[..., 0]``.
+
+    Computing M once per rotation lets many coefficient vectors sharing a rotation, e.g.
+    all pixels of a view, be rotated with a single matmul. Without gradients, matrices are
+    looked up in a cache keyed by each rotation.
+
+    Args:
+        rotations: Rotation matrices, e.g. camera-to-world rotations of the views
+        n: Number of SH coefficients, (degree + 1) ** 2 with degree at most 4
+
+    Returns:
+        Float32 SH rotation matrices
+    """
+    if isqrt(n) ** 2 != n or n > (MAX_SH_DEGREE + 1) ** 2:
+        raise ValueError(f"Unsupported number of SH coefficients: {n}")
+    with torch.autocast(device_type=rotations.device.type, enabled=False):
+        rotations = rotations.float()
+        if rotations.requires_grad:
+            return _compute_sh_rotation_matrix(rotations, n)
+
+        flat_rotations = rotations.reshape(-1, 3, 3)
+        keys = [
+            (n, str(rotations.device), rotation.tobytes())
+            for rotation in flat_rotations.cpu().numpy()
+        ]
+        missing = [i for i, key in enumerate(keys) if key not in _sh_rotation_cache]
+        if missing:
+            # Distinct new rotations are evaluated in one batch
+            missing = list({keys[i]: i for i in missing}.values())
+            computed = _compute_sh_rotation_matrix(flat_rotations[missing], n)
+            for i, matrix in zip(missing, computed):
+                _sh_rotation_cache[keys[i]] = matrix
+        matrices = []
+        for key in keys:
+            _sh_rotation_cache.move_to_end(key)
+            matrices.append(_sh_rotation_cache[key])
+        while len(_sh_rotation_cache) > SH_ROTATION_CACHE_SIZE:
+            _sh_rotation_cache.popitem(last=False)
+    return torch.stack(matrices).reshape(*rotations.shape[:-2], n, n)
 
 
 def project_to_so3_strict(M: torch.Tensor) -> torch.Tensor:
@@ -58,31 +192,6 @@ def rotate_sh(
     rotations: torch.Tensor,  # "*#batch 3 3"
 ) -> torch.Tensor:  # "*batch n"
     # https://github.com/graphdeco-inria/gaussian-splatting/issues/176#issuecomment-2452412653
-    device = sh_coefficients.device
-    dtype = sh_coefficients.dtype
-
     *_, n = sh_coefficients.shape
-
-    with torch.autocast(device_type=rotations.device.type, enabled=False):
-        rotations_float32 = rotations.to(torch.float32)
-
-        # switch axes: yzx -> xyz
-        P = torch.tensor([[0, 0, 1], [1, 0, 0], [0, 1, 0]]).unsqueeze(0).to(rotations_float32)
-        permuted_rotations = torch.linalg.inv(P) @ rotations_float32 @ P
-
-        # ensure rotation has det == 1 in float32 type
-        permuted_rotations_so3 = project_to_so3_strict(permuted_rotations)
-
-        alpha, beta, gamma = matrix_to_angles(permuted_rotations_so3)
-        result = []
-        for degree in range(isqrt(n)):
-            with torch.device(device):
-                sh_rotations = wigner_D(degree, alpha, -beta, gamma).type(dtype)
-            sh_rotated = einsum(
-                sh_rotations,
-                sh_coefficients[..., degree**2 : (degree + 1) ** 2],
-                "... i j, ... j -> ... i",
-            )
-            result.append(sh_rotated)
-
-    return torch.cat(result, dim=-1)
+    sh_rotations = sh_rotation_matrix(rotations, n).to(sh_coefficients.dtype)
+    return einsum(sh_rotations, sh_coefficients, "... i j, ... j -> ... i")
@@ -0,0 +1,276 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compact Gaussian splat formats for web viewers, with loaders for round trips.
+
+- ``.splat``: 32 bytes per Gaussian (float32 position and scale, RGBA and the quaternion in
+  uint8), sorted by opacity times volume so that viewers can stream the important splats
+  first. Only the SH DC band is kept.
+- ``.spz``: the gzip-compressed container of Niantic's SPZ format (version 3), with 24-bit
+  fixed-point positions, 8-bit colors, opacities and log-scales, smallest-three quaternions
+  in 32 bits and quantized higher SH bands.
+
+Both store the world coordinates of the Gaussians as they are, like the PLY export.
+"""
+
+import gzip
+import math
+import struct
+from pathlib import Path
+from typing import Optional
+import numpy as np
+import torch
+from torch import Tensor
+
+from depth_anything_3.specs import Gaussians
+from depth_anything_3.utils.gsply_helpers import PLY_WRITE_CHUNK_SIZE, select_gaussians_for_export
+
+SH_C0 = 0.28209479177387814
+
+SPLAT_DTYPE = np.dtype(
+    [("position", "<f4", 3), ("scale", "<f4", 3), ("color", "u1", 4), ("rotation", "u1", 4)]
+)
+
+SPZ_MAGIC = 0x5053474E  # "NGSP"
+SPZ_VERSION = 3
+SPZ_HEADER = struct.Struct("<IIIBBBB")
+SPZ_FRACTIONAL_BITS = 12  # positions in 1/4096 units, within +-2048 units of the origin
+SPZ_COLOR_SCALE = 0.15
+SPZ_SH1_BITS = 5
+SPZ_SH_REST_BITS = 4
+SPZ_MAX_SH_DEGREE = 3
+
+
+def _to_uint8(x: Tensor) -> np.ndarray:
+    return x.round().clamp(0, 255).to(torch.uint8).cpu().numpy()
+
+
+def export_splat(
+    means: Tensor,  # "gaussian 3"
+    scales: Tensor,  # "gaussian 3"
+    rotations: Tensor,  # "gaussian 4", wxyz
+    harmonics: Tensor,  # "gaussian 3 d_sh"
+    opacities: Tensor,  # "gaussian", in [0, 1]
+    path: Path,
+    chunk_size: Optional[int] = PLY_WRITE_CHUNK_SIZE,
+):
+    """
+    Write Gaussians to a ``.splat`` file, most important first.
+
+    Importance is opacity times the volume of the Gaussian. Gaussians are gathered in sorted
+    order and written per chunk of ``chunk_size``; None writes all of them at once.
+    """
+    order = torch.argsort(scales.prod(dim=-1) * opacities, descending=True)
+    num_gaussians = means.shape[0]
+    if chunk_size is None:
+        chunk_size = max(num_gaussians, 1)
+    path.parent.mkdir(exist_ok=True, parents=True)
+    with open(path, "wb") as file:
+        for start in range(0, num_gaussians, chunk_size):
+            index = order[start : start + chunk_size]
+            rgb = 0.5 + SH_C0 * harmonics[index, :, 0]
+            rotation = torch.nn.functional.normalize(rotations[index].float(), dim=-1)
+            rows = np.empty(len(index), dtype=SPLAT_DTYPE)
+            rows["position"] = means[index].detach().float().cpu().numpy()
+            rows["scale"] = scales[index].detach().float().cpu().numpy()
+            rows["color"][:, :3] = _to_uint8(rgb.detach() * 255)
+            rows["color"][:, 3] = _to_uint8(opacities[index].detach() * 255)
+            rows["rotation"] = _to_uint8(rotation.detach() * 128 + 128)
+            file.write(rows.tobytes())
+
+
+def load_splat(path: Path) -> Gaussians:
+    """Read a ``.splat`` file into unbatched Gaussians with the SH DC band only."""
+    rows = np.fromfile(path, dtype=SPLAT_DTYPE)
+    color = torch.from_numpy(rows["color"].astype(np.float32)) / 255
+    rotations = torch.from_numpy(rows["rotation"].astype(np.float32)) / 128 - 1
+    return Gaussians(
+        means=torch.from_numpy(rows["position"].copy()),
+        scales=torch.from_numpy(rows["scale"].copy()),
+        rotations=torch.nn.functional.normalize(rotations, dim=-1),
+        harmonics=((color[:, :3] - 0.5) / SH_C0)[..., None],
+        opacities=color[:, 3],
+    )
+
+
+def _quantize_sh(sh: Tensor, bits: int) -> np.ndarray:
+    bucket = 1 << (8 - bits)
+    quantized = (sh * 128 + 128).round()
+    return _to_uint8(torch.floor((quantized + bucket // 2) / bucket) * bucket)
+
+
+def _pack_quaternions(rotations: Tensor) -> np.ndarray:
+    """Smallest-three packing of wxyz quaternions into uint32, as in SPZ version 3."""
+    q = torch.nn.functional.normalize(rotations.float(), dim=-1)[:, [1, 2, 3, 0]]  # xyzw
+    largest = q.abs().argmax(dim=-1)
+    negate = q.gather(1, largest[:, None]) < 0
+    magnitude = (q.abs() * (511 / math.sqrt(0.5))).round().clamp(max=511).long()
+    sign = ((q < 0) ^ negate).long()
+    packed = largest.long()
+    for i in range(4):
+        # the three smallest components follow in increasing index order
+        shifted = (packed << 10) | (sign[:, i] << 9) | magnitude[:, i]
+        packed = torch.where(largest != i, shifted, packed)
+    return packed.cpu().numpy().astype("<u4")
+
+
+def _unpack_quaternions(packed: np.ndarray) -> Tensor:
+    """Inverse of ``_pack_quaternions``, returning wxyz quaternions."""
+    packed = torch.from_numpy(packed.astype(np.int64))
+    largest = packed >> 30
+    q = torch.zeros(len(packed), 4)
+    for i in reversed(range(4)):
+        is_small = largest != i
+        value = math.sqrt(0.5) * (packed & 511).float() / 511
+        value = torch.where((packed >> 9) & 1 == 1, -value, value)
+        q[:, i] = torch.where(is_small, value, q[:, i])
+        packed = torch.where(is_small, packed >> 10, packed)
+    q_largest = (1 - q.square().sum(dim=-1)).clamp(min=0).sqrt()
+    q = q.scatter(1, largest[:, None], q_largest[:, None])
+    return q[:, [3, 0, 1, 2]]
+
+
+def export_spz(
+    means: Tensor,  # "gaussian 3"
+    scales: Tensor,  # "gaussian 3"
+    rotations: Tensor,  # "gaussian 4", wxyz
+    harmonics: Tensor,  # "gaussian 3 d_sh"
+    opacities: Tensor,  # "gaussian", in [0, 1]
+    path: Path,
+    sh_degree: int = 0,
+):
+    """
+    Write Gaussians to a gzip-compressed ``.spz`` file.
+
+    Sections are quantized one at a time and streamed into the compressor. Positions
+    outside +-2048 units are clamped by the 24-bit fixed-point encoding.
+
+    Args:
+        sh_degree: Highest SH band to keep, at most 3 and at most the degree of ``harmonics``
+    """
+    num_sh = (sh_degree + 1) ** 2
+    assert sh_degree <= SPZ_MAX_SH_DEGREE, f"SPZ stores SH up to degree {SPZ_MAX_SH_DEGREE}"
+    assert num_sh <= harmonics.shape[-1], f"harmonics have fewer bands than degree {sh_degree}"
+    num_gaussians = means.shape[0]
+    means, scales, rotations, harmonics, opacities = (
+        x.detach().float() for x in (means, scales, rotations, harmonics, opacities)
+    )
+
+    path.parent.mkdir(exist_ok=True, parents=True)
+    with gzip.open(path, "wb") as file:
+        file.write(
+            SPZ_HEADER.pack(
+                SPZ_MAGIC, SPZ_VERSION, num_gaussians, sh_degree, SPZ_FRACTIONAL_BITS, 0, 0
+            )
+        )
+        # 24-bit two's complement positions, the low three bytes of little-endian int32
+        fixed = (means * (1 << SPZ_FRACTIONAL_BITS)).round().clamp(-(1 << 23), (1 << 23) - 1)
+        fixed = fixed.to(torch.int32).cpu().numpy().astype("<i4")
+        file.write(fixed.view(np.uint8).reshape(num_gaussians, 3, 4)[..., :3].tobytes())
+        file.write(_to_uint8(opacities * 255).tobytes())
+        rgb = harmonics[..., 0] * (SPZ_COLOR_SCALE * 255) + 0.5 * 255
+        file.write(_to_uint8(rgb).tobytes())
+        file.write(_to_uint8((scales.log() + 10) * 16).tobytes())
+        file.write(_pack_quaternions(rotations).tobytes())
+        if sh_degree > 0:
+            sh = harmonics[..., 1:num_sh].transpose(1, 2)  # gaussian coefficient channel
+            sh1 = _quantize_sh(sh[:, :3], SPZ_SH1_BITS)
+            sh_rest = _quantize_sh(sh[:, 3:], SPZ_SH_REST_BITS)
+            file.write(np.concatenate([sh1, sh_rest], axis=1).tobytes())
+
+
+def load_spz(path: Path) -> Gaussians:
+    """Read a ``.spz`` file (version 2 or 3) into unbatched Gaussians."""
+    with gzip.open(path, "rb") as file:
+        data = file.read()
+    magic, version, n, sh_degree, fractional_bits, _, _ = SPZ_HEADER.unpack_from(data)
+    if magic != SPZ_MAGIC or version not in (2, 3):
+        raise ValueError(f"Unsupported SPZ file {path} (magic {magic:#x}, version {version})")
+    offset = SPZ_HEADER.size
+
+    def read(num_bytes: int) -> np.ndarray:
+        nonlocal offset
+        section = np.frombuffer(data, dtype=np.uint8, count=num_bytes, offset=offset)
+        offset += num_bytes
+        return section
+
+    position_bytes = read(n * 9).reshape(n, 3, 3).astype(np.int32)
+    fixed = position_bytes[..., 0] | position_bytes[..., 1] << 8 | position_bytes[..., 2] << 16
+    fixed = np.where(fixed & 0x800000, fixed - (1 << 24), fixed)
+    means = torch.from_numpy(fixed.astype(np.float32)) / (1 << fractional_bits)
+    opacities = torch.from_numpy(read(n).astype(np.float32)) / 255
+    rgb = torch.from_numpy(read(n * 3).reshape(n, 3).astype(np.float32))
+    f_dc = (rgb / 255 - 0.5) / SPZ_COLOR_SCALE
+    scales = (torch.from_numpy(read(n * 3).reshape(n, 3).astype(np.float32)) / 16 - 10).exp()
+    if version == 2:
+        xyz = torch.from_numpy(read(n * 3).reshape(n, 3).astype(np.float32)) / 127.5 - 1
+        w = (1 - xyz.square().sum(dim=-1, keepdim=True)).clamp(min=0).sqrt()
+        rotations = torch.cat([w, xyz], dim=-1)
+    else:
+        rotations = _unpack_quaternions(read(n * 4).view("<u4"))
+    num_rest = (sh_degree + 1) ** 2 - 1
+    sh = torch.from_numpy(read(n * num_rest * 3).reshape(n, num_rest, 3).astype(np.float32))
+    harmonics = torch.cat([f_dc[..., None], ((sh - 128) / 128).transpose(1, 2)], dim=-1)
+    return Gaussians(
+        means=means,
+        scales=scales,
+        rotations=rotations,
+        harmonics=harmonics,
+        opacities=opacities,
+    )
+
+
+def save_gaussian_splat(
+    gaussians: Gaussians,
+    save_path: str,
+    ctx_depth: torch.Tensor,  # depth of input views; for getting shape and filtering, "v h w 1"
+    gs_views_interval: int = 1,
+    prune_by_depth_percent: Optional[float] = 1.0,
+    prune_border_gs: Optional[bool] = True,
+    chunk_size: Optional[int] = PLY_WRITE_CHUNK_SIZE,
+    simplify: Optional[dict] = None,
+):
+    """Prune the Gaussians like ``save_gaussian_ply`` and write them as ``.splat``."""
+    selected = select_gaussians_for_export(
+        gaussians,
+        ctx_depth,
+        gs_views_interval=gs_views_interval,
+        prune_by_depth_percent=prune_by_depth_percent,
+        prune_border_gs=prune_border_gs,
+        simplify=simplify,
+    )
+    export_splat(**vars(selected), path=Path(save_path), chunk_size=chunk_size)
+
+
+def save_gaussian_spz(
+    gaussians: Gaussians,
+    save_path: str,
+    ctx_depth: torch.Tensor,  # depth of input views; for getting shape and filtering, "v h w 1"
+    gs_views_interval: int = 1,
+    prune_by_depth_percent: Optional[float] = 1.0,
+    prune_border_gs: Optional[bool] = True,
+    sh_degree: int = 0,
+    simplify: Optional[dict] = None,
+):
+    """Prune the Gaussians like ``save_gaussian_ply`` and write them as ``.spz``."""
+    selected = select_gaussians_for_export(
+        gaussians,
+        ctx_depth,
+        gs_views_interval=gs_views_interval,
+        prune_by_depth_percent=prune_by_depth_percent,
+        prune_border_gs=prune_border_gs,
+        simplify=simplify,
+    )
+    export_spz(**vars(selected), path=Path(save_path), sh_degree=sh_degree)
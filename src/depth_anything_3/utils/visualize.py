@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from typing import Optional
 import matplotlib
 import numpy as np
 import torch
@@ -81,12 +82,11 @@ def visualize_depth(
 # GS video rendering visulization function, since it operates in Tensor space...
 
 
-def vis_depth_map_tensor(
+def depth_map_log_range(
     result: torch.Tensor,  # "*batch height width"
-    color_map: str = "Spectral",
-) -> torch.Tensor:  # "*batch 3 height with"
+) -> tuple[torch.Tensor, torch.Tensor]:
     """
-    Color-map the depth map.
+    Log-depth (near, far) range used to color-map the depth map.
     """
     far = result.reshape(-1)[:16_000_000].float().quantile(0.99).log().to(result)
     try:
@@ -94,6 +94,21 @@ def vis_depth_map_tensor(
     except (RuntimeError, ValueError) as e:
         logger.error(f"No valid depth values found. Reason: {e}")
         near = torch.zeros_like(far)
+    return near, far
+
+
+def vis_depth_map_tensor(
+    result: torch.Tensor,  # "*batch height width"
+    color_map: str = "Spectral",
+    log_range: Optional[tuple[torch.Tensor, torch.Tensor]] = None,
+) -> torch.Tensor:  # "*batch 3 height with"
+    """
+    Color-map the depth map.
+
+    ``log_range`` fixes the range of ``depth_map_log_range``, e.g. to color the chunks of
+    a streamed video consistently; by default it is computed from ``result``.
+    """
+    near, far = depth_map_log_range(result) if log_range is None else log_range
     result = result.log()
     result = (result - near) / (far - near)
     return apply_color_map_to_image(result, color_map)
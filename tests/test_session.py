@@ -0,0 +1,38 @@
+# Copyright (c) 2025 ByteDance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Smoke test of the streaming session API on a randomly initialized small model."""
+
+import numpy as np
+import pytest
+import torch
+
+from depth_anything_3.api import DepthAnything3
+
+
+@pytest.fixture(scope="module")
+def model() -> DepthAnything3:
+    torch.manual_seed(0)
+    return DepthAnything3("da3-small").to("cpu")
+
+
+def test_session_adds_frame_batches(model: DepthAnything3):
+    rng = np.random.default_rng(0)
+    session = model.open_session(process_res=112)
+    for num_frames in (2, 4):
+        frames = [rng.integers(0, 255, (100, 140, 3), dtype=np.uint8) for _ in range(2)]
+        prediction = session.add_frames(frames)
+        assert prediction.depth.shape == (2, 84, 112)
+        assert np.isfinite(prediction.depth).all()
+        assert prediction.extrinsics.shape == (2, 3, 4)
+        assert session.num_frames == num_frames